@@ -3,15 +3,22 @@ Script for indexing papers to FAISS vector database
 """
 from sentence_transformers import SentenceTransformer
 import faiss
+import json
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Optional
 from loguru import logger
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def _setting(value, name: str, default: str, cast=str):
+    """An explicit argument, else the environment variable, read at call time rather than import time"""
+    return cast(os.getenv(name, default)) if value is None else value
+
+
 def get_processed_papers(limit: int = None) -> List[Dict]:
     """Get processed papers from database"""
     # TODO: Implement database query
@@ -31,14 +38,156 @@ def generate_embeddings(texts: List[str], model: SentenceTransformer, batch_size
     return embeddings
 
 
-def create_faiss_index(embeddings: np.ndarray, dimension: int) -> faiss.Index:
-    """Create FAISS index from embeddings"""
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings.astype('float32'))
-    logger.info(f"Created FAISS index with {index.ntotal} vectors")
+def split_passages(text: str, words: int, overlap: int) -> List[str]:
+    """Overlapping windows of `words` words, each starting `words - overlap` words after the previous one"""
+    tokens = re.findall(r'\S+', text)
+    step = max(1, words - overlap)
+    return [' '.join(tokens[start:start + words]) for start in range(0, max(1, len(tokens) - overlap), step)]
+
+
+def generate_paper_embeddings(
+    texts: List[str],
+    model: SentenceTransformer,
+    batch_size: int = 32,
+    words: Optional[int] = None,
+    overlap: Optional[int] = None
+) -> np.ndarray:
+    """
+    Embed each paper as the mean of its overlapping passages, so text past
+    the encoder's input window still counts towards the paper vector
+    """
+    words = _setting(words, 'PASSAGE_WORDS', '150', int)
+    overlap = _setting(overlap, 'PASSAGE_OVERLAP', '30', int)
+    passages, owners = [], []
+    for i, text in enumerate(texts):
+        for passage in split_passages(text, words, overlap):
+            passages.append(passage)
+            owners.append(i)
+    embeddings = generate_embeddings(passages, model, batch_size)
+    sums = np.zeros((len(texts), embeddings.shape[1]), dtype='float32')
+    np.add.at(sums, np.array(owners), embeddings)
+    return sums / np.bincount(owners, minlength=len(texts))[:, None]
+
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+QUANTIZERS = ('none', 'fp16', 'int8', 'pq')
+SQ_TYPES = {'fp16': faiss.ScalarQuantizer.QT_fp16, 'int8': faiss.ScalarQuantizer.QT_8bit}
+
+
+def create_faiss_index(
+    embeddings: np.ndarray,
+    dimension: int,
+    index_type: Optional[str] = None,
+    nlist: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    pq_nbits: Optional[int] = None,
+    hnsw_m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    train_sample_size: Optional[int] = None,
+    quantizer: Optional[str] = None
+) -> faiss.Index:
+    """
+    Create FAISS index from embeddings
+
+    index_type: 'flat' (exact), 'ivf_flat', 'ivf_pq' or 'hnsw'. IVF indexes are
+    trained on a random sample of at most train_sample_size embeddings.
+    quantizer: 'none' (float32), 'fp16' or 'int8' scalar quantisation, or 'pq'
+    product quantisation; ivf_pq always stores PQ codes.
+    Settings not given come from the FAISS_* environment variables.
+    """
+    index_type = _setting(index_type, 'FAISS_INDEX_TYPE', 'flat')
+    nlist = _setting(nlist, 'FAISS_NLIST', '1024', int)
+    pq_m = _setting(pq_m, 'FAISS_PQ_M', '16', int)
+    pq_nbits = _setting(pq_nbits, 'FAISS_PQ_NBITS', '8', int)
+    hnsw_m = _setting(hnsw_m, 'FAISS_HNSW_M', '32', int)
+    ef_construction = _setting(ef_construction, 'FAISS_EF_CONSTRUCTION', '200', int)
+    train_sample_size = _setting(train_sample_size, 'FAISS_TRAIN_SAMPLE_SIZE', '100000', int)
+    quantizer = _setting(quantizer, 'FAISS_QUANTIZER', 'none')
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Use one of {INDEX_TYPES}")
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer: {quantizer}. Use one of {QUANTIZERS}")
+    if index_type == 'ivf_pq':
+        quantizer = 'pq'
+    
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    if quantizer == 'pq' and len(embeddings) < 2 ** pq_nbits:
+        logger.warning(f"Too few vectors ({len(embeddings)}) to train PQ codes, using a flat index")
+        index_type, quantizer = 'flat', 'none'
+    
+    if index_type == 'flat':
+        if quantizer == 'pq':
+            index = faiss.IndexPQ(dimension, pq_m, pq_nbits)
+        elif quantizer in SQ_TYPES:
+            index = faiss.IndexScalarQuantizer(dimension, SQ_TYPES[quantizer])
+        else:
+            index = faiss.IndexFlatL2(dimension)
+    elif index_type == 'hnsw':
+        if quantizer == 'pq':
+            index = faiss.IndexHNSWPQ(dimension, pq_m, hnsw_m, pq_nbits)
+        elif quantizer in SQ_TYPES:
+            index = faiss.IndexHNSWSQ(dimension, SQ_TYPES[quantizer], hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        # Keep ~39 training points per centroid on small corpora
+        nlist = max(1, min(nlist, len(embeddings) // 39))
+        coarse = faiss.IndexFlatL2(dimension)
+        if quantizer == 'pq':
+            index = faiss.IndexIVFPQ(coarse, dimension, nlist, pq_m, pq_nbits)
+        elif quantizer in SQ_TYPES:
+            index = faiss.IndexIVFScalarQuantizer(coarse, dimension, nlist, SQ_TYPES[quantizer])
+        else:
+            index = faiss.IndexIVFFlat(coarse, dimension, nlist)
+    
+    if not index.is_trained:
+        sample = embeddings
+        if len(embeddings) > train_sample_size:
+            rng = np.random.default_rng(0)
+            sample = embeddings[rng.choice(len(embeddings), train_sample_size, replace=False)]
+        index.train(sample)
+        logger.info(f"Trained {index_type} index on {len(sample)} vectors")
+    
+    if index_type in ('flat', 'hnsw'):
+        # Stable ids that survive removals; IVF indexes keep ids in their lists
+        index = faiss.IndexIDMap2(index)
+    index.add_with_ids(embeddings, np.arange(len(embeddings), dtype=np.int64))
+    logger.info(f"Created {index_type} FAISS index with {index.ntotal} vectors")
     return index
 
 
+def create_binary_index(
+    embeddings: np.ndarray,
+    index_type: Optional[str] = None,
+    hnsw_m: Optional[int] = None,
+    start_id: int = 0
+) -> faiss.IndexBinary:
+    """
+    Binary prefilter index: the sign bit of each dimension packed into bytes,
+    searched by Hamming distance ('flat' or 'hnsw'). The service re-scores its
+    candidates exactly from the float vectors written next to the index.
+    """
+    index_type = _setting(index_type, 'FAISS_BINARY_INDEX', 'none')
+    hnsw_m = _setting(hnsw_m, 'FAISS_HNSW_M', '32', int)
+    if index_type not in ('flat', 'hnsw'):
+        raise ValueError(f"Unknown binary index type: {index_type}. Use 'flat' or 'hnsw'")
+    if embeddings.shape[1] % 8 != 0:
+        raise ValueError(f"Binary codes need a dimension divisible by 8, got {embeddings.shape[1]}")
+    if index_type == 'hnsw':
+        index = faiss.IndexBinaryIDMap2(faiss.IndexBinaryHNSW(embeddings.shape[1], hnsw_m))
+    else:
+        index = faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(embeddings.shape[1]))
+    add_binary_codes(index, embeddings, start_id)
+    logger.info(f"Created binary {index_type} index with {index.ntotal} codes")
+    return index
+
+
+def add_binary_codes(index: faiss.IndexBinary, embeddings: np.ndarray, start_id: int):
+    codes = np.packbits(embeddings > 0, axis=1)
+    index.add_with_ids(codes, np.arange(start_id, start_id + len(embeddings), dtype=np.int64))
+
+
 def save_index(index: faiss.Index, filepath: str):
     """Save FAISS index to disk"""
     faiss.write_index(index, filepath)
@@ -52,12 +201,66 @@ def load_index(filepath: str) -> faiss.Index:
     return index
 
 
+def with_stable_ids(index: faiss.Index) -> faiss.Index:
+    """
+    Index that accepts add_with_ids. IVF and id-mapped indexes are returned
+    as they are; others, such as the bare IndexFlatL2 written before ids were
+    stable, are rebuilt inside an IndexIDMap2 with each vector's position as its id.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return index
+    try:
+        faiss.extract_index_ivf(index)
+        return index
+    except RuntimeError:
+        pass
+    # IndexIDMap2 only wraps an empty index: copy it, empty it and re-add the stored vectors
+    vectors = index.reconstruct_n(0, index.ntotal)
+    empty = faiss.clone_index(index)
+    empty.reset()
+    wrapped = faiss.IndexIDMap2(empty)
+    wrapped.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    logger.info(f"Wrapped {type(index).__name__} with {index.ntotal} vectors in IndexIDMap2")
+    return wrapped
+
+
+def save_paper_ids(paper_ids: List[str], filepath: str):
+    """Paper id of each vector id, in the layout VectorDB.load reads (<index path>.ids.json)"""
+    with open(filepath, 'w') as f:
+        json.dump(paper_ids, f)
+    logger.info(f"Saved {len(paper_ids)} paper ids to {filepath}")
+
+
+def load_paper_ids(filepath: str) -> List[str]:
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def append_vectors(embeddings: np.ndarray, filepath: str, overwrite: bool = False):
+    """
+    Write float32 vectors as raw rows next to a quantised or binary index, in id order.
+    The service memory-maps this file to re-score candidates exactly
+    (VectorDB.load reads <index path>.vectors).
+    """
+    with open(filepath, 'wb' if overwrite else 'ab') as f:
+        np.ascontiguousarray(embeddings, dtype='float32').tofile(f)
+    logger.info(f"Wrote {len(embeddings)} float32 vectors to {filepath}")
+
+
 def index_papers_to_faiss(
     model_name: str = 'sentence-transformers/all-MiniLM-L6-v2',
     batch_size: int = 50,
-    update_existing: bool = True
+    update_existing: bool = True,
+    index_type: Optional[str] = None,
+    quantizer: Optional[str] = None,
+    binary_index_type: Optional[str] = None
 ):
-    """Main indexing function"""
+    """Main indexing function; settings not given come from the FAISS_* environment variables"""
+    index_type = _setting(index_type, 'FAISS_INDEX_TYPE', 'flat')
+    quantizer = _setting(quantizer, 'FAISS_QUANTIZER', 'none')
+    binary_index_type = _setting(binary_index_type, 'FAISS_BINARY_INDEX', 'none')
     logger.info("Starting FAISS indexing")
     
     try:
@@ -77,8 +280,8 @@ def index_papers_to_faiss(
         texts = []
         paper_ids = []
         for paper in papers:
-            # Use title + abstract for embedding
-            text = f"{paper.get('title', '')} {paper.get('abstract', '')}".strip()
+            # Use title + full text (or abstract) for embedding
+            text = f"{paper.get('title', '')} {paper.get('text') or paper.get('abstract', '')}".strip()
             if text:
                 texts.append(text)
                 paper_ids.append(paper.get('id'))
@@ -87,28 +290,51 @@ def index_papers_to_faiss(
             logger.warning("No texts to embed")
             return
         
-        # Generate embeddings
-        embeddings = generate_embeddings(texts, model, batch_size)
+        # Generate embeddings (mean of each paper's passages)
+        embeddings = generate_paper_embeddings(texts, model, batch_size)
         
         # Create or update index
         index_path = 'models/faiss_index.bin'
+        vectors_path = f'{index_path}.vectors'
+        ids_path = f'{index_path}.ids.json'
+        binary_path = f'{index_path}.binary'
+        os.makedirs('models', exist_ok=True)
         
         if update_existing and os.path.exists(index_path):
-            # Load existing index and add new vectors
-            existing_index = load_index(index_path)
-            existing_index.add(embeddings.astype('float32'))
+            # Load existing index and add new vectors after the existing ids
+            existing_index = with_stable_ids(load_index(index_path))
+            existing_ids = load_paper_ids(ids_path)
+            if len(existing_ids) < existing_index.ntotal:
+                # Indexes from before the id file was written: their vectors have no known paper id
+                logger.warning(f"No paper ids saved for {existing_index.ntotal - len(existing_ids)} indexed vectors")
+                existing_ids = existing_ids + [None] * (existing_index.ntotal - len(existing_ids))
+            new_ids = np.arange(len(existing_ids), len(existing_ids) + len(paper_ids), dtype=np.int64)
+            existing_index.add_with_ids(embeddings.astype('float32'), new_ids)
+            paper_ids = existing_ids + paper_ids
             index = existing_index
+            if os.path.exists(vectors_path):
+                append_vectors(embeddings, vectors_path)
+            if os.path.exists(binary_path):
+                binary_index = faiss.read_index_binary(binary_path)
+                add_binary_codes(binary_index, embeddings, int(new_ids[0]))
+                faiss.write_index_binary(binary_index, binary_path)
             logger.info("Updated existing index")
         else:
             # Create new index
-            index = create_faiss_index(embeddings, dimension)
+            index = create_faiss_index(embeddings, dimension, index_type=index_type, quantizer=quantizer)
+            if binary_index_type != 'none':
+                faiss.write_index_binary(create_binary_index(embeddings, binary_index_type), binary_path)
+            elif os.path.exists(binary_path):
+                os.remove(binary_path)
+            if quantizer != 'none' or index_type == 'ivf_pq' or binary_index_type != 'none':
+                # Quantised and binary codes are approximate: keep the exact vectors on disk for re-scoring
+                append_vectors(embeddings, vectors_path, overwrite=True)
+            elif os.path.exists(vectors_path):
+                os.remove(vectors_path)
         
-        # Save index
-        os.makedirs('models', exist_ok=True)
+        # Save index and paper ID mapping
         save_index(index, index_path)
-        
-        # Save paper ID mapping
-        # TODO: Save paper_ids mapping to database or file
+        save_paper_ids(paper_ids, ids_path)
         
         logger.info(f"Successfully indexed {len(texts)} papers")
         
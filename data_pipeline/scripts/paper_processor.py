@@ -26,7 +26,12 @@ def extract_metadata(paper: Dict) -> Dict:
         'journal': paper.get('journal', ''),
         'doi': paper.get('doi', ''),
         'pmid': paper.get('pmid', ''),
-        'keywords': paper.get('keywords', [])
+        'keywords': paper.get('keywords', []),
+        # Fields the ML service can filter retrieval on
+        'year': (paper.get('publication_date') or '')[:4] or None,
+        'study_type': paper.get('study_type'),
+        'is_open_access': paper.get('is_open_access'),
+        'concepts': paper.get('concepts', [])
     }
     return metadata
 
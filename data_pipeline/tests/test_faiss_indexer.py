@@ -0,0 +1,65 @@
+"""
+Unit tests for the FAISS indexing script: updating indexes written by earlier versions
+"""
+import json
+import os
+import sys
+
+import faiss
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("sentence_transformers")
+
+from scripts import faiss_indexer  # noqa: E402
+
+
+class _Model:
+    """Encoder stand-in: a fixed random vector per text"""
+
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+    def encode(self, texts, **_):
+        return np.stack([
+            np.random.default_rng(abs(hash(text)) % 2 ** 32).normal(size=16) for text in texts
+        ]).astype('float32')
+
+
+def test_update_baseline_flat_index(tmp_path, monkeypatch):
+    """A bare IndexFlatL2 without ids file is wrapped in IndexIDMap2 and extended after its vectors"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(faiss_indexer, "SentenceTransformer", lambda name: _Model())
+    old = np.random.default_rng(0).normal(size=(5, 16)).astype('float32')
+    baseline = faiss.IndexFlatL2(16)
+    baseline.add(old)
+    os.makedirs("models")
+    faiss.write_index(baseline, "models/faiss_index.bin")
+
+    papers = [{"id": "PMID1", "title": "Statins", "abstract": "Lower LDL."}, {"id": "PMID2", "title": "Aspirin"}]
+    monkeypatch.setattr(faiss_indexer, "get_processed_papers", lambda limit=None: papers)
+    faiss_indexer.index_papers_to_faiss(update_existing=True)
+
+    index = faiss.read_index("models/faiss_index.bin")
+    assert isinstance(index, faiss.IndexIDMap2) and index.ntotal == 7
+    np.testing.assert_array_equal(faiss.vector_to_array(index.id_map), np.arange(7))
+    np.testing.assert_array_equal(index.reconstruct_n(0, 5), old)
+    with open("models/faiss_index.bin.ids.json") as f:
+        assert json.load(f) == [None] * 5 + ["PMID1", "PMID2"]
+
+    _, ids = index.search(_Model().encode(["Aspirin"]), 1)
+    assert ids[0, 0] == 6
+
+
+def test_with_stable_ids_keeps_ivf_and_id_maps():
+    vectors = np.random.default_rng(0).normal(size=(100, 16)).astype('float32')
+    ivf = faiss.IndexIVFFlat(faiss.IndexFlatL2(16), 16, 2)
+    ivf.train(vectors)
+    mapped = faiss.IndexIDMap2(faiss.IndexFlatL2(16))
+    assert faiss_indexer.with_stable_ids(ivf) is ivf
+    assert faiss_indexer.with_stable_ids(mapped) is mapped
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
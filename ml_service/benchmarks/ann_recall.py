@@ -0,0 +1,133 @@
+"""
+Recall-vs-latency report for ANN index types against the exact Flat index
+
+Usage (from ml_service/):
+    python -m benchmarks.ann_recall --embeddings data/embeddings.npy --k 10
+    python -m benchmarks.ann_recall --synthetic 200000 --dimension 384
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from src.utils.ann_index import build_ann_index, ann_search, default_ann_config
+
+NPROBE_GRID = [1, 4, 16, 64, 128]
+EF_SEARCH_GRID = [16, 32, 64, 128, 256]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k found by the approximate search"""
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_search(index: faiss.Index, queries: np.ndarray, k: int, **params) -> Dict[str, float]:
+    """Per-query latency (single-query calls) and batch throughput"""
+    latencies = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        ann_search(index, queries[i:i + 1], k, **params)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    _, batch_found = ann_search(index, queries, k, **params)
+    batch_seconds = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "batch_qps": len(queries) / batch_seconds,
+        "found": batch_found,
+    }
+
+
+def run_benchmark(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    index_types: List[str] = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+) -> List[Dict]:
+    """Build each index type once and sweep its search parameter"""
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        config = dict(default_ann_config(), index_type=index_type)
+        start = time.perf_counter()
+        index = build_ann_index(corpus, config)
+        build_seconds = time.perf_counter() - start
+
+        if index_type in ("ivf_flat", "ivf_pq"):
+            sweep = [{"nprobe": n} for n in NPROBE_GRID]
+        elif index_type == "hnsw":
+            sweep = [{"ef_search": ef} for ef in EF_SEARCH_GRID]
+        else:
+            sweep = [{}]
+
+        for params in sweep:
+            timing = time_search(index, queries, k, **params)
+            rows.append({
+                "index_type": index_type,
+                "params": params,
+                "recall_at_k": recall_at_k(timing.pop("found"), truth),
+                "build_s": build_seconds,
+                **timing,
+            })
+            logger.info(f"{index_type} {params}: recall@{k}={rows[-1]['recall_at_k']:.3f} p50={timing['p50_ms']:.2f}ms")
+    return rows
+
+
+def format_report(rows: List[Dict], k: int) -> str:
+    header = f"{'index':<10} {'params':<18} {'recall@' + str(k):>10} {'p50 ms':>8} {'p99 ms':>8} {'batch qps':>10} {'build s':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        params = ",".join(f"{key}={value}" for key, value in row["params"].items()) or "-"
+        lines.append(
+            f"{row['index_type']:<10} {params:<18} {row['recall_at_k']:>10.3f} {row['p50_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['batch_qps']:>10.0f} {row['build_s']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", help="Corpus embeddings saved with np.save (float32, n x d)")
+    parser.add_argument("--synthetic", type=int, default=50000, help="Synthetic corpus size if no embeddings are given")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500, help="Number of held-out query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--output", help="Write the rows as JSON to this path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype('float32')
+    else:
+        # Clustered Gaussian data roughly mimics the structure of sentence embeddings
+        centers = rng.normal(size=(256, args.dimension))
+        vectors = centers[rng.integers(0, 256, args.synthetic + args.queries)]
+        vectors = (vectors + 0.5 * rng.normal(size=vectors.shape)).astype('float32')
+
+    order = rng.permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:args.queries]])
+    corpus = np.ascontiguousarray(vectors[order[args.queries:]])
+
+    rows = run_benchmark(corpus, queries, k=args.k, index_types=args.index_types)
+    print(format_report(rows, args.k))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
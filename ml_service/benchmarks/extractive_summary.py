@@ -0,0 +1,137 @@
+"""
+Latency of embedding-based extractive summarization against sumy's LexRank
+and LSA on long documents
+
+Every method summarizes the same documents; the embedding methods are timed
+with the sentence embeddings computed per document (as on a cache miss) and
+with them given (as when the vectors are already at hand), which isolates
+the cost of the graph and selection. "overlap" is the fraction of sumy
+LexRank's sentences each method also picks.
+
+Usage (from ml_service/):
+    python -m benchmarks.extractive_summary --papers data/papers.jsonl --limit 50
+    python -m benchmarks.extractive_summary --synthetic 20 --sentences 400
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.summarizer.embedding_summarizer import SELECTIONS, EmbeddingSummarizer, split_sentences
+
+SUMY_METHODS = ["lexrank", "lsa"]
+
+
+def synthetic_documents(count: int, sentences: int, seed: int = 0) -> List[str]:
+    """Documents of sentences drawn from a few topics, roughly like full-text papers"""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(2000)]
+    topics = [rng.choice(len(vocabulary), 60, replace=False) for _ in range(12)]
+    documents = []
+    for _ in range(count):
+        words = [
+            [vocabulary[i] for i in rng.choice(topics[rng.integers(len(topics))], rng.integers(12, 30))]
+            for _ in range(sentences)
+        ]
+        documents.append(" ".join(" ".join(sentence).capitalize() + "." for sentence in words))
+    return documents
+
+
+def _overlap(summary: str, reference: Optional[str]) -> Optional[float]:
+    if reference is None:
+        return None
+    picked, expected = set(split_sentences(summary)), set(split_sentences(reference))
+    return len(picked & expected) / max(len(expected), 1)
+
+
+def run_benchmark(documents: List[str], sentences_count: int = 5, encoder=None) -> List[Dict]:
+    summarizers = {}
+    try:
+        from src.summarizer.extractive_summarizer import ExtractiveSummarizer
+        for method in SUMY_METHODS:
+            summarizers[method] = ExtractiveSummarizer(method=method, sentences_count=sentences_count)
+    except ImportError:
+        logger.warning("sumy is not installed; timing the embedding methods only")
+    for method in SELECTIONS:
+        summarizers[method] = EmbeddingSummarizer(method=method, sentences_count=sentences_count, encoder=encoder)
+
+    sentence_embeddings = None
+    reference = None
+    rows = []
+    for method, summarizer in summarizers.items():
+        runs = [("computed", None)]
+        if isinstance(summarizer, EmbeddingSummarizer):
+            if sentence_embeddings is None:
+                sentence_embeddings = [
+                    summarizer.encoder.encode(split_sentences(document), batch_size=summarizer.batch_size)
+                    for document in documents
+                ]
+            runs.append(("given", sentence_embeddings))
+        for embeddings_label, embeddings in runs:
+            latencies, summaries = [], []
+            for i, document in enumerate(documents):
+                kwargs = {"embeddings": embeddings[i]} if embeddings is not None else {}
+                start = time.perf_counter()
+                summaries.append(asyncio.run(summarizer.summarize(document, **kwargs)))
+                latencies.append(1000 * (time.perf_counter() - start))
+            if method == "lexrank":
+                reference = summaries
+            row = {
+                "method": method,
+                "embeddings": embeddings_label if isinstance(summarizer, EmbeddingSummarizer) else "-",
+                "ms_per_doc": float(np.mean(latencies)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "overlap": None if reference is None else float(np.mean(
+                    [_overlap(summary, expected) for summary, expected in zip(summaries, reference)]
+                )),
+            }
+            rows.append(row)
+            logger.info(f"{method} ({row['embeddings']}): {row['ms_per_doc']:.1f} ms/doc")
+    return rows
+
+
+def format_report(rows: List[Dict], num_sentences: float) -> str:
+    header = f"{'method':<11} {'embeddings':>10} {'ms/doc':>9} {'p95 ms':>9} {'overlap':>8}"
+    lines = [f"{num_sentences:.0f} sentences per document on average", header, "-" * len(header)]
+    for row in rows:
+        overlap = f"{row['overlap']:.2f}" if row["overlap"] is not None else "-"
+        lines.append(
+            f"{row['method']:<11} {row['embeddings']:>10} {row['ms_per_doc']:>9.1f} {row['p95_ms']:>9.1f} {overlap:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", help="JSON lines with the paper text in content, text or abstract")
+    parser.add_argument("--limit", type=int, default=50, help="Papers read from --papers")
+    parser.add_argument("--synthetic", type=int, default=20, help="Synthetic documents if no papers are given")
+    parser.add_argument("--sentences", type=int, default=300, help="Sentences per synthetic document")
+    parser.add_argument("--sentences-count", type=int, default=5, help="Sentences per summary")
+    parser.add_argument("--output", help="Write the rows as JSON to this path")
+    args = parser.parse_args()
+
+    if args.papers:
+        documents = []
+        with open(args.papers) as f:
+            for line in f:
+                if line.strip() and len(documents) < args.limit:
+                    paper = json.loads(line)
+                    documents.append(paper.get("content") or paper.get("text") or paper.get("abstract") or "")
+    else:
+        documents = synthetic_documents(args.synthetic, args.sentences)
+
+    rows = run_benchmark(documents, sentences_count=args.sentences_count)
+    print(format_report(rows, np.mean([len(split_sentences(document)) for document in documents])))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
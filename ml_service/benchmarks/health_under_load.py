@@ -0,0 +1,136 @@
+"""
+Latency of /health while the service is busy summarizing
+
+/health is polled at a fixed rate, first on an idle server and then while
+--concurrency clients keep POSTing to /api/summarize. With model calls on the
+inference pools, /health p99 should stay close to its idle value; when
+inference blocks the event loop it grows to the length of a summary.
+
+Usage (server started separately, e.g. uvicorn src.api.main:app --port 5000):
+    python -m benchmarks.health_under_load --url http://localhost:5000 --seconds 30
+    python -m benchmarks.health_under_load --method extractive --concurrency 8
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_TEXT = " ".join(
+    f"Sentence {i} reports that statin therapy lowered LDL cholesterol in older adults with "
+    f"cardiovascular risk factors, with adverse events similar to placebo over follow-up."
+    for i in range(60)
+)
+
+
+def _request(url: str, payload: Dict = None, timeout: float = 300) -> float:
+    """Milliseconds for one request"""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+    return 1000 * (time.perf_counter() - start)
+
+
+def poll_health(url: str, seconds: float, interval: float, stop: Optional[threading.Event] = None) -> List[float]:
+    """/health latencies for `seconds`, or until stop is set"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline and not (stop is not None and stop.is_set()):
+        latencies.append(_request(f"{url}/health", timeout=60))
+        time.sleep(interval)
+    return latencies
+
+
+def summarize_load(url: str, method: str, concurrency: int, stop: threading.Event) -> List[float]:
+    """
+    Summarize latencies of `concurrency` clients until stop is set. A failed
+    request stops every client and is re-raised, rather than leaving /health
+    to be measured on an idle server.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def client(worker: int):
+        i = 0
+        while not stop.is_set():
+            # Distinct content per request, so the summary cache does not answer it
+            payload = {"paperId": f"load-{worker}-{i}", "content": f"Run {worker}.{i}. {SAMPLE_TEXT}", "method": method}
+            try:
+                elapsed = _request(f"{url}/api/summarize", payload)
+            except Exception:
+                stop.set()
+                raise
+            with lock:
+                latencies.append(elapsed)
+            i += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        futures = [clients.submit(client, worker) for worker in range(concurrency)]
+        stop.wait()
+    for future in futures:
+        future.result()
+    return latencies
+
+
+def _summary(latencies: List[float]) -> Dict:
+    values = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def run_load_test(url: str, method: str, concurrency: int, seconds: float, interval: float) -> Dict:
+    idle = poll_health(url, min(seconds, 10), interval)
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        load = runner.submit(summarize_load, url, method, concurrency, stop)
+        stop.wait(2)  # let every client get a request in flight
+        busy = poll_health(url, seconds, interval, stop)
+        stop.set()
+        summaries = load.result()  # re-raises the first failed summarize request
+    if not summaries:
+        raise RuntimeError("No summarize request completed during the loaded phase; /health was not measured under load")
+
+    report = {"health_idle": _summary(idle), "health_loaded": _summary(busy), "summarize": _summary(summaries)}
+    with urllib.request.urlopen(f"{url}/api/inference/stats", timeout=10) as response:
+        report["inference"] = json.loads(response.read())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--method", default="abstractive", choices=["abstractive", "extractive"])
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent summarize clients")
+    parser.add_argument("--seconds", type=float, default=30, help="Duration of the loaded phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between /health polls")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = run_load_test(args.url.rstrip("/"), args.method, args.concurrency, args.seconds, args.interval)
+    header = f"{'':<16} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    lines = [header, "-" * len(header)]
+    for name in ("health_idle", "health_loaded", "summarize"):
+        row = report[name]
+        lines.append(
+            f"{name:<16} {row['requests']:>9} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+        )
+    print("\n".join(lines))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Memory saved and recall@k lost by quantised vector storage against float32
+
+For each quantizer the index is built over the same corpus and searched
+with and without exact re-scoring of the top candidates from the float32
+vectors. Recall is measured against the exact Flat index; "lost" is the
+drop from the float32 index of the same type.
+
+Usage (from ml_service/):
+    python -m benchmarks.quantization --embeddings data/embeddings.npy --k 10
+    python -m benchmarks.quantization --synthetic 200000 --index-type hnsw
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from benchmarks.ann_recall import recall_at_k
+from src.utils.ann_index import QUANTIZERS, build_ann_index, ann_search, default_ann_config, rescore
+
+RESCORE_FACTORS = [1, 4, 10]
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Size of the serialised index, which tracks its resident memory"""
+    return faiss.serialize_index(index).nbytes
+
+
+def run_benchmark(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    index_type: str = "flat",
+    quantizers: List[str] = QUANTIZERS,
+    rescore_factors: List[int] = RESCORE_FACTORS
+) -> List[Dict]:
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    baseline = None
+    for quantizer in quantizers:
+        config = dict(default_ann_config(), index_type=index_type, quantizer=quantizer)
+        index = build_ann_index(corpus, config)
+        size = index_bytes(index)
+
+        for factor in rescore_factors if quantizer != "none" else [1]:
+            start = time.perf_counter()
+            _, found = ann_search(index, queries, k * factor)
+            if quantizer != "none":
+                # factor 1 re-ranks only the k results, so it measures the codes alone
+                _, found = rescore(queries, found, corpus, k)
+            seconds = time.perf_counter() - start
+
+            row = {
+                "quantizer": quantizer,
+                "rescore_factor": factor if quantizer != "none" else None,
+                "bytes_per_vector": size / len(corpus),
+                "recall_at_k": recall_at_k(found, truth),
+                "ms_per_query": 1000 * seconds / len(queries),
+            }
+            if baseline is None:
+                baseline = row
+            row["memory_saved"] = 1 - row["bytes_per_vector"] / baseline["bytes_per_vector"]
+            row["recall_lost"] = baseline["recall_at_k"] - row["recall_at_k"]
+            rows.append(row)
+            logger.info(
+                f"{quantizer} x{factor}: {row['bytes_per_vector']:.0f} B/vector, recall@{k}={row['recall_at_k']:.3f}"
+            )
+    return rows
+
+
+def format_report(rows: List[Dict], k: int) -> str:
+    header = (
+        f"{'quantizer':<10} {'rescore':>8} {'B/vector':>9} {'saved':>7} "
+        f"{'recall@' + str(k):>10} {'lost':>7} {'ms/query':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        rescore_label = f"x{row['rescore_factor']}" if row["rescore_factor"] else "-"
+        lines.append(
+            f"{row['quantizer']:<10} {rescore_label:>8} {row['bytes_per_vector']:>9.0f} {row['memory_saved']:>7.1%} "
+            f"{row['recall_at_k']:>10.3f} {row['recall_lost']:>7.3f} {row['ms_per_query']:>9.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", help="Corpus embeddings saved with np.save (float32, n x d)")
+    parser.add_argument("--synthetic", type=int, default=50000, help="Synthetic corpus size if no embeddings are given")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500, help="Number of held-out query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf_flat", "hnsw"],
+                        help="Index type every quantizer is applied to")
+    parser.add_argument("--quantizers", nargs="+", default=list(QUANTIZERS))
+    parser.add_argument("--rescore-factors", nargs="+", type=int, default=RESCORE_FACTORS)
+    parser.add_argument("--output", help="Write the rows as JSON to this path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype('float32')
+    else:
+        # Clustered Gaussian data roughly mimics the structure of sentence embeddings
+        centers = rng.normal(size=(256, args.dimension))
+        vectors = centers[rng.integers(0, 256, args.synthetic + args.queries)]
+        vectors = (vectors + 0.5 * rng.normal(size=vectors.shape)).astype('float32')
+
+    order = rng.permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:args.queries]])
+    corpus = np.ascontiguousarray(vectors[order[args.queries:]])
+
+    quantizers = ["none"] + [q for q in args.quantizers if q != "none"]
+    rows = run_benchmark(corpus, queries, k=args.k, index_type=args.index_type,
+                         quantizers=quantizers, rescore_factors=args.rescore_factors)
+    print(format_report(rows, args.k))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ from contextlib import asynccontextmanager
 import os
 from loguru import logger
 
-from .routes import router
+from . import routes
+from .routes import router, get_rag_pipeline
+from src.utils.executor import get_executor, shutdown_executor
 
 # Configure logging
 logger.add("logs/ml_service.log", rotation="10 MB", retention="10 days")
@@ -16,14 +18,20 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting ML Service...")
     
-    # Load models (you can add model loading here)
-    # from src.pipelines.rag_pipeline import load_models
-    # await load_models()
+    # Model calls run on bounded per-family pools, off the event loop
+    get_executor()
+    
+    # Load the retrieval snapshot up front so the first request does not pay for it
+    if os.getenv("RETRIEVAL_SNAPSHOT_PATH"):
+        await get_rag_pipeline()
     
     yield
     
     # Shutdown
     logger.info("Shutting down ML Service...")
+    if routes.rag_pipeline is not None:
+        routes.rag_pipeline.close()
+    shutdown_executor()
 
 
 app = FastAPI(
@@ -1,14 +1,21 @@
+import asyncio
+import json
+import os
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from loguru import logger
 
 from src.pipelines.rag_pipeline import RAGPipeline
-from src.summarizer.extractive_summarizer import ExtractiveSummarizer
+from src.summarizer.embedding_summarizer import create_extractive_summarizer
 from src.summarizer.abstractive_summarizer import AbstractiveSummarizer
+from src.summarizer.summary_cache import cached_summary, create_summary_cache, summarize_cached
 from src.entailment.nli_verifier import NLIVerifier
 from src.classifiers.study_classifier import StudyClassifier
 from src.classifiers.bias_classifier import BiasClassifier
+from src.utils.config import get_default_config
+from src.utils.executor import get_executor, run_inference
 
 router = APIRouter()
 
@@ -16,21 +23,62 @@ router = APIRouter()
 rag_pipeline = None
 extractive_summarizer = None
 abstractive_summarizer = None
+summary_cache = None
 nli_verifier = None
 study_classifier = None
 bias_classifier = None
 
+# Models are built on their family's inference pool, so loading one never blocks the event loop;
+# a lock per model makes concurrent first requests wait for one load instead of starting their own
+_load_locks = {name: asyncio.Lock() for name in ("rag_pipeline", "extractive", "abstractive", "nli")}
+
+
+def _create_rag_pipeline() -> RAGPipeline:
+    pipeline = RAGPipeline()
+    snapshot_path = os.getenv("RETRIEVAL_SNAPSHOT_PATH")
+    if snapshot_path and os.path.exists(snapshot_path):
+        pipeline.load_snapshot(snapshot_path)
+    return pipeline
+
+
+async def get_rag_pipeline() -> RAGPipeline:
+    """Create the RAG pipeline on first use, loading the retrieval snapshot if configured"""
+    global rag_pipeline
+    if rag_pipeline is None:
+        async with _load_locks["rag_pipeline"]:
+            if rag_pipeline is None:
+                rag_pipeline = await run_inference("retrieval", _create_rag_pipeline)
+    return rag_pipeline
+
 
 # Request/Response models
 class RetrieveRequest(BaseModel):
     query: str
-    filters: Optional[dict] = {}
+    filters: Optional[dict] = {}  # year_from, year_to, journal, study_type, open_access, concepts
     limit: int = 10
+    nprobe: Optional[int] = None  # IVF lists probed (IVF indexes only)
+    ef_search: Optional[int] = None  # HNSW search depth (HNSW indexes only)
+    binary_prefilter: Optional[bool] = None  # binary-code dense search with exact re-scoring (broad queries)
+    latency_budget_ms: Optional[float] = None  # reranking tiers that would overrun it are skipped
 
 
 class RetrieveResponse(BaseModel):
     papers: List[dict]
     scores: List[float]
+    metadata: Optional[dict] = None  # per-tier timings of the reranking cascade
+
+
+class RetrieveBatchRequest(BaseModel):
+    queries: List[str]
+    filters: Optional[dict] = {}
+    limit: int = 10
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    binary_prefilter: Optional[bool] = None
+
+
+class RetrieveBatchResponse(BaseModel):
+    results: List[RetrieveResponse]
 
 
 class SummarizeRequest(BaseModel):
@@ -52,6 +100,8 @@ class VerifyRequest(BaseModel):
 class VerifyResponse(BaseModel):
     entailment: str  # "entailment", "contradiction", "neutral"
     confidence: float
+    evidence: Optional[str] = None  # context sentence(s) the verdict rests on
+    scores: Optional[Dict[str, float]] = None
 
 
 class ClassifyRequest(BaseModel):
@@ -68,42 +118,110 @@ class ClassifyResponse(BaseModel):
 async def retrieve_papers(request: RetrieveRequest):
     """Hybrid retrieval (BM25 + dense vectors)"""
     try:
-        global rag_pipeline
-        if rag_pipeline is None:
-            rag_pipeline = RAGPipeline()
+        pipeline = await get_rag_pipeline()
         
-        results = await rag_pipeline.retrieve(
+        results, metadata = await pipeline.retrieve_with_metadata(
             query=request.query,
             filters=request.filters,
-            limit=request.limit
+            limit=request.limit,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            binary_prefilter=request.binary_prefilter,
+            latency_budget_ms=request.latency_budget_ms
         )
         
         return RetrieveResponse(
             papers=[r["paper"] for r in results],
-            scores=[r["score"] for r in results]
+            scores=[r["score"] for r in results],
+            metadata=metadata
         )
     except Exception as e:
         logger.error(f"Retrieval error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/retrieve/batch", response_model=RetrieveBatchResponse)
+async def retrieve_papers_batch(request: RetrieveBatchRequest):
+    """Hybrid retrieval for many queries in one batched pass"""
+    try:
+        pipeline = await get_rag_pipeline()
+        
+        batch_results = await pipeline.retrieve_many(
+            queries=request.queries,
+            filters=request.filters,
+            limit=request.limit,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            binary_prefilter=request.binary_prefilter
+        )
+        
+        return RetrieveBatchResponse(results=[
+            RetrieveResponse(
+                papers=[r["paper"] for r in results],
+                scores=[r["score"] for r in results]
+            )
+            for results in batch_results
+        ])
+    except Exception as e:
+        logger.error(f"Batch retrieval error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _create_extractive_summarizer():
+    # Embedding-based methods share the retriever's encoder once it is loaded
+    if rag_pipeline is not None:
+        return create_extractive_summarizer(
+            encoder=rag_pipeline.retriever.dense_model, model_name=rag_pipeline.retriever.model_name
+        )
+    return create_extractive_summarizer()
+
+
+async def get_summarizer(method: str):
+    """Create the summary cache and the summarizer for the method on first use"""
+    global summary_cache, extractive_summarizer, abstractive_summarizer
+    if summary_cache is None:
+        summary_cache = create_summary_cache()
+    if method == "extractive":
+        if extractive_summarizer is None:
+            async with _load_locks["extractive"]:
+                if extractive_summarizer is None:
+                    extractive_summarizer = await run_inference("extractive", _create_extractive_summarizer)
+        return extractive_summarizer
+    if abstractive_summarizer is None:
+        async with _load_locks["abstractive"]:
+            if abstractive_summarizer is None:
+                abstractive_summarizer = await run_inference("summarizer", AbstractiveSummarizer)
+    return abstractive_summarizer
+
+
+async def get_nli_verifier() -> NLIVerifier:
+    """Create the NLI verifier on first use"""
+    global nli_verifier
+    if nli_verifier is None:
+        async with _load_locks["nli"]:
+            if nli_verifier is None:
+                # Premise selection shares the retriever's encoder once it is loaded
+                nli_verifier = await run_inference(
+                    "nli",
+                    NLIVerifier,
+                    model_name=get_default_config()["models"]["nli"],
+                    encoder=rag_pipeline.retriever.dense_model if rag_pipeline is not None else None
+                )
+    return nli_verifier
+
+
 @router.post("/summarize", response_model=SummarizeResponse)
 async def summarize_paper(request: SummarizeRequest):
-    """Generate extractive or abstractive summary"""
+    """Generate extractive or abstractive summary, served from the summary cache when possible"""
     try:
-        if request.method == "extractive":
-            global extractive_summarizer
-            if extractive_summarizer is None:
-                extractive_summarizer = ExtractiveSummarizer()
-            summary = await extractive_summarizer.summarize(request.content)
-        else:
-            global abstractive_summarizer
-            if abstractive_summarizer is None:
-                abstractive_summarizer = AbstractiveSummarizer()
-            summary = await abstractive_summarizer.summarize(request.content)
+        method = "extractive" if request.method == "extractive" else "abstractive"
+        summarizer = await get_summarizer(method)
+        summaries, _ = await summarize_cached(
+            summarizer, summary_cache, [(request.paperId, request.content)], method
+        )
         
         return SummarizeResponse(
-            summary=summary,
+            summary=summaries[0],
             method=request.method
         )
     except Exception as e:
@@ -111,22 +229,74 @@ async def summarize_paper(request: SummarizeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/summarize/stream")
+async def summarize_paper_stream(request: SummarizeRequest):
+    """
+    Abstractive summary as Server-Sent Events: "token" events with each piece
+    of text as it is generated, then "done" with the whole summary. Cached and
+    extractive summaries arrive in one "token" event. Disconnecting stops
+    generation.
+    """
+    method = "extractive" if request.method == "extractive" else "abstractive"
+    try:
+        summarizer = await get_summarizer(method)
+    except Exception as e:
+        logger.error(f"Summarization error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        try:
+            summary = cached_summary(summarizer, summary_cache, request.paperId, request.content, method)
+            cached = summary is not None
+            if summary is None and method == "extractive":
+                summary = (await summarize_cached(
+                    summarizer, summary_cache, [(request.paperId, request.content)], method
+                ))[0][0]
+            if summary is not None:
+                yield _sse("token", {"text": summary})
+            else:
+                # Greedy streamed text is not cached: the cache holds beam-search summaries
+                pieces = []
+                lengths = get_default_config()["summarization"]
+                stream = summarizer.stream(
+                    request.content, max_length=lengths["max_length"], min_length=lengths["min_length"]
+                )
+                async for piece in stream:
+                    pieces.append(piece)
+                    yield _sse("token", {"text": piece})
+                summary = "".join(pieces).strip()
+            yield _sse("done", {"summary": summary, "method": request.method, "cached": cached})
+        except Exception as e:
+            logger.error(f"Streaming summarization error: {str(e)}")
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/verify", response_model=VerifyResponse)
 async def verify_entailment(request: VerifyRequest):
     """NLI-based claim verification"""
     try:
-        global nli_verifier
-        if nli_verifier is None:
-            nli_verifier = NLIVerifier()
+        verifier = await get_nli_verifier()
         
-        result = await nli_verifier.verify(
+        result = await verifier.verify(
             claim=request.claim,
             context=request.context
         )
         
         return VerifyResponse(
             entailment=result["entailment"],
-            confidence=result["confidence"]
+            confidence=result["confidence"],
+            evidence=result.get("evidence"),
+            scores=result.get("scores")
         )
     except Exception as e:
         logger.error(f"Verification error: {str(e)}")
@@ -165,13 +335,34 @@ async def classify_text(request: ClassifyRequest):
 async def get_embeddings(paper_id: str):
     """Get paper embeddings for similarity search"""
     try:
-        global rag_pipeline
-        if rag_pipeline is None:
-            rag_pipeline = RAGPipeline()
+        pipeline = await get_rag_pipeline()
         
-        embedding = await rag_pipeline.get_embedding(paper_id)
+        embedding = await pipeline.get_embedding(paper_id)
+        if embedding is None:
+            raise HTTPException(status_code=404, detail=f"Paper {paper_id} is not indexed")
         return {"embedding": embedding.tolist()}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get embedding error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the retrieval and summary caches"""
+    try:
+        pipeline = await get_rag_pipeline()
+        stats = pipeline.cache_stats()
+        if summary_cache is not None:
+            stats["summaries"] = summary_cache.stats()
+        return stats
+    except Exception as e:
+        logger.error(f"Cache stats error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/inference/stats")
+async def get_inference_stats():
+    """Queue depth and wait/run times of each model family's worker pool"""
+    return get_executor().stats()
@@ -1,55 +1,136 @@
 """
 Natural Language Inference (NLI) for claim verification
 """
-from transformers import pipeline
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
 from loguru import logger
 
+from src.summarizer.embedding_summarizer import normalize_rows, split_sentences
+from src.utils.config import get_default_config
+from src.utils.executor import run_inference
+from src.utils.inference import inference_config, load_pipeline
+
+LABELS = ("entailment", "contradiction", "neutral")
+
+
+def _label(name: str) -> str:
+    """Canonical NLI label of a checkpoint's label name (ENTAILMENT, Contradiction, neutral, ...)"""
+    name = name.lower()
+    for label in LABELS:
+        if name.startswith(label[:6]):
+            return label
+    raise ValueError(f"Not an NLI label: {name}; use an MNLI-trained checkpoint")
+
+
+def aggregate_pairs(probabilities: np.ndarray, neutral_below: float = 0.5) -> Dict:
+    """
+    Verdict over the (premise, claim) pairs of one claim, rows in LABELS
+    order: the pair with the strongest entailment or contradiction decides
+    when that probability reaches neutral_below, otherwise neutral
+    """
+    entailment, contradiction = probabilities[:, 0], probabilities[:, 1]
+    best_entailment, best_contradiction = int(np.argmax(entailment)), int(np.argmax(contradiction))
+    if entailment[best_entailment] >= contradiction[best_contradiction]:
+        label, pair = "entailment", best_entailment
+    else:
+        label, pair = "contradiction", best_contradiction
+    if probabilities[pair, LABELS.index(label)] < neutral_below:
+        label, pair = "neutral", int(np.argmax(probabilities[:, 2]))
+    return {
+        "entailment": label,
+        "confidence": float(probabilities[pair, LABELS.index(label)]),
+        "pair": pair,
+        "scores": dict(zip(LABELS, (float(p) for p in probabilities[pair]))),
+    }
+
 
 class NLIVerifier:
-    def __init__(self, model_name: str = "microsoft/deberta-v3-base"):
-        try:
-            self.model = pipeline(
-                "text-classification",
-                model="microsoft/deberta-v3-base",
-                task="sentiment"  # Placeholder - use proper NLI model in production
-            )
-            logger.info("Initialized NLIVerifier")
-            logger.warning("Using placeholder model - replace with proper NLI model")
-        except Exception as e:
-            logger.error(f"Failed to load NLI model: {str(e)}")
-            self.model = None
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/nli-deberta-v3-base",
+        backend: Optional[str] = None,
+        encoder=None,
+        premise_sentences: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        config = get_default_config()["nli"]
+        self.premise_sentences = config["premise_sentences"] if premise_sentences is None else premise_sentences
+        self.batch_size = config["batch_size"] if batch_size is None else batch_size
+        if self.batch_size < 1:
+            raise ValueError(f"NLI batch_size must be at least 1, got {self.batch_size}")
+        self.neutral_below = config["neutral_below"]
+        self.encoder = encoder  # sentence encoder for premise selection, loaded when first needed
+        self._encoder_lock = threading.Lock()
+        # MNLI-trained sequence classifier over (premise, hypothesis) pairs; load errors propagate
+        self.model = load_pipeline("text-classification", model_name, backend=backend or inference_config()["nli"])
+        for name in self.model.model.config.id2label.values():
+            _label(name)  # fail early on checkpoints that are not NLI classifiers
+        self.max_length = min(self.model.tokenizer.model_max_length, config["max_length"])
+        logger.info(f"Initialized NLIVerifier with model: {model_name}")
     
     async def verify(self, claim: str, context: str) -> dict:
         """
         Verify if claim is entailed by context
-        Returns: {entailment: "entailment|contradiction|neutral", confidence: float}
+        Returns: {entailment: "entailment|contradiction|neutral", confidence: float,
+                  evidence: premise the verdict rests on, scores: label probabilities}
         """
-        if self.model is None:
-            # Fallback response
-            return {
-                "entailment": "neutral",
-                "confidence": 0.5
-            }
-        
         try:
-            # Format for NLI: [CLS] premise [SEP] hypothesis [SEP]
-            # For now, using placeholder logic
-            # In production, use models like:
-            # - microsoft/deberta-v3-large
-            # - roberta-large-mnli
-            # - facebook/bart-large-mnli
-            
-            # Placeholder implementation
-            # TODO: Replace with actual NLI model inference
-            result = {
-                "entailment": "neutral",
-                "confidence": 0.7
-            }
-            
-            logger.info(f"Verified claim: {claim[:50]}...")
+            result = await run_inference("nli", self._verify, claim, context)
+            logger.info(f"Verified claim: {claim[:50]}... ({result['entailment']})")
             return result
         
         except Exception as e:
             logger.error(f"NLI verification error: {str(e)}")
             raise
-
+    
+    def _verify(self, claim: str, context: str) -> dict:
+        premises = self.select_premises(claim, context)
+        if not premises:
+            return {"entailment": "neutral", "confidence": 1.0, "evidence": "", "scores": {}}
+        probabilities = self.predict([(premise, claim) for premise in premises])
+        result = aggregate_pairs(probabilities, self.neutral_below)
+        result["evidence"] = premises[result.pop("pair")]
+        return result
+    
+    def select_premises(self, claim: str, context: str) -> List[str]:
+        """
+        The context sentences most similar to the claim (cosine of sentence
+        embeddings), each on its own and joined in text order, so claims
+        resting on several sentences are also covered. Short contexts, and
+        every context when premise_sentences is 0, are used whole.
+        """
+        sentences = split_sentences(context)
+        if self.premise_sentences <= 0 or len(sentences) <= self.premise_sentences:
+            return [" ".join(sentences)] if sentences else []
+        
+        embeddings = normalize_rows(self._sentence_encoder().encode([claim] + sentences, show_progress_bar=False))
+        similarity = embeddings[1:] @ embeddings[0]
+        best = sorted(np.argsort(-similarity, kind="stable")[:self.premise_sentences])
+        selected = [sentences[i] for i in best]
+        return selected + [" ".join(selected)] if len(selected) > 1 else selected
+    
+    def _sentence_encoder(self):
+        """The encoder, loaded once even when concurrent calls on the nli pool all find it missing"""
+        if self.encoder is None:
+            with self._encoder_lock:
+                if self.encoder is None:
+                    from src.utils.inference import load_sentence_encoder
+                    self.encoder = load_sentence_encoder(get_default_config()["models"]["retriever"])
+        return self.encoder
+    
+    def predict(self, pairs: List[tuple]) -> np.ndarray:
+        """Label probabilities (LABELS order) of (premise, hypothesis) pairs, in one batched pass"""
+        outputs = self.model(
+            [{"text": premise, "text_pair": hypothesis} for premise, hypothesis in pairs],
+            top_k=None,
+            batch_size=self.batch_size,
+            truncation="only_first",  # long premises are cut, never the claim
+            max_length=self.max_length
+        )
+        probabilities = np.zeros((len(pairs), len(LABELS)), dtype='float32')
+        for i, scores in enumerate(outputs):
+            for score in scores:
+                probabilities[i, LABELS.index(_label(score["label"]))] = score["score"]
+        return probabilities
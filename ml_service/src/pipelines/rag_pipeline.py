@@ -1,63 +1,361 @@
 """
 End-to-end RAG (Retrieval-Augmented Generation) pipeline
 """
-from typing import List, Dict, Optional
+import hashlib
+import json
+import time
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 from loguru import logger
 
 from src.retrieval.hybrid_retriever import HybridRetriever
+from src.retrieval.sharded_retriever import SHARDED_UPDATES_ERROR, ShardedRetriever, parse_shard_addresses
+from src.reranker.cascade import RerankCascade
 from src.reranker.cross_encoder import CrossEncoderReranker
 from src.summarizer.abstractive_summarizer import AbstractiveSummarizer
+from src.utils.cache import create_cache
+from src.utils.config import get_default_config
+from src.utils.executor import run_inference
+
+
+def next_index_version(
+    previous: Optional[str],
+    operation: str,
+    doc_ids: List,
+    documents: Optional[List[str]] = None,
+    metadata: Optional[List[Dict]] = None
+) -> str:
+    """
+    Version of the indexes after an operation: a hash of the previous version
+    and the operation's ids, texts and metadata, so workers that build from
+    the same documents and apply the same updates share result cache keys
+    """
+    digest = hashlib.blake2b(json.dumps([previous, operation]).encode("utf-8"), digest_size=16)
+    for i, doc_id in enumerate(doc_ids):
+        entry = [
+            doc_id,
+            documents[i] if documents is not None else None,
+            metadata[i] if metadata is not None else None,
+        ]
+        digest.update(json.dumps(entry, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
 
 
 class RAGPipeline:
     def __init__(
         self,
         retriever_model: str = "sentence-transformers/all-MiniLM-L6-v2",
-        reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        cascade_model: Optional[str] = None
     ):
-        self.retriever = HybridRetriever(model_name=retriever_model)
+        config = get_default_config()
+        retrieval_config, reranker_config = config["retrieval"], config["reranker"]
+        if retrieval_config["num_shards"] > 1 or retrieval_config["shard_addresses"]:
+            self.retriever = ShardedRetriever(
+                model_name=retriever_model,
+                num_shards=retrieval_config["num_shards"],
+                shard_addresses=parse_shard_addresses(retrieval_config["shard_addresses"])
+            )
+        else:
+            self.retriever = HybridRetriever(model_name=retriever_model)
         self.reranker = CrossEncoderReranker(model_name=reranker_model)
+        
+        # Optional cheaper cross-encoder that narrows the candidate pool before the full reranker
+        cascade_model = cascade_model or reranker_config["cascade_model"]
+        self.fast_reranker = CrossEncoderReranker(model_name=cascade_model) if cascade_model else None
+        tiers = [("reranker", self.reranker, 1.0)]
+        if self.fast_reranker is not None:
+            tiers.insert(0, ("fast_reranker", self.fast_reranker, reranker_config["cascade_head"]))
+        self.cascade = RerankCascade(tiers, exit_margin=reranker_config["exit_margin"])
+        self.latency_budget_ms = reranker_config["latency_budget_ms"]
         self.summarizer = AbstractiveSummarizer()
-        self.documents = []
+        self.index_version = None
+        
+        # Final results keyed by request and index version, optionally shared between workers
+        self.result_cache = create_cache(
+            retrieval_config["result_cache_url"],
+            max_size=retrieval_config["result_cache_size"],
+            ttl_seconds=retrieval_config["result_cache_ttl"] or None
+        )
         logger.info("Initialized RAGPipeline")
     
-    def load_documents(self, documents: List[str]):
-        """Load and index documents"""
-        self.documents = documents
-        self.retriever.build_index(documents)
+    @property
+    def documents(self):
+        """Indexed texts by row, read from the retriever's document store"""
+        return self.retriever.documents
+    
+    def load_documents(
+        self,
+        documents: List[str],
+        doc_ids: Optional[List[str]] = None,
+        metadata: Optional[List[Dict]] = None
+    ):
+        """Load and index documents (metadata enables retrieval filters)"""
+        self.retriever.build_index(documents, doc_ids=doc_ids, metadata=metadata)
+        self.index_version = next_index_version(
+            None, "build", doc_ids if doc_ids is not None else list(range(len(documents))), documents, metadata
+        )
+        self._clear_reranker_caches()
         logger.info(f"Loaded {len(documents)} documents")
     
+    def add_documents(self, documents: List[str], doc_ids: List[str], metadata: Optional[List[Dict]] = None):
+        """Index new documents without rebuilding"""
+        self._ensure_updatable()
+        self.retriever.add_documents(documents, doc_ids, metadata=metadata)
+        self._indexes_changed("add", doc_ids, documents, metadata)
+    
+    def update_documents(self, documents: List[str], doc_ids: List[str], metadata: Optional[List[Dict]] = None):
+        """Replace indexed documents by id"""
+        self._ensure_updatable()
+        self.retriever.update_documents(documents, doc_ids, metadata=metadata)
+        self._indexes_changed("update", doc_ids, documents, metadata)
+        # Reranker scores are cached by doc id, so they would describe the old texts
+        self._clear_reranker_caches()
+    
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """Remove documents by id; returns how many were deleted"""
+        self._ensure_updatable()
+        deleted = self.retriever.delete_documents(doc_ids)
+        self._indexes_changed("delete", doc_ids)
+        self._clear_reranker_caches()  # the ids may be re-added with other texts
+        return deleted
+    
+    def _ensure_updatable(self):
+        if isinstance(self.retriever, ShardedRetriever):
+            raise ValueError(SHARDED_UPDATES_ERROR)
+    
+    def compact(self, background: bool = False):
+        """Purge deleted documents from the indexes"""
+        return self.retriever.compact(background=background)
+    
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Hit/miss counters of the pipeline's caches"""
+        return {
+            "query_embeddings": self.retriever.query_cache.stats(),
+            "results": self.result_cache.stats(),
+            "reranker_scores": self.reranker.cache.stats(),
+        }
+    
+    def close(self):
+        """Stop background resources such as shard processes"""
+        self.retriever.close()
+    
+    def _clear_reranker_caches(self):
+        self.reranker.clear_cache()
+        if self.fast_reranker is not None:
+            self.fast_reranker.clear_cache()
+    
+    def _indexes_changed(
+        self,
+        operation: str,
+        doc_ids: List[str],
+        documents: Optional[List[str]] = None,
+        metadata: Optional[List[Dict]] = None
+    ):
+        # A new version keeps cached results of the old index from being served
+        self.index_version = next_index_version(self.index_version, operation, doc_ids, documents, metadata)
+    
+    def save_snapshot(self, path: str) -> Dict:
+        """Persist the retrieval indexes as a versioned snapshot"""
+        manifest = self.retriever.save_snapshot(path, version=self.index_version)
+        self.index_version = manifest["version"]
+        return manifest
+    
+    def load_snapshot(self, path: str, mmap: bool = True) -> Dict:
+        """Load a retrieval snapshot instead of re-indexing documents"""
+        manifest = self.retriever.load_snapshot(path, mmap=mmap)
+        self.index_version = manifest["version"]
+        self._clear_reranker_caches()
+        logger.info(f"Loaded snapshot {self.index_version} with {manifest['num_documents']} documents")
+        return manifest
+    
     async def retrieve(
         self,
         query: str,
         filters: Optional[Dict] = None,
         limit: int = 10,
-        use_reranker: bool = True
+        use_reranker: bool = True,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        binary_prefilter: Optional[bool] = None,
+        latency_budget_ms: Optional[float] = None
     ) -> List[Dict]:
-        """Retrieve relevant documents"""
-        # Initial retrieval (retrieve more than needed for reranking)
+        """Retrieve relevant documents (served from the result cache when possible)"""
+        results, _ = await self.retrieve_with_metadata(
+            query, filters, limit, use_reranker, nprobe, ef_search, binary_prefilter, latency_budget_ms
+        )
+        return results
+    
+    async def retrieve_with_metadata(
+        self,
+        query: str,
+        filters: Optional[Dict] = None,
+        limit: int = 10,
+        use_reranker: bool = True,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        binary_prefilter: Optional[bool] = None,
+        latency_budget_ms: Optional[float] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        retrieve, plus the time and candidate count of each tier of the
+        cascade (hybrid retrieval, fast reranker, reranker) and whether it
+        stopped early on a decisive score margin or the latency budget
+        latency_budget_ms: skip reranking tiers that would overrun it (default RERANKER_LATENCY_BUDGET_MS)
+        """
+        started = time.perf_counter()
+        cache_key = self._result_cache_key(
+            query, filters, limit, use_reranker, nprobe, ef_search, binary_prefilter, batched=False
+        )
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached), {"cached": True, "tiers": [], "exit": None, "ms": self._ms_since(started)}
+        
+        # Retrieve more than needed for reranking
+        initial_k = limit * 3 if use_reranker else limit
+        results = await run_inference(
+            "retrieval", self.retriever.retrieve,
+            query, k=initial_k, nprobe=nprobe, ef_search=ef_search, filters=filters,
+            binary_prefilter=binary_prefilter
+        )
+        tiers = [{"tier": "hybrid", "candidates": len(results), "ms": self._ms_since(started)}]
+        
+        exit_reason = None
+        if use_reranker:
+            results, report = await run_inference(
+                "reranker", self.cascade.rerank,
+                query, results, limit, started,
+                budget_ms=latency_budget_ms if latency_budget_ms is not None else self.latency_budget_ms
+            )
+            tiers += report["tiers"]
+            exit_reason = report["exit"]
+        
+        results = self._attach_papers(results[:limit])
+        # Results cut short by the budget are not cached, so a later request can rerank fully
+        if exit_reason != "budget":
+            self.result_cache.put(cache_key, json.dumps(results))
+        return results, {"cached": False, "tiers": tiers, "exit": exit_reason, "ms": self._ms_since(started)}
+    
+    def _ms_since(self, started: float) -> float:
+        return 1000 * (time.perf_counter() - started)
+    
+    async def retrieve_many(
+        self,
+        queries: List[str],
+        filters: Optional[Dict] = None,
+        limit: int = 10,
+        use_reranker: bool = True,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[List[Dict]]:
+        """Retrieve relevant documents for a batch of queries; only cache misses are computed"""
+        cache_keys = [
+            self._result_cache_key(
+                query, filters, limit, use_reranker, nprobe, ef_search, binary_prefilter, batched=True
+            )
+            for query in queries
+        ]
+        batch_results = [None] * len(queries)
+        for i, cache_key in enumerate(cache_keys):
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                batch_results[i] = json.loads(cached)
+        
+        missing = [i for i, results in enumerate(batch_results) if results is None]
+        if missing:
+            computed = await self._retrieve_batch(
+                [queries[i] for i in missing], filters, limit, use_reranker, nprobe, ef_search, binary_prefilter
+            )
+            for i, results in zip(missing, computed):
+                batch_results[i] = results
+                self.result_cache.put(cache_keys[i], json.dumps(results))
+        
+        return batch_results
+    
+    async def _retrieve_batch(
+        self,
+        queries: List[str],
+        filters: Optional[Dict],
+        limit: int,
+        use_reranker: bool,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        binary_prefilter: Optional[bool]
+    ) -> List[List[Dict]]:
+        # Retrieve more than needed for reranking
         initial_k = limit * 3 if use_reranker else limit
         
-        results = self.retriever.retrieve(query, k=initial_k)
+        batch_results = await run_inference(
+            "retrieval", self.retriever.retrieve_many,
+            queries, k=initial_k, nprobe=nprobe, ef_search=ef_search, filters=filters,
+            binary_prefilter=binary_prefilter
+        )
         
-        # Rerank if enabled
-        if use_reranker and len(results) > limit:
-            documents = [r["document"] for r in results]
-            reranked = self.reranker.rerank(query, documents, top_k=limit)
-            
-            # Map back to original results with reranked scores
-            for i, rerank_result in enumerate(reranked):
-                original = next(r for r in results if r["document"] == rerank_result["document"])
-                original["rerank_score"] = rerank_result["score"]
-                original["score"] = rerank_result["score"]  # Use reranked score
+        if use_reranker:
+            # Score every (query, candidate) pair of the batch in one cross-encoder call;
+            # "index" maps each reranked document back to its result, in reranked order
+            reranked = await run_inference(
+                "reranker", self.reranker.rerank_many,
+                queries,
+                [[r["document"] for r in results] for results in batch_results],
+                top_k=limit,
+                doc_ids_per_query=[[r["doc_id"] for r in results] for results in batch_results]
+            )
+            for i, (results, ranked) in enumerate(zip(batch_results, reranked)):
+                ordered = []
+                for rerank_result in ranked:
+                    original = results[rerank_result["index"]]
+                    original["rerank_score"] = rerank_result["score"]
+                    original["score"] = rerank_result["score"]  # Use reranked score
+                    ordered.append(original)
+                batch_results[i] = ordered
         
-        return results[:limit]
+        return [self._attach_papers(results[:limit]) for results in batch_results]
+    
+    def _result_cache_key(
+        self,
+        query: str,
+        filters: Optional[Dict],
+        limit: int,
+        use_reranker: bool,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        binary_prefilter: Optional[bool],
+        batched: bool
+    ) -> str:
+        """
+        Cache key of a retrieval request; the index version invalidates it on
+        re-indexing. Single queries go through the cascade and batches through
+        the full reranker alone, so the reranking path is part of the key.
+        """
+        request = [
+            " ".join(query.split()), filters or {}, limit, nprobe, ef_search, binary_prefilter,
+            self._rerank_signature(use_reranker, batched), self.retriever.model_name, self.index_version,
+        ]
+        digest = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"retrieve:{digest}"
+    
+    def _rerank_signature(self, use_reranker: bool, batched: bool) -> List:
+        """Models and settings that decide the order of reranked results"""
+        if not use_reranker:
+            return ["none"]
+        if batched:
+            return ["batch", self.reranker.model_name]
+        tiers = [[name, reranker.model_name, keep] for name, reranker, keep in self.cascade.tiers]
+        return ["cascade", tiers, self.cascade.exit_margin]
+    
+    def _attach_papers(self, results: List[Dict]) -> List[Dict]:
+        """Add the paper payload returned by the API to each result"""
+        for result in results:
+            result["paper"] = {"id": result["doc_id"], "content": result["document"]}
+            if "passages" in result:
+                result["paper"]["passages"] = result["passages"]
+        return results
     
-    async def get_embedding(self, paper_id: str) -> Optional:
-        """Get embedding for a paper (placeholder - needs implementation)"""
-        # TODO: Implement embedding lookup by paper_id
-        logger.warning(f"get_embedding not fully implemented for paper_id: {paper_id}")
-        return None
+    async def get_embedding(self, paper_id: str) -> Optional[np.ndarray]:
+        """Dense embedding of an indexed paper, or None when the paper is not indexed"""
+        return await run_inference("retrieval", self.retriever.embed_document, paper_id)
     
     async def generate_answer(
         self,
@@ -68,7 +366,10 @@ class RAGPipeline:
         """Generate answer using retrieved context"""
         if retrieve_first:
             results = await self.retrieve(query, limit=3)
-            context = "\n".join([r["document"] for r in results])
+            # With a passage index only the best matching passages of each paper are summarized
+            context = "\n".join(
+                "\n".join(r["passages"]) if r.get("passages") else r["document"] for r in results
+            )
         
         if not context:
             return {"answer": "No relevant context found.", "context": ""}
@@ -0,0 +1,96 @@
+"""
+Reranking cascade: cheaper scorers on wide candidate pools, the full
+cross-encoder only on the narrow head, with early exit on decisive score
+margins or a spent latency budget
+"""
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+# Weight of the latest request in the running per-pair cost estimate of each tier
+COST_SMOOTHING = 0.2
+
+
+def boundary_margin(scores: Sequence[float], limit: int) -> float:
+    """
+    Gap between the last kept and the first dropped score, as a fraction of
+    the score range of the pool (0 when nothing would be dropped)
+    """
+    scores = np.sort(np.asarray(scores, dtype='float64'))[::-1]
+    if len(scores) <= limit or limit <= 0:
+        return 0.0
+    spread = scores[0] - scores[-1]
+    return float((scores[limit - 1] - scores[limit]) / spread) if spread > 0 else 0.0
+
+
+class RerankCascade:
+    """
+    Ordered reranking tiers, each given as (name, reranker, keep) where keep
+    is the number of results passed on as a multiple of the final limit. A
+    tier runs unless the scores so far already separate the top `limit`
+    results by at least `exit_margin`, or the request would overrun its
+    latency budget (time spent so far plus the tier's estimated cost).
+    """
+
+    def __init__(self, tiers: List[Tuple[str, object, float]], exit_margin: float = 0.0):
+        self.tiers = tiers
+        self.exit_margin = exit_margin
+        self._ms_per_pair: Dict[str, float] = {}
+
+    def rerank(
+        self,
+        query: str,
+        results: List[Dict],
+        limit: int,
+        started: float,
+        budget_ms: Optional[float] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """
+        Rerank hybrid results (best first) in place of their scores. Returns
+        the top `limit` results and a report of the tiers that ran and why
+        the cascade stopped ("exit": None, "margin" or "budget").
+        """
+        report = {"tiers": [], "exit": None}
+        for name, reranker, keep in self.tiers:
+            if self.exit_margin > 0 and boundary_margin([r["score"] for r in results], limit) >= self.exit_margin:
+                report["exit"] = "margin"
+                break
+            elapsed_ms = 1000 * (time.perf_counter() - started)
+            estimate_ms = self._ms_per_pair.get(name, 0.0) * len(results)
+            if budget_ms and elapsed_ms + estimate_ms > budget_ms:
+                report["exit"] = "budget"
+                break
+
+            tier_start = time.perf_counter()
+            ranked = reranker.rerank(
+                query,
+                [r["document"] for r in results],
+                top_k=max(limit, math.ceil(limit * keep)),
+                doc_ids=[r["doc_id"] for r in results]
+            )
+            reordered = []
+            for rerank_result in ranked:
+                original = results[rerank_result["index"]]
+                original["rerank_score"] = rerank_result["score"]
+                original["score"] = rerank_result["score"]  # Use reranked score
+                reordered.append(original)
+            tier_ms = 1000 * (time.perf_counter() - tier_start)
+            self._update_cost(name, tier_ms, len(results))
+            report["tiers"].append({"tier": name, "candidates": len(results), "ms": tier_ms})
+            results = reordered
+
+        if report["exit"]:
+            logger.debug(f"Rerank cascade stopped early ({report['exit']}) after {len(report['tiers'])} tiers")
+        return results[:limit], report
+
+    def _update_cost(self, name: str, tier_ms: float, pairs: int):
+        if pairs == 0:
+            return
+        per_pair = tier_ms / pairs
+        previous = self._ms_per_pair.get(name)
+        self._ms_per_pair[name] = per_pair if previous is None else (
+            (1 - COST_SMOOTHING) * previous + COST_SMOOTHING * per_pair
+        )
@@ -1,41 +1,152 @@
 """
 Cross-encoder reranker for fine-grained relevance scoring
 """
-from sentence_transformers import CrossEncoder
-from typing import List, Dict
+import hashlib
+from typing import List, Dict, Optional, Sequence
+import numpy as np
 from loguru import logger
 
+from src.utils.cache import LRUCache
+from src.utils.config import get_default_config
+from src.utils.inference import load_cross_encoder
+
 
 class CrossEncoderReranker:
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        self.model = CrossEncoder(model_name)
-        logger.info(f"Initialized CrossEncoderReranker with model: {model_name}")
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        max_length: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        backend: Optional[str] = None
+    ):
+        config = get_default_config()["reranker"]
+        self.model_name = model_name
+        self.max_length = max_length or config["max_length"]
+        self.batch_size = batch_size or config["batch_size"]
+        # backend: torch, onnx or onnx_int8 (default RERANKER_BACKEND)
+        self.model = load_cross_encoder(model_name, max_length=self.max_length, backend=backend)
+        # (query, document) scores, keyed by doc id when the caller has one
+        self.cache = LRUCache(max_size=config["cache_size"] if cache_size is None else cache_size)
+        logger.info(f"Initialized CrossEncoderReranker with model: {model_name} (max_length: {self.max_length})")
     
-    def rerank(self, query: str, documents: List[str], top_k: int = 10) -> List[Dict]:
+    def rerank(
+        self, query: str, documents: List[str], top_k: int = 10, doc_ids: Optional[List[str]] = None
+    ) -> List[Dict]:
         """
         Rerank documents based on query-document pairs
+        doc_ids: optional ids of the documents, used as score cache keys
         """
         if not documents:
             return []
         
-        # Create query-document pairs
-        pairs = [[query, doc] for doc in documents]
+        reranked = self.rerank_many([query], [documents], top_k=top_k, doc_ids_per_query=[doc_ids])[0]
+        logger.info(f"Reranked {len(documents)} documents, returning top {top_k}")
+        return reranked
+    
+    def rerank_many(
+        self,
+        queries: List[str],
+        documents_per_query: List[List[str]],
+        top_k: int = 10,
+        batch_size: Optional[int] = None,
+        doc_ids_per_query: Optional[List[Optional[List[str]]]] = None
+    ) -> List[List[Dict]]:
+        """
+        Rerank candidates for several queries with a single cross-encoder batch
+        """
+        scores = self.score_many(queries, documents_per_query, batch_size, doc_ids_per_query)
+        return [self._top_k(documents, s, top_k) for documents, s in zip(documents_per_query, scores)]
+    
+    def score_many(
+        self,
+        queries: List[str],
+        documents_per_query: List[List[str]],
+        batch_size: Optional[int] = None,
+        doc_ids_per_query: Optional[List[Optional[List[str]]]] = None
+    ) -> List[np.ndarray]:
+        """
+        Cross-encoder scores of every (query, document) pair, by query.
         
-        # Get scores from cross-encoder
-        scores = self.model.predict(pairs)
+        Cached pairs are not re-scored. The rest are tokenised once, cut to
+        max_length tokens and sorted by token count, so each batch holds pairs
+        of similar length and is padded only to its own longest pair (the
+        model pads batches dynamically), then scored in one predict call.
+        """
+        if not queries:
+            return []
+        doc_ids_per_query = doc_ids_per_query or [None] * len(queries)
+        keys, pairs = [], []
+        for query, documents, doc_ids in zip(queries, documents_per_query, doc_ids_per_query):
+            query = " ".join(query.split())
+            for i, document in enumerate(documents):
+                doc_key = doc_ids[i] if doc_ids is not None and doc_ids[i] is not None else None
+                if doc_key is None:
+                    doc_key = hashlib.blake2b(document.encode("utf-8"), digest_size=16).hexdigest()
+                keys.append((query, doc_key))
+                pairs.append((query, document))
         
-        # Combine with documents and sort
-        results = list(zip(documents, scores))
-        results.sort(key=lambda x: x[1], reverse=True)
+        scores = np.zeros(len(pairs), dtype='float32')
+        missing = []
+        for i, key in enumerate(keys):
+            score = self.cache.get(key)
+            if score is None:
+                missing.append(i)
+            else:
+                scores[i] = score
         
-        # Return top k
-        reranked = []
-        for doc, score in results[:top_k]:
-            reranked.append({
-                "document": doc,
-                "score": float(score)
-            })
+        if missing:
+            lengths, documents = self._truncate([pairs[i] for i in missing])
+            order = np.argsort(lengths, kind="stable")
+            missing = [missing[j] for j in order]
+            predicted = self.model.predict(
+                [[pairs[i][0], documents[j]] for i, j in zip(missing, order)],
+                batch_size=batch_size or self.batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(missing, np.asarray(predicted, dtype='float32')):
+                scores[i] = score
+                self.cache.put(keys[i], float(score))
+            logger.debug(f"Scored {len(missing)} of {len(pairs)} pairs ({len(pairs) - len(missing)} cached)")
         
-        logger.info(f"Reranked {len(documents)} documents, returning top {top_k}")
-        return reranked
-
+        return np.split(scores, np.cumsum([len(documents) for documents in documents_per_query])[:-1])
+    
+    def _truncate(self, pairs: List[tuple]):
+        """
+        Token count of each (query, document) pair within max_length, and each
+        document cut after its last token that fits, so the model is not given
+        text it would drop. Cutting needs a fast tokenizer (character offsets);
+        otherwise documents are left whole and the model truncates them.
+        """
+        tokenizer = self.model.tokenizer
+        fast = getattr(tokenizer, "is_fast", False)
+        encoded = tokenizer(
+            [query for query, _ in pairs],
+            [document for _, document in pairs],
+            truncation="longest_first",
+            max_length=self.max_length,
+            return_offsets_mapping=fast
+        )
+        lengths = np.array([len(ids) for ids in encoded["input_ids"]])
+        if not fast:
+            return lengths, [document for _, document in pairs]
+        documents = []
+        for i, (_, document) in enumerate(pairs):
+            ends = [
+                end for sequence, (_, end) in zip(encoded.sequence_ids(i), encoded["offset_mapping"][i])
+                if sequence == 1
+            ]
+            documents.append(document[:max(ends, default=0)])
+        return lengths, documents
+    
+    def clear_cache(self):
+        """Drop cached scores (e.g. after the texts behind doc ids changed)"""
+        self.cache.clear()
+    
+    def _top_k(self, documents: Sequence[str], scores: np.ndarray, top_k: int) -> List[Dict]:
+        """Sort documents by score; "index" is each document's position in the input"""
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            {"index": int(i), "document": documents[i], "score": float(scores[i])}
+            for i in order
+        ]
@@ -0,0 +1,216 @@
+"""
+Text analysis for BM25: biomedical-aware tokenisation into integer term ids
+"""
+import json
+import re
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+# English function words; negations ("no", "not", "without") are kept as they matter in clinical text
+STOPWORDS = frozenset("""
+    a about above after again against all am an and any are as at be because been before being below
+    between both but by can could did do does doing down during each few for from further had has have
+    having he her here hers herself him himself his how i if in into is it its itself just me more most
+    my myself of off on once only or other our ours ourselves out over own same she should so some such
+    than that the their theirs them themselves then there these they this those through to too under
+    until up very was we were what when where which while who whom why will with would you your yours
+    yourself yourselves s
+""".split())
+
+# Runs of letters/digits, joined by hyphens ("IL-6", "beta-blocker", "SARS-CoV-2")
+_TOKEN = re.compile(r"[^\W_]+(?:[-‐‑][^\W_]+)*")
+_HYPHENS = re.compile(r"[-‐‑]")
+
+
+class Analyzer:
+    """
+    Turns text into BM25 terms:
+
+    - lowercases and splits on anything but letters and digits, so
+      punctuation never sticks to a term ("cancer," -> "cancer")
+    - drops the "s" of possessives ("Crohn's" -> "crohn")
+    - hyphenated names are indexed joined, so "IL-6" and "IL6" match, plus
+      their alphabetic parts of three letters or more ("beta-blocker" ->
+      "betablocker", "beta", "blocker")
+    - removes stopwords
+    - optionally folds plurals with the conservative S-stemmer, which leaves
+      Greek/Latin singulars such as "sepsis" and "virus" alone
+
+    Analysis of each distinct surface token is memoised (and, in encode(),
+    so are its term ids), so tokenising a corpus costs one regex pass plus a
+    dict lookup per token.
+    """
+
+    def __init__(self, stem: bool = False, stopwords: Optional[Iterable[str]] = None, cache_size: int = 200000):
+        self.stem = stem
+        self.stopwords = frozenset(STOPWORDS if stopwords is None else stopwords)
+        self.cache_size = cache_size
+        self._terms = _Memo(self._analyze_token)  # surface token -> terms
+
+    def config(self) -> Dict:
+        """Settings needed to recreate this analyzer (stored in snapshots)"""
+        return {"stem": self.stem, "stopwords": sorted(self.stopwords)}
+
+    def analyze(self, text: str) -> List[str]:
+        if len(self._terms) >= self.cache_size:
+            self._terms.clear()
+        return list(chain.from_iterable(map(self._terms.__getitem__, _TOKEN.findall(text.lower()))))
+
+    def encode(self, texts: Sequence[str], vocab: "Vocabulary", add: bool = True) -> "TokenArrays":
+        """Analyze documents into term ids, adding new terms to vocab unless add=False"""
+        if add:
+            term_ids = _Memo(lambda token: tuple(vocab.add(term) for term in self._terms[token]))
+        else:
+            term_ids = _Memo(lambda token: tuple(vocab.ids(self._terms[token]).tolist()))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        docs = []
+        for i, text in enumerate(texts):
+            doc = np.fromiter(
+                chain.from_iterable(map(term_ids.__getitem__, _TOKEN.findall(text.lower()))), dtype=np.int32
+            )
+            offsets[i + 1] = offsets[i] + len(doc)
+            docs.append(doc)
+        if len(self._terms) >= self.cache_size:
+            self._terms.clear()
+        tokens = np.concatenate(docs) if docs else np.empty(0, dtype=np.int32)
+        return TokenArrays(tokens, offsets)
+
+    def encode_query(self, query: str, vocab: "Vocabulary") -> np.ndarray:
+        """Term ids of a query; terms missing from the vocabulary are dropped"""
+        return vocab.ids(self.analyze(query))
+
+    def _analyze_token(self, token: str) -> tuple:
+        parts = _HYPHENS.split(token)
+        if len(parts) == 1:
+            terms = [token]
+        else:
+            terms = ["".join(parts)] + [part for part in parts if len(part) >= 3 and part.isalpha()]
+        return tuple(self._stem(term) for term in terms if term not in self.stopwords)
+
+    def _stem(self, term: str) -> str:
+        if not self.stem or len(term) <= 3 or not term.isalpha():
+            return term
+        if term.endswith("ies") and not term.endswith(("eies", "aies")):
+            return term[:-3] + "y"
+        if term.endswith("es") and not term.endswith(("aes", "ees", "oes")):
+            return term[:-1]
+        if term.endswith("s") and not term.endswith(("us", "ss", "is")):
+            return term[:-1]
+        return term
+
+
+class _Memo(dict):
+    """Dict that computes and stores missing values, so hits stay a C-level lookup"""
+
+    def __init__(self, compute):
+        super().__init__()
+        self._compute = compute
+
+    def __missing__(self, key):
+        value = self[key] = self._compute(key)
+        return value
+
+
+class Vocabulary:
+    """Append-only mapping between terms and dense integer ids"""
+
+    def __init__(self, terms: Optional[Iterable[str]] = None):
+        self.terms = list(terms or [])
+        self._ids = {term: i for i, term in enumerate(self.terms)}
+
+    def __reduce__(self):
+        # Pickle (e.g. to shard processes) as the term list only
+        return Vocabulary, (self.terms,)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._ids
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        return self._ids.get(term, default)
+
+    def add(self, term: str) -> int:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def ids(self, terms: Iterable[str], add: bool = False) -> np.ndarray:
+        """Term ids as int32; unknown terms are added, or dropped when add=False"""
+        if add:
+            return np.array([self.add(term) for term in terms], dtype=np.int32)
+        ids = self._ids
+        return np.array([ids[term] for term in terms if term in ids], dtype=np.int32)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.terms, f)
+
+    @classmethod
+    def load(cls, path: str) -> "Vocabulary":
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+class TokenArrays:
+    """
+    Tokenised documents as one flat int32 array of term ids plus offsets:
+    document i is tokens[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, tokens: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self.tokens = tokens if tokens is not None else np.empty(0, dtype=np.int32)
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def from_lists(cls, corpus: Iterable[List[str]], vocab: "Vocabulary", add: bool = True) -> "TokenArrays":
+        """Encode token lists with vocab (adding new terms unless add=False)"""
+        docs = [vocab.ids(tokens, add=add) for tokens in corpus]
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for doc in docs], out=offsets[1:])
+        tokens = np.concatenate(docs) if docs else np.empty(0, dtype=np.int32)
+        return cls(tokens.astype(np.int32, copy=False), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def take(self, rows: Union[np.ndarray, List[int]]) -> "TokenArrays":
+        """Documents at the given positions, in that order"""
+        rows = np.asarray(rows, dtype=np.int64)
+        return self._gather(self.offsets[rows], self.offsets[rows + 1] - self.offsets[rows])
+
+    def clear(self, rows: np.ndarray) -> "TokenArrays":
+        """Copy with the given documents emptied (positions of the others are kept)"""
+        lengths = self.lengths()
+        lengths[np.asarray(rows, dtype=np.int64)] = 0
+        return self._gather(self.offsets[:-1], lengths)
+
+    def concat(self, other: "TokenArrays") -> "TokenArrays":
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return TokenArrays(np.concatenate([self.tokens, other.tokens]), offsets)
+
+    def _gather(self, starts: np.ndarray, lengths: np.ndarray) -> "TokenArrays":
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return TokenArrays(np.asarray(self.tokens[positions], dtype=np.int32), offsets)
+
+    def save(self, prefix: str):
+        np.save(f"{prefix}.npy", np.asarray(self.tokens))
+        np.save(f"{prefix}.offsets.npy", np.asarray(self.offsets))
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "TokenArrays":
+        mode = "r" if mmap else None
+        return cls(np.load(f"{prefix}.npy", mmap_mode=mode), np.load(f"{prefix}.offsets.npy", mmap_mode=mode))
@@ -0,0 +1,374 @@
+"""
+Inverted-index BM25 engine with precomputed impacts and MaxScore top-k pruning
+"""
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from src.retrieval.analyzer import TokenArrays, Vocabulary
+
+# Relative slack applied to upper bounds so float rounding never prunes a true top-k hit
+_BOUND_SLACK = 1e-6
+
+# A query is an array of term ids or a list of tokens
+Query = Union[np.ndarray, List[str]]
+
+
+class CollectionStats:
+    """
+    Corpus-wide BM25 statistics (document count, total length, document
+    frequency per term id), maintained incrementally as documents are added
+    and removed so that separately built segments score against the same
+    collection. Term ids come from the Vocabulary shared by those segments.
+    """
+
+    def __init__(self, num_docs: int = 0, total_len: int = 0, df: Optional[np.ndarray] = None):
+        self.num_docs = num_docs
+        self.total_len = total_len
+        self.df = np.asarray(df, dtype=np.int64) if df is not None else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_index(cls, index: "InvertedBM25Index") -> "CollectionStats":
+        return cls(index.corpus_size, int(np.asarray(index.doc_len).sum()), np.diff(index.offsets))
+
+    @classmethod
+    def from_tokens(cls, corpus: TokenArrays) -> "CollectionStats":
+        stats = cls()
+        stats.add(corpus)
+        return stats
+
+    @classmethod
+    def merge(cls, parts: Iterable["CollectionStats"]) -> "CollectionStats":
+        """Statistics of the union of disjoint collections (e.g. shards)"""
+        merged = cls()
+        for part in parts:
+            merged.num_docs += part.num_docs
+            merged.total_len += part.total_len
+            merged.df = _add_padded(merged.df, part.df)
+        return merged
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_len / max(self.num_docs, 1)
+
+    def add(self, corpus: TokenArrays):
+        self.num_docs += len(corpus)
+        self.total_len += int(corpus.offsets[-1] - corpus.offsets[0])
+        self.df = _add_padded(self.df, _document_frequencies(corpus))
+
+    def remove(self, corpus: TokenArrays):
+        self.num_docs -= len(corpus)
+        self.total_len -= int(corpus.offsets[-1] - corpus.offsets[0])
+        self.df = _add_padded(self.df, -_document_frequencies(corpus))
+
+    def idf(self, term_ids: np.ndarray, epsilon: float) -> np.ndarray:
+        """BM25Okapi idf of the given term ids against the whole collection"""
+        present = self.df[self.df > 0].astype(np.float64)
+        floor = epsilon * float(np.mean(np.log(self.num_docs - present + 0.5) - np.log(present + 0.5))) if len(present) else 0.0
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        df = np.zeros(len(term_ids), dtype=np.float64)
+        known = term_ids < len(self.df)
+        df[known] = self.df[term_ids[known]]
+        idf = np.log(self.num_docs - df + 0.5) - np.log(df + 0.5)
+        idf[idf < 0] = floor
+        return idf
+
+
+class InvertedBM25Index:
+    """
+    Okapi BM25 scored over postings lists stored as flat NumPy arrays.
+
+    Scores are identical to ``rank_bm25.BM25Okapi`` (same idf flooring with
+    ``epsilon * average_idf``), but each posting carries its precomputed
+    impact so a query only touches the postings of its own terms.
+
+    The corpus is either token lists or TokenArrays of term ids from `vocab`;
+    postings are addressed by those term ids, so segments and shards sharing
+    a Vocabulary also share term ids. Queries are term-id arrays or token lists.
+
+    When `stats` is given, idf and average length come from that collection
+    instead of this corpus alone, so the index can serve as one segment or
+    shard of a larger collection with consistent scores.
+    """
+
+    # Array attributes persisted by to_arrays() / restored by from_arrays()
+    ARRAY_FIELDS = ("offsets", "postings", "impacts", "max_impacts", "idf", "doc_len")
+
+    def __init__(
+        self,
+        corpus: Union[List[List[str]], TokenArrays],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        stats: Optional[CollectionStats] = None,
+        vocab: Optional[Vocabulary] = None
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        if not isinstance(corpus, TokenArrays):
+            vocab = vocab if vocab is not None else Vocabulary()
+            corpus = TokenArrays.from_lists(corpus, vocab)
+        elif vocab is None:
+            raise ValueError("A Vocabulary is required to index TokenArrays")
+        self.vocab = vocab
+        self._build(corpus, stats)
+        logger.info(
+            f"Built inverted BM25 index: {self.corpus_size} documents, "
+            f"{self.num_terms} terms, {len(self.postings)} postings"
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        vocab: Vocabulary,
+        arrays: Dict[str, np.ndarray],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25
+    ) -> "InvertedBM25Index":
+        """Restore an index from saved arrays (which may be read-only memmaps)"""
+        index = cls.__new__(cls)
+        index.k1 = k1
+        index.b = b
+        index.epsilon = epsilon
+        index.vocab = vocab
+        for field in cls.ARRAY_FIELDS:
+            setattr(index, field, arrays[field])
+        index.corpus_size = len(index.doc_len)
+        index.avgdl = float(index.doc_len.sum()) / max(index.corpus_size, 1)
+        return index
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore the index with from_arrays()"""
+        return {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+
+    @property
+    def num_terms(self) -> int:
+        """Term ids covered by the postings (the vocabulary size at build time)"""
+        return len(self.offsets) - 1
+
+    def _build(self, corpus: TokenArrays, stats: Optional[CollectionStats] = None):
+        """Build CSR postings (term id -> doc ids, impacts) in one vectorised pass"""
+        num_docs = len(corpus)
+        num_terms = len(self.vocab)
+        doc_len = corpus.lengths().astype(np.int32)
+
+        # Unique (term, doc) keys come out sorted by term, then doc id; their counts are term frequencies
+        doc_of_token = np.repeat(np.arange(num_docs, dtype=np.int64), doc_len)
+        keys = corpus.tokens[corpus.offsets[0]:corpus.offsets[-1]].astype(np.int64) * max(num_docs, 1) + doc_of_token
+        keys, tf = np.unique(keys, return_counts=True)
+        term_ids, doc_ids = np.divmod(keys, max(num_docs, 1))
+        df = np.bincount(term_ids, minlength=num_terms)
+
+        self.corpus_size = num_docs
+        self.doc_len = doc_len
+        self.offsets = np.zeros(num_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=self.offsets[1:])
+        self.postings = doc_ids.astype(np.int32)
+        if stats is None:
+            self.avgdl = float(doc_len.sum()) / max(self.corpus_size, 1)
+            self.idf = self._compute_idf(df)
+        else:
+            self.avgdl = stats.avgdl
+            self.idf = stats.idf(np.arange(num_terms), self.epsilon)
+
+        tf = tf.astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * doc_len[self.postings] / max(self.avgdl, 1e-9))
+        self.impacts = (self.idf[term_ids] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+        # Terms of a shared vocabulary may have no postings in this corpus
+        self.max_impacts = np.zeros(num_terms, dtype=np.float32)
+        present = df > 0
+        if len(self.impacts):
+            self.max_impacts[present] = np.maximum.reduceat(self.impacts, self.offsets[:-1][present])
+
+    def _compute_idf(self, df: np.ndarray) -> np.ndarray:
+        """BM25Okapi idf, flooring negative values at epsilon * average idf of the corpus terms"""
+        idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+        present = df > 0
+        if present.any():
+            idf[idf < 0] = self.epsilon * idf[present].mean()
+        return idf
+
+    def _query_terms(self, query: Query) -> Tuple[np.ndarray, np.ndarray]:
+        """Map a query to (term ids, repeat counts), dropping terms without postings"""
+        if isinstance(query, np.ndarray):
+            ids = query.astype(np.int64, copy=False)
+        else:
+            ids = np.array([self.vocab.get(token, -1) for token in query], dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < self.num_terms)]
+        term_ids, counts = np.unique(ids, return_counts=True)
+        keep = self.offsets[term_ids + 1] > self.offsets[term_ids]
+        return term_ids[keep], counts[keep].astype(np.float64)
+
+    def _postings(self, term_id: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        docs, impacts = self.postings[start:end], self.impacts[start:end]
+        if allowed is not None:
+            keep = allowed[docs]
+            docs, impacts = docs[keep], impacts[keep]
+        return docs, impacts
+
+    def get_scores(self, query: Query) -> np.ndarray:
+        """Score every document (drop-in for BM25Okapi.get_scores)"""
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        for term_id, weight in zip(*self._query_terms(query)):
+            docs, impacts = self._postings(term_id)
+            scores[docs] += weight * impacts
+        return scores
+
+    def top_k(
+        self,
+        query: Query,
+        k: int = 10,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (doc ids, scores) of the k best matching documents, best first.
+
+        Uses MaxScore dynamic pruning: terms are processed by descending upper
+        bound and, once the remaining bounds cannot beat the current k-th score,
+        new documents stop being admitted and the rest of the terms are only
+        probed for surviving candidates. Ties are broken by ascending doc id.
+        Documents matching none of the query terms are never returned.
+
+        allowed: optional boolean mask over doc ids; other documents are skipped
+        before scoring (filters, deleted documents).
+        """
+        term_ids, weights = self._query_terms(query)
+        if k <= 0 or len(term_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        bounds = weights * self.max_impacts[term_ids]
+        if (bounds < 0).any():
+            # Negative idf floor: bounds are no longer monotone, score exhaustively
+            return self._exhaustive_top_k(term_ids, weights, k, allowed)
+
+        order = np.argsort(-bounds, kind="stable")
+        term_ids, weights, bounds = term_ids[order], weights[order], bounds[order]
+        # remaining[i] = best total contribution of terms i.. onward
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        cand_docs = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+        threshold = -np.inf
+        i = 0
+
+        # Essential terms: every posting may introduce a new candidate
+        while i < len(term_ids):
+            docs, impacts = self._postings(term_ids[i], allowed)
+            cand_docs, cand_scores = _merge_accumulate(
+                cand_docs, cand_scores, docs, weights[i] * impacts
+            )
+            i += 1
+            threshold = _kth_largest(cand_scores, k)
+            if remaining[i] * (1 + _BOUND_SLACK) < threshold:
+                break
+
+        # Non-essential terms: only probe candidates that can still reach the threshold
+        for j in range(i, len(term_ids)):
+            alive = cand_scores + remaining[j] * (1 + _BOUND_SLACK) >= threshold
+            cand_docs, cand_scores = cand_docs[alive], cand_scores[alive]
+            docs, impacts = self._postings(term_ids[j])
+            if len(docs) == 0 or len(cand_docs) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+            hit = docs[pos] == cand_docs
+            cand_scores[hit] += weights[j] * impacts[pos[hit]]
+            threshold = max(threshold, _kth_largest(cand_scores, k))
+
+        return _select_top_k(cand_docs, cand_scores, k)
+
+    def top_k_many(
+        self,
+        queries: List[Query],
+        k: int = 10,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top k for a batch of queries in one vectorised pass.
+
+        The postings of every (query, term) pair are gathered once, scores are
+        accumulated on (query, doc) keys with a single bincount, and the per
+        query top k is cut from one lexicographic sort. Results match top_k().
+        """
+        query_rows, docs, scores = [], [], []
+        for row, query in enumerate(queries):
+            for term_id, weight in zip(*self._query_terms(query)):
+                term_docs, impacts = self._postings(term_id, allowed)
+                query_rows.append(np.full(len(term_docs), row, dtype=np.int64))
+                docs.append(term_docs)
+                scores.append(weight * impacts.astype(np.float64))
+
+        if k <= 0 or not docs:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+            return [empty for _ in queries]
+
+        keys = np.concatenate(query_rows) * self.corpus_size + np.concatenate(docs)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        key_scores = np.bincount(inverse, weights=np.concatenate(scores), minlength=len(unique_keys))
+        rows, doc_ids = np.divmod(unique_keys, self.corpus_size)
+
+        order = np.lexsort((doc_ids, -key_scores, rows))
+        rows, doc_ids, key_scores = rows[order], doc_ids[order], key_scores[order]
+        bounds = np.searchsorted(rows, np.arange(len(queries) + 1))
+        return [
+            (doc_ids[start:min(end, start + k)], key_scores[start:min(end, start + k)])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def _exhaustive_top_k(
+        self, term_ids: np.ndarray, weights: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        cand_docs = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+        for term_id, weight in zip(term_ids, weights):
+            docs, impacts = self._postings(term_id, allowed)
+            cand_docs, cand_scores = _merge_accumulate(cand_docs, cand_scores, docs, weight * impacts)
+        return _select_top_k(cand_docs, cand_scores, k)
+
+    def __len__(self) -> int:
+        return self.corpus_size
+
+
+def _document_frequencies(corpus: TokenArrays) -> np.ndarray:
+    """Number of documents containing each term id"""
+    doc_of_token = np.repeat(np.arange(len(corpus), dtype=np.int64), corpus.lengths())
+    tokens = corpus.tokens[corpus.offsets[0]:corpus.offsets[-1]].astype(np.int64)
+    pairs = np.unique(tokens * max(len(corpus), 1) + doc_of_token)
+    return np.bincount(pairs // max(len(corpus), 1))
+
+
+def _add_padded(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Elementwise sum of two count vectors of possibly different lengths"""
+    total = np.zeros(max(len(a), len(b)), dtype=np.int64)
+    total[:len(a)] += a
+    total[:len(b)] += b
+    return total
+
+
+def _merge_accumulate(
+    docs_a: np.ndarray, scores_a: np.ndarray, docs_b: np.ndarray, scores_b: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum two sparse (doc id, score) vectors keyed by doc id; result sorted by doc id"""
+    docs = np.concatenate([docs_a, docs_b.astype(np.int64)])
+    scores = np.concatenate([scores_a, scores_b.astype(np.float64)])
+    unique_docs, inverse = np.unique(docs, return_inverse=True)
+    return unique_docs, np.bincount(inverse, weights=scores, minlength=len(unique_docs))
+
+
+def _kth_largest(scores: np.ndarray, k: int) -> float:
+    if len(scores) < k:
+        return -np.inf
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+def _select_top_k(docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top k by descending score, ascending doc id on ties"""
+    if len(docs) > k:
+        keep = scores >= _kth_largest(scores, k)
+        docs, scores = docs[keep], scores[keep]
+    order = np.lexsort((docs, -scores))[:k]
+    return docs[order], scores[order]
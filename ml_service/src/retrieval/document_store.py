@@ -0,0 +1,308 @@
+"""
+Memory-mapped store of document texts, paper ids and metadata, addressed by row
+
+Layout of a store directory:
+    store.json        format and compression settings
+    records.bin       per row: paper id, text, metadata JSON (text and metadata optionally zlib-compressed)
+    offsets.npy       start of each field, three per row, plus the end of the last one
+    hashes.npy        64-bit hash of each row's paper id
+    table.npy         open-addressing hash table of rows keyed by paper id hash (-1 = empty)
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import weakref
+import zlib
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+STORE_FORMAT_VERSION = 1
+FIELDS = 3  # paper id, text, metadata
+MIN_TABLE_SIZE = 1024
+
+
+class _State(NamedTuple):
+    """Everything a reader needs, swapped as one object so readers never see half an append"""
+    blob: np.ndarray
+    offsets: np.ndarray
+    hashes: np.ndarray
+    table: np.ndarray
+
+
+class DocumentStore(Sequence):
+    """
+    Texts, paper ids and metadata of the indexed documents in one append-only
+    file that is memory-mapped and addressed by row.
+
+    Indexing the store returns the text of a row, so it stands in for a list
+    of documents. row(doc_id) finds the newest row of a paper id in O(1)
+    through a hash table, without a dict of every id. Only pages that are
+    read become resident, and processes mapping the same files share them.
+
+    Stores made with create() or copy() live in a temporary directory that
+    is removed with the store; open() maps a saved store read-only.
+    """
+
+    def __init__(self, path: str, compress: bool = False, state: Optional[_State] = None, writable: bool = True):
+        self.path = path
+        self.compress = compress
+        self.writable = writable
+        self._state = state or _State(
+            np.empty(0, dtype=np.uint8),
+            np.zeros(1, dtype=np.int64),
+            np.empty(0, dtype=np.uint64),
+            np.full(MIN_TABLE_SIZE, -1, dtype=np.int64),
+        )
+
+    @classmethod
+    def create(cls, directory: Optional[str] = None, compress: bool = False) -> "DocumentStore":
+        """Empty writable store in a new temporary directory (under `directory` if given)"""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        path = tempfile.mkdtemp(prefix="docstore-", dir=directory or None)
+        store = cls(path, compress=compress)
+        open(store._records_path, "wb").close()
+        weakref.finalize(store, shutil.rmtree, path, True)
+        return store
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "DocumentStore":
+        """Read-only store saved with save(); arrays are memory-mapped unless mmap=False"""
+        with open(os.path.join(path, "store.json")) as f:
+            info = json.load(f)
+        if info.get("format_version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported document store format {info.get('format_version')} at {path}")
+        mode = "r" if mmap else None
+        state = _State(
+            _load_blob(os.path.join(path, "records.bin"), mmap),
+            np.load(os.path.join(path, "offsets.npy"), mmap_mode=mode),
+            np.load(os.path.join(path, "hashes.npy"), mmap_mode=mode),
+            np.load(os.path.join(path, "table.npy"), mmap_mode=mode),
+        )
+        return cls(path, compress=info["compress"], state=state, writable=False)
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Sequence[str],
+        doc_ids: Sequence[str],
+        metadata: Optional[Sequence[Optional[Dict]]] = None,
+        directory: Optional[str] = None,
+        compress: bool = False
+    ) -> "DocumentStore":
+        store = cls.create(directory, compress=compress)
+        store.append(documents, doc_ids, metadata)
+        return store
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.path, "records.bin")
+
+    def __len__(self) -> int:
+        return len(self._state.hashes)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        return self._field(self._state, row, 1).decode("utf-8")
+
+    @property
+    def doc_ids(self) -> "DocIds":
+        """Paper ids by row, as a read-only sequence"""
+        return DocIds(self)
+
+    def doc_id(self, row: int) -> str:
+        return self._field(self._state, row, 0).decode("utf-8")
+
+    def metadata(self, row: int) -> Dict:
+        data = self._field(self._state, row, 2)
+        return json.loads(data) if data else {}
+
+    def row(self, doc_id: str) -> Optional[int]:
+        """Newest row holding doc_id, or None"""
+        state = self._state
+        key = doc_id.encode("utf-8")
+        h = _hash(key)
+        mask = len(state.table) - 1
+        slot = int(h) & mask
+        found = None
+        while True:
+            row = int(state.table[slot])
+            if row < 0:
+                return found
+            if state.hashes[row] == h and (found is None or row > found) and self._raw(state, row, 0) == key:
+                found = row
+            slot = (slot + 1) & mask
+
+    def append(
+        self,
+        documents: Sequence[str],
+        doc_ids: Sequence[str],
+        metadata: Optional[Sequence[Optional[Dict]]] = None
+    ) -> np.ndarray:
+        """Append documents as new rows and return the rows"""
+        self._ensure_writable()
+        if len(doc_ids) != len(documents):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(documents)} documents")
+        state = self._state
+        start = len(state.hashes)
+        metadata = metadata if metadata is not None else [None] * len(documents)
+
+        keys = [doc_id.encode("utf-8") for doc_id in doc_ids]
+        lengths = np.zeros(len(documents) * FIELDS, dtype=np.int64)
+        with open(self._records_path, "ab") as f:
+            for i, (key, text, paper) in enumerate(zip(keys, documents, metadata)):
+                fields = (key, self._pack(text.encode("utf-8")), self._pack(_dump_metadata(paper)))
+                for j, data in enumerate(fields):
+                    f.write(data)
+                    lengths[i * FIELDS + j] = len(data)
+
+        offsets = np.concatenate([state.offsets, state.offsets[-1] + np.cumsum(lengths)])
+        hashes = np.concatenate([state.hashes, np.array([_hash(key) for key in keys], dtype=np.uint64)])
+        rows = np.arange(start, len(hashes), dtype=np.int64)
+        if 2 * len(hashes) > len(state.table):
+            table = _build_table(hashes, np.arange(len(hashes), dtype=np.int64), _table_size(len(hashes)))
+        else:
+            table = _build_table(hashes[rows], rows, len(state.table), np.array(state.table))
+        self._state = _State(_load_blob(self._records_path, True), offsets, hashes, table)
+        return rows
+
+    def clear(self, rows: Iterable[int]):
+        """Drop the texts and metadata of rows (e.g. deleted documents); rows and ids are kept"""
+        self._ensure_writable()
+        rows = np.unique(np.asarray(list(rows), dtype=np.int64))
+        if len(rows) == 0:
+            return
+        state = self._state
+        staging = self._records_path + ".tmp"
+        lengths = np.diff(state.offsets)
+        empty = self._pack(b"")
+        # Copy the bytes between cleared rows in runs, writing an empty text in place of each
+        position = 0
+        with open(staging, "wb") as f:
+            for row in rows.tolist():
+                f.write(memoryview(state.blob[position:state.offsets[row * FIELDS + 1]]))
+                f.write(empty)
+                position = state.offsets[(row + 1) * FIELDS]
+            f.write(memoryview(state.blob[position:state.offsets[-1]]))
+        lengths[rows * FIELDS + 1] = len(empty)
+        lengths[rows * FIELDS + 2] = 0
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # Readers that mapped the old file keep it until they drop the old state
+        os.replace(staging, self._records_path)
+        self._state = _State(_load_blob(self._records_path, True), offsets, state.hashes, state.table)
+
+    def save(self, path: str):
+        """Write the store to a directory that open() can map"""
+        state = self._state
+        os.makedirs(path, exist_ok=True)
+        _write_blob(state.blob, os.path.join(path, "records.bin"))
+        np.save(os.path.join(path, "offsets.npy"), np.asarray(state.offsets))
+        np.save(os.path.join(path, "hashes.npy"), np.asarray(state.hashes))
+        np.save(os.path.join(path, "table.npy"), np.asarray(state.table))
+        with open(os.path.join(path, "store.json"), "w") as f:
+            json.dump({"format_version": STORE_FORMAT_VERSION, "compress": self.compress, "num_rows": len(self)}, f)
+
+    def copy(self, directory: Optional[str] = None) -> "DocumentStore":
+        """Writable copy in a new temporary directory (e.g. to update a store loaded from a snapshot)"""
+        store = DocumentStore.create(directory, compress=self.compress)
+        state = self._state
+        _write_blob(state.blob, store._records_path)
+        store._state = _State(
+            _load_blob(store._records_path, True),
+            np.array(state.offsets), np.array(state.hashes), np.array(state.table)
+        )
+        logger.info(f"Copied document store with {len(self)} rows to {store.path}")
+        return store
+
+    def _ensure_writable(self):
+        if not self.writable:
+            raise ValueError(f"Document store at {self.path} is read-only; use copy() to modify it")
+
+    def _pack(self, data: bytes) -> bytes:
+        return zlib.compress(data) if self.compress else data
+
+    def _field(self, state: _State, row: int, field: int) -> bytes:
+        data = self._raw(state, row, field)
+        return zlib.decompress(data) if self.compress and field > 0 and data else data
+
+    def _raw(self, state: _State, row: int, field: int) -> bytes:
+        if row < 0:
+            row += len(state.hashes)
+        if not 0 <= row < len(state.hashes):
+            raise IndexError(f"Row {row} out of range for {len(state.hashes)} documents")
+        i = row * FIELDS + field
+        return state.blob[state.offsets[i]:state.offsets[i + 1]].tobytes()
+
+
+class DocIds(Sequence):
+    """Read-only view of a store's paper ids by row"""
+
+    def __init__(self, store: DocumentStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        return self._store.doc_id(row)
+
+
+def _hash(key: bytes) -> np.uint64:
+    return np.uint64(int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little"))
+
+
+def _dump_metadata(paper: Optional[Dict]) -> bytes:
+    return json.dumps(paper, default=str).encode("utf-8") if paper else b""
+
+
+def _table_size(num_rows: int) -> int:
+    """Power of two keeping the load factor at or below 1/4 after a rebuild"""
+    size = MIN_TABLE_SIZE
+    while size < 4 * num_rows:
+        size *= 2
+    return size
+
+
+def _build_table(
+    hashes: np.ndarray, rows: np.ndarray, size: int, table: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Insert rows into a linear-probing table, all at once: in each round every
+    pending row whose slot is free claims it (the lowest row wins a contested
+    slot) and the others move one slot on. Slots are never freed, so every
+    row stays reachable by probing from its home slot.
+    """
+    if table is None:
+        table = np.full(size, -1, dtype=np.int64)
+    mask = size - 1
+    slots = (hashes & np.uint64(mask)).astype(np.int64)
+    pending = np.arange(len(rows))
+    while len(pending):
+        free = pending[table[slots[pending]] < 0]
+        _, first = np.unique(slots[free], return_index=True)
+        winners = free[first]
+        table[slots[winners]] = rows[winners]
+        pending = np.setdiff1d(pending, winners, assume_unique=True)
+        slots[pending] = (slots[pending] + 1) & mask
+    return table
+
+
+def _write_blob(blob: np.ndarray, path: str):
+    # From the mapped bytes rather than the file, which may have been replaced since
+    with open(path, "wb") as f:
+        f.write(memoryview(blob))
+
+
+def _load_blob(path: str, mmap: bool) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    if mmap:
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    return np.fromfile(path, dtype=np.uint8)
@@ -0,0 +1,90 @@
+"""
+Score fusion over the candidate set of sparse and dense retrieval
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+FUSION_METHODS = ("weighted", "rrf")
+
+
+def min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    """Normalize scores to [0, 1] range"""
+    if len(scores) == 0:
+        return scores.astype(np.float64)
+    min_score = scores.min()
+    max_score = scores.max()
+    if max_score == min_score:
+        return np.ones_like(scores, dtype=np.float64)
+    return (scores - min_score) / (max_score - min_score)
+
+
+def fuse_candidates(
+    sparse_ids: np.ndarray,
+    sparse_scores: np.ndarray,
+    dense_ids: np.ndarray,
+    dense_scores: np.ndarray,
+    method: str = "weighted",
+    alpha: float = 0.5,
+    rrf_k: int = 60
+) -> Dict[str, np.ndarray]:
+    """
+    Fuse two ranked candidate lists keyed by document id.
+
+    Both lists must be ordered best first. Only the union of the two lists is
+    scored, so the work is proportional to the candidate count, not the corpus.
+
+    method="weighted": alpha * minmax(dense) + (1 - alpha) * minmax(sparse),
+        where a document missing from one list gets 0 for that component.
+    method="rrf": reciprocal rank fusion, sum of 1 / (rrf_k + rank) per list.
+
+    Returns arrays "ids", "scores", "sparse_scores" and "dense_scores" (raw
+    per-list scores, 0 when absent), ordered by descending fused score with
+    ascending id on ties.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}. Use one of {FUSION_METHODS}")
+
+    sparse_ids = np.asarray(sparse_ids, dtype=np.int64)
+    dense_ids = np.asarray(dense_ids, dtype=np.int64)
+    sparse_scores = np.asarray(sparse_scores, dtype=np.float64)
+    dense_scores = np.asarray(dense_scores, dtype=np.float64)
+
+    ids = np.union1d(sparse_ids, dense_ids)
+    sparse_pos, in_sparse = _positions(ids, sparse_ids)
+    dense_pos, in_dense = _positions(ids, dense_ids)
+
+    if method == "weighted":
+        sparse_part = _gather(min_max_normalize(sparse_scores), sparse_pos, in_sparse)
+        dense_part = _gather(min_max_normalize(dense_scores), dense_pos, in_dense)
+        fused = alpha * dense_part + (1 - alpha) * sparse_part
+    else:
+        # Lists are best first, so a document's rank is its position + 1
+        fused = (
+            np.where(in_sparse, 1.0 / (rrf_k + sparse_pos + 1), 0.0)
+            + np.where(in_dense, 1.0 / (rrf_k + dense_pos + 1), 0.0)
+        )
+
+    order = np.lexsort((ids, -fused))
+    return {
+        "ids": ids[order],
+        "scores": fused[order],
+        "sparse_scores": _gather(sparse_scores, sparse_pos, in_sparse)[order],
+        "dense_scores": _gather(dense_scores, dense_pos, in_dense)[order],
+    }
+
+
+def _positions(ids: np.ndarray, ranked_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Position of each id within ranked_ids, and whether it occurs there at all"""
+    if len(ranked_ids) == 0:
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    sorter = np.argsort(ranked_ids, kind="stable")
+    idx = np.minimum(np.searchsorted(ranked_ids, ids, sorter=sorter), len(ranked_ids) - 1)
+    positions = sorter[idx]
+    return positions, ranked_ids[positions] == ids
+
+
+def _gather(values: np.ndarray, positions: np.ndarray, present: np.ndarray) -> np.ndarray:
+    if len(values) == 0:
+        return np.zeros(len(positions), dtype=np.float64)
+    return np.where(present, values[positions], 0.0)
@@ -1,79 +1,725 @@
 """
 Hybrid retrieval combining BM25 (sparse) and dense vector search
 """
+import os
+import threading
+
+import faiss
 import numpy as np
 from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
-import faiss
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple
 from loguru import logger
 
+from src.retrieval.analyzer import Analyzer, TokenArrays, Vocabulary
+from src.retrieval.document_store import DocumentStore
+from src.retrieval.fusion import fuse_candidates
+from src.retrieval.metadata_index import MetadataIndex
+from src.retrieval.passages import PassageIndex, mean_by_owner
+from src.retrieval.segments import SegmentedBM25
+from src.retrieval.snapshot import save_snapshot, load_snapshot, read_manifest
+from src.utils.ann_index import (
+    build_ann_index, ann_search, dense_hits, default_ann_config, live_id_selector, without_ids,
+    binarize, binary_search, binary_without_ids, build_binary_index, reconstruct
+)
+from src.utils.cache import LRUCache
+from src.utils.config import get_default_config
+from src.utils.inference import load_sentence_encoder
+from src.utils.locks import ReadWriteLock
+from src.utils.vector_db import FloatVectors
+
+SPARSE_BACKENDS = ("inverted", "rank_bm25")
+
 
 class HybridRetriever:
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        sparse_backend: str = "inverted",
+        rrf_k: int = 60,
+        ann_config: Optional[Dict] = None,
+        encode_batch_size: int = 64,
+        query_cache_size: Optional[int] = None,
+        query_cache_ttl: Optional[float] = None,
+        analyzer: Optional[Analyzer] = None,
+        passage_config: Optional[Dict] = None
+    ):
+        if sparse_backend not in SPARSE_BACKENDS:
+            raise ValueError(f"Unknown sparse backend: {sparse_backend}. Use one of {SPARSE_BACKENDS}")
+        self.sparse_backend = sparse_backend
+        self.rrf_k = rrf_k
+        self.ann_config = ann_config or default_ann_config()
+        self.passage_config = passage_config or get_default_config()["passages"]
+        self.encode_batch_size = encode_batch_size
+        
+        # Query embeddings keyed by (model, normalised query); repeated queries skip the encoder
+        retrieval_config = get_default_config()["retrieval"]
+        if query_cache_size is None:
+            query_cache_size = retrieval_config["query_cache_size"]
+        if query_cache_ttl is None:
+            query_cache_ttl = retrieval_config["query_cache_ttl"] or None
+        self.query_cache = LRUCache(max_size=query_cache_size, ttl_seconds=query_cache_ttl)
+        self.analyzer = analyzer or Analyzer(stem=retrieval_config["bm25_stemming"])
+        self.model_name = model_name
         self.bm25_index = None
-        self.dense_model = SentenceTransformer(model_name)
+        self.tokens = TokenArrays()  # term ids of every row, for statistics on delete and compaction
+        self.dense_model = load_sentence_encoder(model_name)  # torch or ONNX Runtime (RETRIEVER_BACKEND)
         self.faiss_index = None
-        self.documents = []
-        logger.info(f"Initialized HybridRetriever with model: {model_name}")
+        self.binary_index = None  # sign-bit codes for the two-stage dense search (ANN_BINARY_INDEX)
+        self.vectors = None  # float32 embeddings by row on disk, to re-score binary candidates
+        self.passages = None  # dense index over overlapping passages (PASSAGE_INDEX)
+        self.store_config = {
+            "directory": retrieval_config["document_store_dir"],
+            "compress": retrieval_config["document_store_compress"],
+        }
+        self.store = DocumentStore.create(**self.store_config)
+        self.metadata = MetadataIndex()
+        
+        # Rows are internal ids: positions in the document store and FAISS ids.
+        # They are never reused, deleted rows are tombstoned until compaction.
+        self._deleted = np.zeros(0, dtype=bool)
+        self._live_filter = None  # (FAISS selector, bitmap it points into) while rows are deleted
+        self._pending_dense_deletes = 0
+        self._mapped_snapshot = None  # (path, version) while serving a memory-mapped snapshot
+        
+        # Writers (build, add, update, delete, compact) are serialised; the
+        # index lock only excludes queries while a FAISS index is mutated or swapped
+        self._write_lock = threading.RLock()
+        self._index_lock = ReadWriteLock()
+        logger.info(f"Initialized HybridRetriever with model: {model_name} (sparse: {sparse_backend})")
+    
+    @property
+    def documents(self) -> DocumentStore:
+        """Document texts by row (memory-mapped)"""
+        return self.store
+    
+    @property
+    def doc_ids(self) -> Sequence[str]:
+        """Paper ids by row"""
+        return self.store.doc_ids
     
-    def build_index(self, documents: List[str]):
-        """Build both BM25 and FAISS indices"""
-        self.documents = documents
+    def build_index(
+        self,
+        documents: List[str],
+        doc_ids: Optional[List[str]] = None,
+        metadata: Optional[List[Dict]] = None
+    ):
+        """
+        Build both BM25 and FAISS indices (doc_ids default to positions)
+        metadata: optional per-document dicts (year, journal, study type, ...) for filtering
+        """
+        if doc_ids is not None and len(doc_ids) != len(documents):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(documents)} documents")
+        doc_ids = list(doc_ids) if doc_ids is not None else [str(i) for i in range(len(documents))]
+        if len(set(doc_ids)) != len(doc_ids):
+            raise ValueError("Doc ids must be unique")
+        rows = np.arange(len(documents), dtype=np.int64)
         
-        # Build BM25 index
-        tokenized_docs = [doc.split() for doc in documents]
-        self.bm25_index = BM25Okapi(tokenized_docs)
-        logger.info(f"Built BM25 index for {len(documents)} documents")
+        with self._write_lock:
+            # Build BM25 index
+            tokens = TokenArrays()
+            if self.sparse_backend == "inverted":
+                vocab = Vocabulary()
+                tokens = self.analyzer.encode(documents, vocab)
+                bm25_index = SegmentedBM25.build(tokens, rows, vocab=vocab)
+            else:
+                bm25_index = BM25Okapi([self._tokenize(doc) for doc in documents])
+            logger.info(f"Built BM25 index ({self.sparse_backend}) for {len(documents)} documents")
+            
+            # Build dense embeddings and FAISS index
+            passages = self._new_passage_index() if self.passage_config["enabled"] else None
+            embeddings, passage_embeddings, spans = self._embed_documents(
+                documents, passages, show_progress_bar=True
+            )
+            dimension = embeddings.shape[1]
+            faiss_index = build_ann_index(embeddings, self.ann_config, ids=rows)
+            binary_index, vectors = self._build_binary(embeddings, rows)
+            if passages is not None:
+                passages.add(passage_embeddings, spans)
+            logger.info(f"Built FAISS index with dimension {dimension}")
+            
+            metadata_index = MetadataIndex()
+            metadata_index.add(metadata or [None] * len(documents), rows)
+            store = DocumentStore.from_documents(documents, doc_ids, metadata, **self.store_config)
+            
+            with self._index_lock.write():
+                self.store = store
+                self.bm25_index = bm25_index
+                self.tokens = tokens
+                self.faiss_index = faiss_index
+                self.binary_index = binary_index
+                self.vectors = vectors
+                self.passages = passages
+                self.metadata = metadata_index
+                self._deleted = np.zeros(len(documents), dtype=bool)
+                self._live_filter = None
+                self._pending_dense_deletes = 0
+                self._mapped_snapshot = None
+    
+    def add_documents(self, documents: List[str], doc_ids: List[str], metadata: Optional[List[Dict]] = None):
+        """
+        Index new documents without rebuilding: they get fresh rows, are added
+        to the FAISS id map and go into the BM25 delta segment.
+        """
+        if len(doc_ids) != len(documents):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(documents)} documents")
+        if not documents:
+            return
+        
+        with self._write_lock:
+            self._ensure_mutable()
+            duplicates = [doc_id for doc_id in doc_ids if self._live_row(doc_id) is not None]
+            if duplicates or len(set(doc_ids)) != len(doc_ids):
+                raise ValueError(f"Doc ids already indexed or repeated: {duplicates[:5]}. Use update_documents().")
+            
+            # Encoding is the slow part and runs while queries are still served
+            tokens = self.analyzer.encode(documents, self.bm25_index.vocab)
+            embeddings, passage_embeddings, spans = self._embed_documents(documents, self.passages)
+            
+            # Rows become resolvable before any index can return them
+            rows = self.store.append(documents, doc_ids, metadata)
+            self.metadata.add(metadata or [None] * len(documents), rows)
+            if self.vectors is not None:
+                self.vectors.append(embeddings)
+            deleted = np.concatenate([self._deleted, np.zeros(len(documents), dtype=bool)])
+            
+            with self._index_lock.write():
+                self.faiss_index.add_with_ids(np.ascontiguousarray(embeddings, dtype='float32'), rows)
+                if self.binary_index is not None:
+                    self.binary_index.add_with_ids(binarize(embeddings), rows)
+                if self.passages is not None:
+                    self.passages.add(passage_embeddings, dict(spans, owners=rows[spans["owners"]]))
+                self._deleted = deleted
+                if self._live_filter is not None:
+                    self._live_filter = live_id_selector(~deleted)
+            self.tokens = self.tokens.concat(tokens)
+            self.bm25_index.add(tokens, rows)
+            logger.info(f"Added {len(documents)} documents ({len(self.store)} rows, {self.num_deleted} deleted)")
+    
+    def delete_documents(self, doc_ids: List[str]) -> int:
+        """Tombstone documents by id; returns how many were found and deleted"""
+        with self._write_lock:
+            self._ensure_mutable()
+            found = {doc_id: self._live_row(doc_id) for doc_id in doc_ids}
+            missing = [doc_id for doc_id, row in found.items() if row is None]
+            if missing:
+                logger.warning(f"Ignoring {len(missing)} unknown doc ids on delete: {missing[:5]}")
+            rows = np.array(sorted({row for row in found.values() if row is not None}), dtype=np.int64)
+            if len(rows) == 0:
+                return 0
+            
+            deleted = self._deleted.copy()
+            deleted[rows] = True
+            live_filter = live_id_selector(~deleted)
+            with self._index_lock.write():
+                self._deleted = deleted
+                self._live_filter = live_filter
+                self._pending_dense_deletes += len(rows)
+            self.bm25_index.delete(rows, self.tokens.take(rows))
+            
+            logger.info(f"Deleted {len(rows)} documents ({self.num_deleted} awaiting compaction)")
+            return len(rows)
+    
+    def update_documents(self, documents: List[str], doc_ids: List[str], metadata: Optional[List[Dict]] = None):
+        """Replace the text of documents by id (ids not indexed yet are added)"""
+        with self._write_lock:
+            self._ensure_mutable()
+            self.delete_documents([doc_id for doc_id in doc_ids if self._live_row(doc_id) is not None])
+            self.add_documents(documents, doc_ids, metadata=metadata)
+    
+    @property
+    def num_deleted(self) -> int:
+        """Deleted documents still held in the indexes until compaction"""
+        return self._pending_dense_deletes
+    
+    def compact(self, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Rebuild the indexes without tombstones and fold the BM25 delta into the
+        base segment with fresh collection statistics.
         
-        # Build dense embeddings and FAISS index
-        embeddings = self.dense_model.encode(documents, show_progress_bar=True)
-        dimension = embeddings.shape[1]
+        Queries keep being served from the old indexes while the new ones are
+        built; they are swapped in under a short exclusive lock. With
+        background=True the work runs in a daemon thread, which is returned.
+        """
+        if self.sparse_backend == "inverted" and (self.bm25_index is None or self.faiss_index is None):
+            raise ValueError("Index not built. Call build_index() first.")
+        if background:
+            thread = threading.Thread(target=self._compact_logged, name="retriever-compaction", daemon=True)
+            thread.start()
+            return thread
         
-        self.faiss_index = faiss.IndexFlatL2(dimension)
-        self.faiss_index.add(embeddings.astype('float32'))
-        logger.info(f"Built FAISS index with dimension {dimension}")
+        with self._write_lock:
+            if self.sparse_backend != "inverted" or not (self.bm25_index.is_dirty or self._pending_dense_deletes):
+                return None
+            self._ensure_mutable()
+            
+            live_rows = np.flatnonzero(~self._deleted)
+            bm25_index = SegmentedBM25.build(self.tokens.take(live_rows), live_rows, vocab=self.bm25_index.vocab)
+            faiss_index, binary_index, passages = self.faiss_index, self.binary_index, self.passages
+            if self._pending_dense_deletes:
+                if passages is not None:
+                    passages = passages.without_rows(np.flatnonzero(self._deleted))
+                faiss_index = without_ids(self.faiss_index, np.flatnonzero(self._deleted), self.ann_config)
+                if binary_index is not None:
+                    binary_index = binary_without_ids(
+                        binary_index, np.flatnonzero(self._deleted), self.ann_config.get("hnsw_m", 32)
+                    )
+            
+            with self._index_lock.write():
+                self.bm25_index = bm25_index
+                self.faiss_index = faiss_index
+                self.binary_index = binary_index
+                self.passages = passages
+                self._live_filter = None
+                self._pending_dense_deletes = 0
+            
+            # Tombstoned texts are no longer reachable from any index
+            deleted_rows = np.flatnonzero(self._deleted)
+            self.store.clear(deleted_rows)
+            self.tokens = self.tokens.clear(deleted_rows)
+            logger.info(f"Compacted retriever to {len(live_rows)} live documents")
+            return None
+    
+    def _compact_logged(self):
+        """Background compaction: errors would otherwise end the thread unseen"""
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Background compaction failed: {str(e)}")
+    
+    def _live_row(self, doc_id: str) -> Optional[int]:
+        """Row of a doc id unless it is unknown or deleted"""
+        row = self.store.row(doc_id)
+        deleted = self._deleted
+        if row is None or row >= len(deleted) or deleted[row]:
+            return None
+        return row
+    
+    def get_document(self, doc_id: str) -> Optional[Dict]:
+        """Text and metadata of an indexed document by paper id"""
+        row = self._live_row(doc_id)
+        if row is None:
+            return None
+        return {"doc_id": doc_id, "document": self.store[row], "metadata": self.store.metadata(row)}
+    
+    def embed_document(self, doc_id: str) -> Optional[np.ndarray]:
+        """
+        Dense embedding of an indexed document, or None when the id is unknown.
+        The vector is the one indexed: the exact float32 row when vectors are
+        kept on disk, else the FAISS index's stored copy. The document is only
+        encoded again when neither holds it (e.g. on a sharded retriever).
+        """
+        stored = self._stored_embedding(doc_id)
+        if stored is not None:
+            return stored
+        document = self.get_document(doc_id)
+        if document is None:
+            return None
+        return self._embed_documents([document["document"]], self.passages)[0][0]
+    
+    def _stored_embedding(self, doc_id: str) -> Optional[np.ndarray]:
+        if self.faiss_index is None:
+            return None
+        row = self._live_row(doc_id)
+        if row is None:
+            return None
+        if self.vectors is not None and row < len(self.vectors):
+            return np.array(self.vectors.array[row])
+        # Write lock: the first IVF lookup builds the index's id map
+        with self._index_lock.write():
+            try:
+                return reconstruct(self.faiss_index, row)
+            except RuntimeError:
+                # Index types that cannot reconstruct vectors
+                return None
+    
+    def _ensure_mutable(self):
+        """Incremental updates need in-memory, writable indexes"""
+        if self.sparse_backend != "inverted":
+            raise ValueError("Incremental updates require the 'inverted' sparse backend")
+        if self.bm25_index is None or self.faiss_index is None:
+            raise ValueError("Index not built. Call build_index() first.")
+        if self._mapped_snapshot is not None:
+            # Memory-mapped FAISS indexes are read-only and cannot be cloned,
+            # so read the snapshot's index file again into memory
+            path, version = self._mapped_snapshot
+            if read_manifest(path)["version"] != version:
+                raise ValueError(f"Snapshot at {path} changed since it was loaded; reload it before updating")
+            faiss_index = faiss.read_index(os.path.join(path, "dense.faiss"))
+            passages = self.passages
+            if passages is not None:
+                passages = PassageIndex.load(
+                    os.path.join(path, "passages"), passages.words, passages.overlap, self.ann_config, mmap=False
+                )
+            with self._index_lock.write():
+                self.faiss_index = faiss_index
+                self.passages = passages
+                self._deleted = np.array(self._deleted)
+            self._mapped_snapshot = None
+            logger.info("Loaded snapshot into memory for incremental updates")
+        if not self.store.writable:
+            # Snapshot stores are read-only; appends go to a private copy
+            self.store = self.store.copy(self.store_config["directory"])
+        if self.vectors is not None and not self.vectors.writable:
+            self.vectors = self.vectors.copy(self.store_config["directory"])
+    
+    def _new_passage_index(self) -> PassageIndex:
+        return PassageIndex(self.passage_config["words"], self.passage_config["overlap"], self.ann_config)
+    
+    def _embed_documents(
+        self, documents: List[str], passages: Optional[PassageIndex], **encode_kwargs
+    ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[Dict[str, np.ndarray]]]:
+        """
+        Paper embeddings, plus passage embeddings and spans (owners numbered
+        from 0) when a passage index is kept. A paper's embedding is then the
+        mean of its passages, so text past the encoder's window is not lost.
+        """
+        encode_kwargs.setdefault("batch_size", self.encode_batch_size)
+        if passages is None:
+            embeddings = self.dense_model.encode(list(documents), **encode_kwargs)
+            return np.asarray(embeddings, dtype='float32'), None, None
+        texts, spans = passages.split(documents, np.arange(len(documents)))
+        passage_embeddings = np.asarray(self.dense_model.encode(texts, **encode_kwargs), dtype='float32')
+        return mean_by_owner(passage_embeddings, spans["owners"], len(documents)), passage_embeddings, spans
+    
+    def _build_binary(
+        self, embeddings: np.ndarray, rows: np.ndarray
+    ) -> Tuple[Optional[faiss.IndexBinary], Optional[FloatVectors]]:
+        """Binary prefilter codes and the float vectors they are re-scored from, when enabled"""
+        binary_type = self.ann_config.get("binary_index", "none")
+        if binary_type == "none":
+            return None, None
+        vectors = FloatVectors(embeddings.shape[1], directory=self.store_config["directory"])
+        vectors.append(embeddings)
+        return build_binary_index(embeddings, rows, binary_type, self.ann_config.get("hnsw_m", 32)), vectors
     
-    def retrieve(self, query: str, k: int = 10, alpha: float = 0.5) -> List[Dict]:
+    def close(self):
+        """Release resources held outside this process (none for a single-process retriever)"""
+    
+    def _tokenize(self, text: str) -> List[str]:
+        return self.analyzer.analyze(text)
+    
+    def save_snapshot(self, path: str, version: Optional[str] = None) -> Dict:
+        """Persist indexes, texts and ids so a new process can start without rebuilding"""
+        with self._write_lock:
+            return save_snapshot(self, path, version=version)
+    
+    def load_snapshot(self, path: str, mmap: bool = True) -> Dict:
+        """Load a snapshot written by save_snapshot (memory-mapped by default)"""
+        with self._write_lock:
+            with self._index_lock.write():
+                manifest = load_snapshot(self, path, mmap=mmap)
+            self._live_filter = None
+            self._pending_dense_deletes = 0
+            self._mapped_snapshot = (os.path.abspath(path), manifest["version"]) if mmap else None
+            return manifest
+    
+    def retrieve(
+        self,
+        query: str,
+        k: int = 10,
+        alpha: float = 0.5,
+        fusion: str = "weighted",
+        candidate_k: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[Dict]:
         """
         Hybrid retrieval combining BM25 and dense search
-        alpha: weight for dense score (1-alpha for BM25)
+        alpha: weight for dense score (1-alpha for BM25), used by weighted fusion
+        fusion: "weighted" (min-max weighted sum) or "rrf" (reciprocal rank fusion)
+        candidate_k: depth of each candidate list (defaults to k)
+        nprobe / ef_search: per-request ANN search settings (IVF / HNSW indexes)
+        filters: metadata filters applied before scoring (see MetadataIndex)
+        binary_prefilter: dense search over binary codes plus exact re-scoring
+            (faster and smaller, slightly lower recall; defaults to ANN_BINARY_PREFILTER)
         """
         if self.bm25_index is None or self.faiss_index is None:
             raise ValueError("Index not built. Call build_index() first.")
         
+        depth = max(k, candidate_k or k)
+        allowed = self.metadata.mask(filters)
+        
         # BM25 retrieval
-        tokenized_query = query.split()
-        bm25_scores = self.bm25_index.get_scores(tokenized_query)
-        bm25_scores = self._normalize_scores(bm25_scores)
+        sparse_ids, sparse_scores = self.sparse_search(query, k=depth, allowed=allowed)
         
         # Dense retrieval
-        query_embedding = self.dense_model.encode([query])
-        distances, indices = self.faiss_index.search(query_embedding.astype('float32'), k)
-        dense_scores = self._normalize_scores(1 / (1 + distances[0]))  # Convert distance to similarity
+        dense_ids, dense_scores, best_passages = self._dense_hits_many(
+            [query], k=depth, nprobe=nprobe, ef_search=ef_search, allowed=allowed, binary_prefilter=binary_prefilter
+        )[0]
         
-        # Combine scores
-        combined_scores = alpha * dense_scores + (1 - alpha) * bm25_scores
+        return self._fuse(
+            sparse_ids, sparse_scores, dense_ids, dense_scores, k, alpha, fusion, best_passages=best_passages
+        )
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        k: int = 10,
+        alpha: float = 0.5,
+        fusion: str = "weighted",
+        candidate_k: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[List[Dict]]:
+        """
+        Hybrid retrieval for a batch of queries (same arguments as retrieve,
+        filters apply to every query). Queries are encoded in one batch,
+        searched with one multi-row FAISS call and BM25-scored in one
+        vectorised pass.
+        """
+        if self.bm25_index is None or self.faiss_index is None:
+            raise ValueError("Index not built. Call build_index() first.")
+        if not queries:
+            return []
         
-        # Get top k results
-        top_indices = np.argsort(combined_scores)[::-1][:k]
+        depth = max(k, candidate_k or k)
+        allowed = self.metadata.mask(filters)
+        sparse = self.sparse_search_many(queries, k=depth, allowed=allowed)
+        dense = self._dense_hits_many(
+            queries, k=depth, nprobe=nprobe, ef_search=ef_search, allowed=allowed, binary_prefilter=binary_prefilter
+        )
+        
+        return [
+            self._fuse(
+                sparse_ids, sparse_scores, dense_ids, dense_scores, k, alpha, fusion, best_passages=best_passages
+            )
+            for (sparse_ids, sparse_scores), (dense_ids, dense_scores, best_passages) in zip(sparse, dense)
+        ]
+    
+    def _fuse(
+        self,
+        sparse_ids: np.ndarray,
+        sparse_scores: np.ndarray,
+        dense_ids: np.ndarray,
+        dense_scores: np.ndarray,
+        k: int,
+        alpha: float,
+        fusion: str,
+        documents: Optional[Dict[int, Tuple[str, str]]] = None,
+        best_passages: Optional[List[np.ndarray]] = None
+    ) -> List[Dict]:
+        """
+        Fuse over the union of both candidate lists and format the top k
+        documents: optional row -> (doc_id, text) for rows not held in this process
+        best_passages: best passage ids of each dense hit, attached as snippets
+        """
+        fused = fuse_candidates(
+            sparse_ids, sparse_scores,
+            dense_ids, dense_scores,
+            method=fusion,
+            alpha=alpha,
+            rrf_k=self.rrf_k
+        )
         
         results = []
-        for idx in top_indices:
+        for i in range(min(k, len(fused["ids"]))):
+            idx = int(fused["ids"][i])
+            doc_id, document = documents[idx] if documents is not None else (self.doc_ids[idx], self.documents[idx])
             results.append({
-                "document": self.documents[idx],
-                "score": float(combined_scores[idx]),
-                "bm25_score": float(bm25_scores[idx]),
-                "dense_score": float(dense_scores[idx] if idx < len(dense_scores) else 0)
+                "id": idx,
+                "doc_id": doc_id,
+                "document": document,
+                "score": float(fused["scores"][i]),
+                "bm25_score": float(fused["sparse_scores"][i]),
+                "dense_score": float(fused["dense_scores"][i])
             })
         
+        if self.passages is not None and documents is None:
+            self._attach_passages(results, dense_ids, best_passages)
         return results
     
-    def _normalize_scores(self, scores: np.ndarray) -> np.ndarray:
-        """Normalize scores to [0, 1] range"""
-        min_score = scores.min()
-        max_score = scores.max()
-        if max_score == min_score:
-            return np.ones_like(scores)
-        return (scores - min_score) / (max_score - min_score)
-
+    def _attach_passages(
+        self, results: List[Dict], dense_ids: np.ndarray, best_passages: Optional[List[np.ndarray]]
+    ):
+        """Add the best matching passages of each result as "passages" (the first passage for BM25-only hits)"""
+        passages = self.passages
+        best = dict(zip(dense_ids.tolist(), best_passages)) if best_passages is not None else {}
+        for result in results:
+            passage_ids = best.get(result["id"])
+            if passage_ids is None:
+                # Passages are added in row order, so a row's first passage is found by bisection
+                first = int(np.searchsorted(passages.owners, result["id"]))
+                passage_ids = [first] if first < len(passages) and passages.owners[first] == result["id"] else []
+            snippets = []
+            for passage_id in passage_ids:
+                _, start, end = passages.span(int(passage_id))
+                snippets.append(result["document"][start:end])
+            result["passages"] = snippets
+    
+    def dense_search(
+        self,
+        query: str,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed: Optional[np.ndarray] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense top-k as (document rows, similarities), best first"""
+        return self.dense_search_many(
+            [query], k=k, nprobe=nprobe, ef_search=ef_search, allowed=allowed, binary_prefilter=binary_prefilter
+        )[0]
+    
+    def dense_search_many(
+        self,
+        queries: List[str],
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed: Optional[np.ndarray] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Dense top-k for each query from one encode batch and one multi-row search
+        allowed: optional boolean mask over rows; other documents are skipped by FAISS
+        binary_prefilter: search the binary codes and re-score the candidates exactly
+            (None: ANN_BINARY_PREFILTER, when the binary index is built)
+        With a passage index, documents are ranked by their best passages.
+        """
+        return [
+            (rows, scores)
+            for rows, scores, _ in self._dense_hits_many(
+                queries, k=k, nprobe=nprobe, ef_search=ef_search, allowed=allowed, binary_prefilter=binary_prefilter
+            )
+        ]
+    
+    def _dense_hits_many(
+        self,
+        queries: List[str],
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed: Optional[np.ndarray] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, Optional[List[np.ndarray]]]]:
+        """dense_search_many, plus the best passage ids of each hit when searching passages"""
+        if self.faiss_index is None:
+            raise ValueError("Index not built. Call build_index() first.")
+        if binary_prefilter and self.binary_index is None:
+            raise ValueError("Binary prefilter requested but no binary index was built (set ANN_BINARY_INDEX)")
+        if binary_prefilter is None:
+            binary_prefilter = self.ann_config.get("binary_prefilter", False) and self.binary_index is not None
+        
+        query_embeddings = self.encode_queries(queries)
+        if binary_prefilter:
+            return [(rows, scores, None) for rows, scores in self._binary_search(query_embeddings, k, allowed)]
+        if self.passages is not None:
+            return self._passage_search(query_embeddings, k, nprobe, ef_search, allowed)
+        with self._index_lock.read():
+            # Deleted and filtered-out rows are skipped inside the search so k allowed results come back
+            live_filter = self._live_filter
+            if allowed is not None:
+                n = min(len(allowed), len(self._deleted))
+                live_filter = live_id_selector(allowed[:n] & ~self._deleted[:n])
+            selector = live_filter[0] if live_filter is not None else None
+            distances, indices = ann_search(
+                self.faiss_index, query_embeddings, k,
+                nprobe=nprobe, ef_search=ef_search, selector=selector
+            )
+        
+        return [(rows, scores, None) for rows, scores in dense_hits(distances, indices)]
+    
+    def _passage_search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        allowed: Optional[np.ndarray]
+    ) -> List[Tuple[np.ndarray, np.ndarray, List[np.ndarray]]]:
+        """Search the passage index and aggregate passage scores to document level"""
+        with self._index_lock.read():
+            live = self._live_rows(allowed)
+            return self.passages.search(
+                query_embeddings, k, live_rows=live,
+                method=self.passage_config.get("aggregation", "max"), top=self.passage_config.get("top", 2),
+                nprobe=nprobe, ef_search=ef_search
+            )
+    
+    def _binary_search(
+        self, query_embeddings: np.ndarray, k: int, allowed: Optional[np.ndarray]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Hamming search over the binary codes, then exact re-scoring of the candidate pool"""
+        with self._index_lock.read():
+            # Deleted and filtered-out rows are dropped from the pool before re-scoring
+            live = self._live_rows(allowed)
+            distances, indices = binary_search(
+                self.binary_index, self.vectors.array, query_embeddings, k,
+                candidates=self.ann_config.get("binary_candidates", 1000), allowed=live
+            )
+        return dense_hits(distances, indices)
+    
+    def _live_rows(self, allowed: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Mask of rows that are allowed and not deleted, or None when every row is"""
+        if allowed is None and not self._pending_dense_deletes:
+            return None
+        live = ~self._deleted
+        if allowed is not None:
+            n = min(len(allowed), len(live))
+            live[:n] &= allowed[:n]
+            live[n:] = False
+        return live
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries, encoding only those not in the query cache (in one batch)"""
+        keys = [(self.model_name, self._normalize_query(query)) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = {}
+        for i, (key, embedding) in enumerate(zip(keys, embeddings)):
+            if embedding is None:
+                missing.setdefault(key, []).append(i)
+        
+        if missing:
+            encoded = self.dense_model.encode(
+                [text for _, text in missing], batch_size=self.encode_batch_size
+            )
+            for (key, positions), embedding in zip(missing.items(), encoded):
+                embedding = np.asarray(embedding, dtype='float32')
+                embedding.setflags(write=False)  # shared between requests
+                self.query_cache.put(key, embedding)
+                for i in positions:
+                    embeddings[i] = embedding
+        return np.stack(embeddings)
+    
+    def _normalize_query(self, query: str) -> str:
+        # Whitespace only: case can matter to cased embedding models
+        return " ".join(query.split())
+    
+    def sparse_search(
+        self, query: str, k: int = 10, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k as (document rows, raw scores), best first
+        allowed: optional boolean mask over rows; other documents are not scored
+        """
+        if self.bm25_index is None:
+            raise ValueError("Index not built. Call build_index() first.")
+        
+        bm25_index = self.bm25_index
+        if self.sparse_backend == "inverted":
+            return bm25_index.top_k(self.analyzer.encode_query(query, bm25_index.vocab), k, allowed=allowed)
+        
+        scores = bm25_index.get_scores(self._tokenize(query))
+        if allowed is not None:
+            candidates = np.flatnonzero(allowed[:len(scores)])
+            top_indices = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        else:
+            top_indices = np.argsort(-scores, kind="stable")[:k]
+        return top_indices, scores[top_indices]
+    
+    def sparse_search_many(
+        self, queries: List[str], k: int = 10, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """BM25 top-k for each query, scored in one vectorised pass on the inverted backend"""
+        if self.bm25_index is None:
+            raise ValueError("Index not built. Call build_index() first.")
+        
+        bm25_index = self.bm25_index
+        if self.sparse_backend == "inverted":
+            query_ids = [self.analyzer.encode_query(query, bm25_index.vocab) for query in queries]
+            return bm25_index.top_k_many(query_ids, k, allowed=allowed)
+        return [self.sparse_search(query, k, allowed=allowed) for query in queries]
@@ -0,0 +1,165 @@
+"""
+Bitmap indexes over paper metadata for pre-filtering retrieval
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.utils.cache import LRUCache
+
+# Categorical fields and the paper / metadata keys they are read from
+CATEGORICAL_FIELDS = {
+    "journal": ("journal",),
+    "study_type": ("study_type",),
+    "open_access": ("open_access", "is_open_access"),
+    "concepts": ("concepts",),
+}
+YEAR_FILTERS = ("year_from", "year_to")
+MISSING_YEAR = 0
+
+
+class MetadataIndex:
+    """
+    Per-value row sets over paper metadata, combined into a row mask per filter.
+
+    Each categorical value keeps the sorted rows that have it (a sparse
+    roaring-style container); years are a dense int16 column. A filter such as
+
+        {"year_from": 2018, "journal": ["lancet", "bmj"], "open_access": True}
+
+    matches rows satisfying every field, and any of the values listed for a
+    field. String values are matched case-insensitively. The resulting boolean
+    mask is passed to BM25 as an allow-list and to FAISS as an IDSelector, so
+    excluded documents are never scored.
+    """
+
+    def __init__(self, mask_cache_size: int = 256):
+        self.num_rows = 0
+        self.postings = {field: {} for field in CATEGORICAL_FIELDS}  # field -> value -> [row arrays]
+        self.years = np.zeros(0, dtype=np.int16)
+        self._mask_cache = LRUCache(max_size=mask_cache_size)
+
+    def add(self, metadata: List[Optional[Dict]], rows: Optional[np.ndarray] = None):
+        """Index metadata dicts for new rows (appended after the existing ones by default)"""
+        if rows is None:
+            rows = np.arange(self.num_rows, self.num_rows + len(metadata), dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+
+        num_rows = max(self.num_rows, int(rows.max()) + 1)
+        years = np.zeros(num_rows, dtype=np.int16)
+        years[:self.num_rows] = self.years
+
+        new_postings = {field: {} for field in CATEGORICAL_FIELDS}
+        for row, paper in zip(rows.tolist(), metadata):
+            paper = paper or {}
+            years[row] = _year(paper)
+            for field, keys in CATEGORICAL_FIELDS.items():
+                for value in _values(paper, keys):
+                    new_postings[field].setdefault(value, []).append(row)
+
+        for field, values in new_postings.items():
+            for value, value_rows in values.items():
+                self.postings[field].setdefault(value, []).append(np.array(value_rows, dtype=np.int64))
+        self.years = years
+        self.num_rows = num_rows
+        self._mask_cache.clear()
+
+    def mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean mask over rows matching the filters, or None when nothing is filtered"""
+        filters = {key: value for key, value in (filters or {}).items() if value not in (None, [], "")}
+        if not filters:
+            return None
+
+        unknown = set(filters) - set(CATEGORICAL_FIELDS) - set(YEAR_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {sorted(unknown)}. Use {sorted(CATEGORICAL_FIELDS) + list(YEAR_FILTERS)}")
+
+        key = json.dumps(filters, sort_keys=True, default=str)
+        cached = self._mask_cache.get(key)
+        if cached is not None:
+            return cached
+
+        mask = np.ones(self.num_rows, dtype=bool)
+        if "year_from" in filters:
+            mask &= self.years >= int(filters["year_from"])
+        if "year_to" in filters:
+            mask &= (self.years <= int(filters["year_to"])) & (self.years != MISSING_YEAR)
+        for field in CATEGORICAL_FIELDS:
+            if field in filters:
+                wanted = filters[field] if isinstance(filters[field], list) else [filters[field]]
+                mask &= self._field_mask(field, wanted)
+
+        mask.setflags(write=False)  # shared between requests through the cache
+        self._mask_cache.put(key, mask)
+        return mask
+
+    def _field_mask(self, field: str, values: Iterable) -> np.ndarray:
+        field_mask = np.zeros(self.num_rows, dtype=bool)
+        for value in values:
+            for rows in self.postings[field].get(_normalize(value), ()):
+                field_mask[rows] = True
+        return field_mask
+
+    def save(self, path: str):
+        """Write the index to a directory (one rows/offsets pair per field)"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "years.npy"), self.years)
+        for field, values in self.postings.items():
+            names = sorted(values, key=str)
+            rows = [np.concatenate(values[name]) for name in names]
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(r) for r in rows])
+            np.save(os.path.join(path, f"{field}.rows.npy"), np.concatenate(rows) if rows else np.empty(0, dtype=np.int64))
+            np.save(os.path.join(path, f"{field}.offsets.npy"), offsets)
+            with open(os.path.join(path, f"{field}.values.json"), "w") as f:
+                json.dump(names, f)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        index = cls()
+        index.years = np.load(os.path.join(path, "years.npy"))
+        index.num_rows = len(index.years)
+        for field in CATEGORICAL_FIELDS:
+            with open(os.path.join(path, f"{field}.values.json")) as f:
+                names = json.load(f)
+            rows = np.load(os.path.join(path, f"{field}.rows.npy"))
+            offsets = np.load(os.path.join(path, f"{field}.offsets.npy"))
+            index.postings[field] = {
+                name: [rows[offsets[i]:offsets[i + 1]]] for i, name in enumerate(names)
+            }
+        logger.info(f"Loaded metadata index for {index.num_rows} rows")
+        return index
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+
+def _values(paper: Dict, keys) -> List:
+    for key in keys:
+        value = paper.get(key)
+        if value is None or value == "":
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        return [_normalize(v) for v in values if v not in (None, "")]
+    return []
+
+
+def _normalize(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def _year(paper: Dict) -> int:
+    year = paper.get("year") or paper.get("publication_year") or str(paper.get("publication_date") or "")[:4]
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return MISSING_YEAR
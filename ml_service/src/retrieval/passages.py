@@ -0,0 +1,191 @@
+"""
+Passage-level dense index: long papers split into overlapping word windows
+"""
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from src.utils.ann_index import ann_search, build_ann_index, live_id_selector, without_ids
+
+AGGREGATIONS = ("max", "sum_top")
+
+# Passage hits fetched per requested document, as several passages of one paper often rank together
+CANDIDATES_PER_RESULT = 4
+
+_WORD = re.compile(r"\S+")
+
+
+def split_passages(text: str, words: int = 150, overlap: int = 30) -> List[Tuple[int, int]]:
+    """
+    Character spans of overlapping windows of `words` words, each starting
+    `words - overlap` words after the previous one. Every text yields at
+    least one (possibly empty) passage.
+    """
+    spans = [match.span() for match in _WORD.finditer(text)]
+    if not spans:
+        return [(0, 0)]
+    step = max(1, words - overlap)
+    return [
+        (spans[start][0], spans[min(start + words, len(spans)) - 1][1])
+        for start in range(0, max(1, len(spans) - overlap), step)
+    ]
+
+
+def mean_by_owner(embeddings: np.ndarray, owners: np.ndarray, num_owners: int) -> np.ndarray:
+    """Mean passage embedding of each document (its paper-level vector)"""
+    sums = np.zeros((num_owners, embeddings.shape[1]), dtype='float32')
+    np.add.at(sums, owners, embeddings)
+    counts = np.bincount(owners, minlength=num_owners).astype('float32')
+    return sums / np.maximum(counts, 1)[:, None]
+
+
+def aggregate_passages(
+    passage_ids: np.ndarray,
+    scores: np.ndarray,
+    owners: np.ndarray,
+    k: int,
+    method: str = "max",
+    top: int = 2
+) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Paper-level top-k from passage hits of one query: a paper scores its best
+    passage ("max") or the sum of its `top` best ("sum_top"). Also returns
+    the ids of each paper's `top` best passages, best first.
+    """
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown passage aggregation: {method}. Use one of {AGGREGATIONS}")
+    valid = passage_ids >= 0
+    passage_ids, scores = passage_ids[valid], scores[valid]
+    if len(passage_ids) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='float32'), []
+
+    # Group hits by paper, best passage first within each group
+    rows = owners[passage_ids]
+    order = np.lexsort((-scores, rows))
+    rows, scores, passage_ids = rows[order], scores[order], passage_ids[order]
+    first = np.r_[True, rows[1:] != rows[:-1]]
+    group = np.cumsum(first) - 1
+    rank = np.arange(len(rows)) - np.flatnonzero(first)[group]
+    kept = rank < top
+
+    if method == "max":
+        paper_scores = scores[first]
+    else:
+        paper_scores = np.bincount(group[kept], weights=scores[kept], minlength=int(group[-1]) + 1)
+    best = np.argsort(-paper_scores, kind="stable")[:k]
+    by_group = np.split(passage_ids[kept], np.flatnonzero(first[kept])[1:])
+    return rows[first][best], paper_scores[best].astype('float32'), [by_group[g] for g in best]
+
+
+class PassageIndex:
+    """
+    FAISS index over passage embeddings, with the document row and character
+    span of every passage. Passage ids are positions in these arrays and are
+    never reused; passages of deleted documents are removed from the FAISS
+    index on compaction but keep their entries.
+    """
+
+    def __init__(self, words: int = 150, overlap: int = 30, ann_config: Optional[Dict] = None):
+        if not 0 <= overlap < words:
+            raise ValueError(f"Passage overlap must be in [0, {words}), got {overlap}")
+        self.words = words
+        self.overlap = overlap
+        self.ann_config = ann_config
+        self.index = None
+        self.owners = np.empty(0, dtype=np.int64)
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def split(self, documents: Sequence[str], rows: np.ndarray) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Passage texts of documents, plus the owner row and span of each passage"""
+        texts, owners, starts, ends = [], [], [], []
+        for row, document in zip(np.asarray(rows).tolist(), documents):
+            for start, end in split_passages(document, self.words, self.overlap):
+                texts.append(document[start:end])
+                owners.append(row)
+                starts.append(start)
+                ends.append(end)
+        return texts, {
+            "owners": np.array(owners, dtype=np.int64),
+            "starts": np.array(starts, dtype=np.int64),
+            "ends": np.array(ends, dtype=np.int64),
+        }
+
+    def add(self, embeddings: np.ndarray, spans: Dict[str, np.ndarray]):
+        """Index passage embeddings with the spans returned by split()"""
+        ids = np.arange(len(self.owners), len(self.owners) + len(embeddings), dtype=np.int64)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if self.index is None:
+            self.index = build_ann_index(embeddings, self.ann_config, ids=ids)
+        else:
+            self.index.add_with_ids(embeddings, ids)
+        self.owners = np.concatenate([self.owners, spans["owners"]])
+        self.starts = np.concatenate([self.starts, spans["starts"]])
+        self.ends = np.concatenate([self.ends, spans["ends"]])
+
+    def without_rows(self, rows: np.ndarray) -> "PassageIndex":
+        """Copy whose FAISS index no longer holds the passages of the given document rows"""
+        copy = PassageIndex(self.words, self.overlap, self.ann_config)
+        copy.owners, copy.starts, copy.ends = self.owners, self.starts, self.ends
+        copy.index = without_ids(self.index, np.flatnonzero(np.isin(self.owners, rows)), self.ann_config)
+        return copy
+
+    def search(
+        self,
+        query_embeddings: np.ndarray,
+        k: int,
+        live_rows: Optional[np.ndarray] = None,
+        method: str = "max",
+        top: int = 2,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, List[np.ndarray]]]:
+        """
+        Paper-level top-k per query as (rows, scores, best passage ids per row)
+        live_rows: optional boolean mask over document rows; passages of other rows are skipped
+        """
+        selector = None
+        if live_rows is not None:
+            in_range = self.owners < len(live_rows)
+            live = np.zeros(len(self.owners), dtype=bool)
+            live[in_range] = live_rows[self.owners[in_range]]
+            selector, bitmap = live_id_selector(live)
+        distances, indices = ann_search(
+            self.index, query_embeddings, k * CANDIDATES_PER_RESULT * max(1, top),
+            nprobe=nprobe, ef_search=ef_search, selector=selector
+        )
+        similarities = 1 / (1 + distances)  # Convert distance to similarity
+        return [
+            aggregate_passages(row_ids, row_scores, self.owners, k, method=method, top=top)
+            for row_ids, row_scores in zip(indices, similarities)
+        ]
+
+    def span(self, passage_id: int) -> Tuple[int, int, int]:
+        """(document row, start, end) of a passage"""
+        return int(self.owners[passage_id]), int(self.starts[passage_id]), int(self.ends[passage_id])
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for field in ("owners", "starts", "ends"):
+            np.save(os.path.join(path, f"{field}.npy"), np.asarray(getattr(self, field)))
+        faiss.write_index(self.index, os.path.join(path, "index.faiss"))
+
+    @classmethod
+    def load(
+        cls, path: str, words: int, overlap: int, ann_config: Optional[Dict] = None, mmap: bool = True
+    ) -> "PassageIndex":
+        passages = cls(words, overlap, ann_config)
+        mode = "r" if mmap else None
+        for field in ("owners", "starts", "ends"):
+            setattr(passages, field, np.load(os.path.join(path, f"{field}.npy"), mmap_mode=mode))
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        passages.index = faiss.read_index(os.path.join(path, "index.faiss"), io_flags)
+        logger.info(f"Loaded passage index with {len(passages)} passages from {path}")
+        return passages
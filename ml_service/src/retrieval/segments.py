@@ -0,0 +1,171 @@
+"""
+Segmented BM25 index supporting incremental adds and deletes
+"""
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from src.retrieval.analyzer import TokenArrays, Vocabulary
+from src.retrieval.bm25_index import InvertedBM25Index, CollectionStats, Query
+
+# Documents as term-id arrays, or token lists encoded with the index vocabulary
+Corpus = Union[TokenArrays, List[List[str]]]
+
+
+class _Segment:
+    """An immutable BM25 index plus the retriever rows its local doc ids map to"""
+
+    def __init__(self, index: InvertedBM25Index, rows: np.ndarray, live: Optional[np.ndarray] = None):
+        self.index = index
+        self.rows = rows  # sorted ascending, one per local doc id
+        self.live = live  # boolean mask over local doc ids, None when nothing is deleted
+
+    def allowed(self, row_mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Mask over local doc ids that are live and allowed by a mask over rows"""
+        if row_mask is None:
+            return self.live
+        if len(self.rows) and self.rows[-1] >= len(row_mask):
+            # Rows added after the mask was computed are not allowed
+            row_mask = np.concatenate([row_mask, np.zeros(self.rows[-1] + 1 - len(row_mask), dtype=bool)])
+        allowed = row_mask[self.rows]
+        return allowed if self.live is None else allowed & self.live
+
+    def positions(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Local doc ids of the given rows, and which rows belong to this segment"""
+        if len(self.rows) == 0:
+            return np.zeros(len(rows), dtype=np.int64), np.zeros(len(rows), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.rows, rows), len(self.rows) - 1)
+        return pos, self.rows[pos] == rows
+
+
+class SegmentedBM25:
+    """
+    A large base segment plus a small delta segment, scored against shared
+    collection statistics.
+
+    Adding documents rebuilds only the delta segment, deleting documents only
+    flips bits in a tombstone mask, so both cost time proportional to the
+    change. The base segment keeps the impacts computed from the statistics
+    at its build time; compaction rebuilds everything with fresh statistics.
+
+    Segments are replaced wholesale rather than mutated, so concurrent queries
+    always see a consistent (index, rows, live) triple without locking.
+    """
+
+    def __init__(self, base: InvertedBM25Index, rows: Optional[np.ndarray] = None):
+        if rows is None:
+            rows = np.arange(len(base), dtype=np.int64)
+        self.k1 = base.k1
+        self.b = base.b
+        self.epsilon = base.epsilon
+        self.vocab = base.vocab  # shared by every segment, so term ids agree
+        self.base = _Segment(base, rows)
+        self.delta = None
+        self._delta_tokens = TokenArrays()
+        self.stats = CollectionStats.from_index(base)
+        self.num_deleted = 0
+
+    @classmethod
+    def build(
+        cls,
+        corpus: Corpus,
+        rows: Optional[np.ndarray] = None,
+        vocab: Optional[Vocabulary] = None,
+        **bm25_params
+    ) -> "SegmentedBM25":
+        return cls(InvertedBM25Index(corpus, vocab=vocab, **bm25_params), rows)
+
+    @property
+    def is_dirty(self) -> bool:
+        """True when there are delta documents or tombstones to compact away"""
+        return self.delta is not None or self.num_deleted > 0
+
+    def __len__(self) -> int:
+        return self.stats.num_docs
+
+    def add(self, corpus: Corpus, rows: np.ndarray):
+        """Index new documents (rows must be greater than every existing row)"""
+        corpus = self._token_arrays(corpus)
+        self.stats.add(corpus)
+        self._delta_tokens = self._delta_tokens.concat(corpus)
+        previous = self.delta
+        delta_rows = np.asarray(rows, dtype=np.int64)
+        live = None
+        if previous is not None:
+            delta_rows = np.concatenate([previous.rows, delta_rows])
+            if previous.live is not None:
+                live = np.concatenate([previous.live, np.ones(len(rows), dtype=bool)])
+
+        index = InvertedBM25Index(
+            self._delta_tokens, k1=self.k1, b=self.b, epsilon=self.epsilon, stats=self.stats, vocab=self.vocab
+        )
+        self.delta = _Segment(index, delta_rows, live)
+        logger.debug(f"Rebuilt BM25 delta segment with {len(delta_rows)} documents")
+
+    def delete(self, rows: np.ndarray, corpus: Corpus):
+        """Tombstone documents by row; `corpus` holds their tokens for the statistics"""
+        rows = np.asarray(rows, dtype=np.int64)
+        self.stats.remove(self._token_arrays(corpus))
+        for name in ("base", "delta"):
+            segment = getattr(self, name)
+            if segment is None:
+                continue
+            pos, found = segment.positions(rows)
+            if not found.any():
+                continue
+            live = np.ones(len(segment.rows), dtype=bool) if segment.live is None else segment.live.copy()
+            live[pos[found]] = False
+            setattr(self, name, _Segment(segment.index, segment.rows, live))
+        self.num_deleted += len(rows)
+
+    def _token_arrays(self, corpus: Corpus) -> TokenArrays:
+        return corpus if isinstance(corpus, TokenArrays) else TokenArrays.from_lists(corpus, self.vocab)
+
+    def top_k(
+        self, query: Query, k: int = 10, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k live documents as (rows, scores), best first.
+        allowed: optional boolean mask over rows (e.g. a metadata filter)
+        """
+        segments = [segment for segment in (self.base, self.delta) if segment is not None]
+        return merge_top_k([self._segment_top_k(segment, query, k, allowed) for segment in segments], k)
+
+    def top_k_many(
+        self, queries: List[Query], k: int = 10, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top k live documents for each query across all segments"""
+        segments = [segment for segment in (self.base, self.delta) if segment is not None]
+        per_segment = [
+            [
+                (segment.rows[docs], scores)
+                for docs, scores in segment.index.top_k_many(queries, k, allowed=segment.allowed(allowed))
+            ]
+            for segment in segments
+        ]
+        return [merge_top_k([results[i] for results in per_segment], k) for i in range(len(queries))]
+
+    def _segment_top_k(
+        self, segment: _Segment, query: Query, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        docs, scores = segment.index.top_k(query, k, allowed=segment.allowed(allowed))
+        return segment.rows[docs], scores
+
+    def live_rows(self) -> np.ndarray:
+        """All rows that are indexed and not deleted"""
+        parts = []
+        for segment in (self.base, self.delta):
+            if segment is not None:
+                parts.append(segment.rows if segment.live is None else segment.rows[segment.live])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def merge_top_k(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-segment top-k lists (disjoint rows) into one, ties by ascending row"""
+    if len(results) == 1:
+        return results[0]
+    rows = np.concatenate([r for r, _ in results])
+    scores = np.concatenate([s for _, s in results])
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
@@ -0,0 +1,270 @@
+"""
+Retrieval shard server: one partition of the corpus served over a local RPC socket
+
+A shard holds the BM25, FAISS and metadata indexes of its documents but no
+embedding model or analyzer; the coordinator (ShardedRetriever) embeds and
+analyzes queries once and fans them out as vectors and term-id arrays. Run a standalone shard (e.g. on another node) with:
+
+    SHARD_AUTHKEY=... python -m src.retrieval.shard_server --host 0.0.0.0 --port 7001
+"""
+import argparse
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.retrieval.analyzer import Analyzer, TokenArrays, Vocabulary
+from src.retrieval.bm25_index import CollectionStats
+from src.retrieval.document_store import DocumentStore
+from src.retrieval.metadata_index import MetadataIndex
+from src.retrieval.segments import SegmentedBM25
+from src.retrieval.snapshot import save_snapshot, load_snapshot
+from src.utils.ann_index import (
+    build_ann_index, ann_search, dense_hits, default_ann_config, live_id_selector
+)
+from src.utils.config import get_default_config
+from src.utils.locks import ReadWriteLock
+
+
+class ShardIndex:
+    """
+    Indexes of one shard, addressed by local rows 0..n-1.
+
+    Exposes the attributes the snapshot module reads and writes, so a shard
+    is saved and loaded in the same format as a single-process retriever.
+    """
+
+    sparse_backend = "inverted"
+    num_deleted = 0
+
+    def __init__(self, model_name: str = "", ann_config: Optional[Dict] = None):
+        self.model_name = model_name
+        self.ann_config = ann_config or default_ann_config()
+        self.analyzer = Analyzer()  # the coordinator's settings, recorded in snapshots
+        self.bm25_index = None
+        self.tokens = TokenArrays()
+        self.faiss_index = None
+        self.metadata = MetadataIndex()
+        retrieval_config = get_default_config()["retrieval"]
+        self.store_config = {
+            "directory": retrieval_config["document_store_dir"],
+            "compress": retrieval_config["document_store_compress"],
+        }
+        self.store = DocumentStore.create(**self.store_config)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._pending = None
+        self._lock = ReadWriteLock()
+
+    def build(
+        self,
+        documents: List[str],
+        doc_ids: List[str],
+        tokens: TokenArrays,
+        embeddings: np.ndarray,
+        metadata: Optional[List[Dict]] = None,
+        model_name: str = ""
+    ) -> CollectionStats:
+        """First build phase: keep the shard's data and return its local BM25 statistics"""
+        self.model_name = model_name
+        self._pending = (documents, doc_ids, tokens, embeddings, metadata)
+        return CollectionStats.from_tokens(tokens)
+
+    def finalize(self, stats: CollectionStats, vocab: Vocabulary, analyzer: Optional[Dict] = None) -> int:
+        """
+        Second build phase: build the indexes, scoring BM25 against the global
+        statistics; vocab is the coordinator's, which assigned the term ids
+        """
+        if self._pending is None:
+            raise ValueError("Nothing to finalize; call build first")
+        documents, doc_ids, tokens, embeddings, metadata = self._pending
+        rows = np.arange(len(documents), dtype=np.int64)
+        bm25_index = SegmentedBM25.build(tokens, rows, vocab=vocab, stats=stats)
+        faiss_index = build_ann_index(embeddings, self.ann_config, ids=rows)
+        metadata_index = MetadataIndex()
+        metadata_index.add(metadata or [None] * len(documents), rows)
+        store = DocumentStore.from_documents(documents, doc_ids, metadata, **self.store_config)
+
+        with self._lock.write():
+            self.bm25_index = bm25_index
+            self.tokens = tokens
+            self.analyzer = Analyzer(**(analyzer or {}))
+            self.faiss_index = faiss_index
+            self.metadata = metadata_index
+            self.store = store
+            self._deleted = np.zeros(len(documents), dtype=bool)
+        self._pending = None
+        logger.info(f"Shard built with {len(documents)} documents (collection of {stats.num_docs})")
+        return len(documents)
+
+    def search(
+        self,
+        query_tokens: List[np.ndarray],
+        embeddings: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """Per-query sparse and dense top-k (local rows) plus the texts of every candidate"""
+        with self._lock.read():
+            if self.bm25_index is None or self.faiss_index is None:
+                raise ValueError("Shard has no index; build or load one first")
+            allowed = self.metadata.mask(filters)
+            sparse = self.bm25_index.top_k_many(query_tokens, k, allowed=allowed)
+            live_filter = live_id_selector(allowed) if allowed is not None else None
+            distances, indices = ann_search(
+                self.faiss_index, embeddings, k, nprobe=nprobe, ef_search=ef_search,
+                selector=live_filter[0] if live_filter is not None else None
+            )
+            dense = dense_hits(distances, indices)
+
+            results = []
+            for (sparse_rows, sparse_scores), (dense_rows, dense_scores) in zip(sparse, dense):
+                rows = np.union1d(sparse_rows, dense_rows).tolist()
+                results.append({
+                    "sparse_rows": sparse_rows,
+                    "sparse_scores": sparse_scores,
+                    "dense_rows": dense_rows,
+                    "dense_scores": dense_scores,
+                    "documents": {row: (self.store.doc_id(row), self.store[row]) for row in rows},
+                })
+            return results
+
+    def save(self, path: str, version: Optional[str] = None) -> Dict:
+        with self._lock.read():
+            return save_snapshot(self, path, version=version)
+
+    def load(self, path: str, mmap: bool = True, model_name: str = "") -> Dict:
+        self.model_name = model_name
+        with self._lock.write():
+            return load_snapshot(self, path, mmap=mmap)
+
+    def compact(self):
+        """Shards are rebuilt rather than updated, so there is never anything to compact"""
+
+    def get_document(self, doc_id: str) -> Optional[Dict]:
+        with self._lock.read():
+            row = self.store.row(doc_id)
+            if row is None:
+                return None
+            return {"doc_id": doc_id, "document": self.store[row], "metadata": self.store.metadata(row)}
+
+    def info(self) -> Dict[str, Any]:
+        return {"num_documents": len(self.store), "pid": os.getpid()}
+
+
+def serve(address: Tuple[str, int], authkey: bytes, ann_config: Optional[Dict] = None, ready: Optional[Connection] = None):
+    """Serve one shard until a client sends "shutdown"; each client gets its own thread"""
+    shard = ShardIndex(ann_config=ann_config)
+    listener = Listener(address, authkey=authkey)
+    logger.info(f"Retrieval shard listening on {listener.address}")
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except AuthenticationError:
+            logger.warning("Rejected shard client with a wrong authkey")
+            continue
+        threading.Thread(target=_handle, args=(shard, conn), daemon=True).start()
+
+
+def _handle(shard: ShardIndex, conn: Connection):
+    operations = {
+        "build": shard.build,
+        "finalize": shard.finalize,
+        "search": shard.search,
+        "save": shard.save,
+        "load": shard.load,
+        "get_document": shard.get_document,
+        "info": shard.info,
+    }
+    with conn:
+        while True:
+            try:
+                op, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            if op == "shutdown":
+                conn.send(("ok", None))
+                logger.info("Retrieval shard shutting down")
+                os._exit(0)
+            try:
+                conn.send(("ok", operations[op](**kwargs)))
+            except Exception as e:
+                logger.error(f"Shard {op} error: {str(e)}")
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardClient:
+    """Connection to one shard server; one request in flight at a time"""
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        self.address = address
+        self._conn = Client(address, authkey=authkey)
+        self.lock = threading.Lock()
+
+    def send(self, op: str, **kwargs):
+        self._conn.send((op, kwargs))
+
+    def recv(self) -> Any:
+        status, result = self._conn.recv()
+        if status == "error":
+            raise RuntimeError(f"Shard {self.address} failed: {result}")
+        return result
+
+    def call(self, op: str, **kwargs) -> Any:
+        with self.lock:
+            self.send(op, **kwargs)
+            return self.recv()
+
+    def close(self):
+        self._conn.close()
+
+
+def scatter(clients: List[ShardClient], op: str, per_shard: Optional[List[Dict]] = None, **kwargs) -> List[Any]:
+    """
+    Send a request to every shard before waiting for any reply, so shards
+    work in parallel, then gather the replies in shard order.
+    per_shard: optional extra arguments for each shard
+    """
+    for client in clients:
+        client.lock.acquire()
+    try:
+        for i, client in enumerate(clients):
+            client.send(op, **kwargs, **(per_shard[i] if per_shard else {}))
+        # Drain every reply, even after a failure, so connections stay in sync
+        results, error = [], None
+        for client in clients:
+            try:
+                results.append(client.recv())
+            except RuntimeError as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+    finally:
+        for client in clients:
+            client.lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one retrieval shard")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001)
+    args = parser.parse_args()
+
+    authkey = os.getenv("SHARD_AUTHKEY")
+    if not authkey:
+        raise SystemExit("SHARD_AUTHKEY must be set")
+    serve((args.host, args.port), authkey.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Scatter-gather hybrid retrieval over corpus shards served by separate processes
+"""
+import json
+import multiprocessing
+import os
+import secrets
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.retrieval.analyzer import Analyzer, Vocabulary
+from src.retrieval.bm25_index import CollectionStats
+from src.retrieval.hybrid_retriever import HybridRetriever
+from src.retrieval.segments import merge_top_k
+from src.retrieval.shard_server import ShardClient, scatter, serve
+from src.retrieval.snapshot import read_manifest
+
+SHARDS_MANIFEST = "shards.json"
+
+SHARDED_UPDATES_ERROR = (
+    "Sharded indexes are not updated incrementally; rebuild them with load_documents() or load a new snapshot"
+)
+
+
+class ShardedRetriever(HybridRetriever):
+    """
+    Hybrid retriever whose indexes are split into contiguous shards, each in
+    its own process (spawned locally, or already running at shard_addresses).
+
+    Queries are encoded once here and fanned out to every shard; per-shard
+    top-k lists are merged and fused exactly as in a single HybridRetriever.
+    Shard BM25 indexes are built against the merged statistics of all
+    shards, so scores and therefore rankings match the unsharded index.
+
+    Sharded indexes are rebuilt or reloaded rather than updated in place.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        num_shards: int = 2,
+        shard_addresses: Optional[List[Tuple[str, int]]] = None,
+        authkey: Optional[bytes] = None,
+        rrf_k: int = 60,
+        ann_config: Optional[Dict] = None,
+        encode_batch_size: int = 64,
+        query_cache_size: Optional[int] = None,
+        query_cache_ttl: Optional[float] = None,
+        analyzer: Optional[Analyzer] = None
+    ):
+        super().__init__(
+            model_name=model_name,
+            sparse_backend="inverted",
+            rrf_k=rrf_k,
+            ann_config=ann_config,
+            encode_batch_size=encode_batch_size,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl,
+            analyzer=analyzer
+        )
+        self.vocab = Vocabulary()  # term ids shared by all shards
+        self._processes = []
+        if shard_addresses:
+            authkey = authkey or os.getenv("SHARD_AUTHKEY", "").encode("utf-8")
+            if not authkey:
+                raise ValueError("Set SHARD_AUTHKEY (or pass authkey) to connect to remote shards")
+        else:
+            authkey = authkey or secrets.token_bytes(32)
+            shard_addresses = self._start_local_shards(num_shards, authkey)
+        self.shards = [ShardClient(tuple(address), authkey) for address in shard_addresses]
+        self.shard_offsets = np.zeros(len(self.shards) + 1, dtype=np.int64)
+        self.is_ready = False
+        logger.info(f"Initialized ShardedRetriever with {len(self.shards)} shards")
+
+    def _start_local_shards(self, num_shards: int, authkey: bytes) -> List[Tuple[str, int]]:
+        """Spawn one shard server process per shard on a free local port"""
+        context = multiprocessing.get_context("spawn")
+        addresses = []
+        for i in range(num_shards):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=serve,
+                args=(("127.0.0.1", 0), authkey, self.ann_config, sender),
+                name=f"retrieval-shard-{i}",
+                daemon=True
+            )
+            process.start()
+            sender.close()
+            addresses.append(receiver.recv())
+            self._processes.append(process)
+        return addresses
+
+    def build_index(
+        self,
+        documents: List[str],
+        doc_ids: Optional[List[str]] = None,
+        metadata: Optional[List[Dict]] = None
+    ):
+        """Partition the corpus, then build every shard against the global BM25 statistics"""
+        doc_ids = list(doc_ids) if doc_ids is not None else [str(i) for i in range(len(documents))]
+        if len(doc_ids) != len(documents):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(documents)} documents")
+        documents = list(documents)
+
+        vocab = Vocabulary()
+        tokens = self.analyzer.encode(documents, vocab)
+        embeddings = np.asarray(
+            self.dense_model.encode(documents, batch_size=self.encode_batch_size, show_progress_bar=True),
+            dtype='float32'
+        )
+        bounds = np.linspace(0, len(documents), len(self.shards) + 1).astype(np.int64)
+        shard_args = [
+            {
+                "documents": documents[start:end],
+                "doc_ids": doc_ids[start:end],
+                "tokens": tokens.take(np.arange(start, end)),
+                "embeddings": embeddings[start:end],
+                "metadata": metadata[start:end] if metadata is not None else None,
+                "model_name": self.model_name,
+            }
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+        # Two phases: gather each shard's statistics, then build all shards against their sum
+        local_stats = scatter(self.shards, "build", per_shard=shard_args)
+        global_stats = CollectionStats.merge(local_stats)
+        scatter(self.shards, "finalize", stats=global_stats, vocab=vocab, analyzer=self.analyzer.config())
+
+        self.vocab = vocab
+        self.shard_offsets = bounds
+        self.is_ready = True
+        logger.info(f"Built {len(self.shards)} shards over {len(documents)} documents")
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 10,
+        alpha: float = 0.5,
+        fusion: str = "weighted",
+        candidate_k: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[Dict]:
+        """Hybrid retrieval across all shards (same arguments as HybridRetriever.retrieve)"""
+        return self.retrieve_many(
+            [query], k=k, alpha=alpha, fusion=fusion, candidate_k=candidate_k,
+            nprobe=nprobe, ef_search=ef_search, filters=filters, binary_prefilter=binary_prefilter
+        )[0]
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        k: int = 10,
+        alpha: float = 0.5,
+        fusion: str = "weighted",
+        candidate_k: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict] = None,
+        binary_prefilter: Optional[bool] = None
+    ) -> List[List[Dict]]:
+        """Encode once, search every shard in parallel, merge per-shard top-k and fuse"""
+        if not self.is_ready:
+            raise ValueError("Index not built. Call build_index() first.")
+        if binary_prefilter:
+            raise ValueError("The binary prefilter is only supported by the single-process retriever")
+        if not queries:
+            return []
+
+        depth = max(k, candidate_k or k)
+        responses = scatter(
+            self.shards, "search",
+            query_tokens=[self.analyzer.encode_query(query, self.vocab) for query in queries],
+            embeddings=self.encode_queries(queries),
+            k=depth,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=filters
+        )
+
+        results = []
+        for i in range(len(queries)):
+            sparse, dense, documents = [], [], {}
+            for offset, response in zip(self.shard_offsets, responses):
+                hits = response[i]
+                # Shards number their documents from 0; offsets make rows global
+                sparse.append((hits["sparse_rows"] + offset, hits["sparse_scores"]))
+                dense.append((hits["dense_rows"] + offset, hits["dense_scores"]))
+                documents.update((row + int(offset), doc) for row, doc in hits["documents"].items())
+            sparse_ids, sparse_scores = merge_top_k(sparse, depth)
+            dense_ids, dense_scores = merge_top_k(dense, depth)
+            results.append(
+                self._fuse(sparse_ids, sparse_scores, dense_ids, dense_scores, k, alpha, fusion, documents=documents)
+            )
+        return results
+
+    def save_snapshot(self, path: str, version: Optional[str] = None) -> Dict:
+        """Save each shard as a regular snapshot under path/shard-<i>"""
+        version = version or uuid.uuid4().hex
+        os.makedirs(path, exist_ok=True)
+        manifests = scatter(
+            self.shards, "save",
+            per_shard=[{"path": os.path.join(path, f"shard-{i}")} for i in range(len(self.shards))],
+            version=version
+        )
+        manifest = {
+            "version": version,
+            "model_name": self.model_name,
+            "num_shards": len(self.shards),
+            "num_documents": int(self.shard_offsets[-1]),
+            "shard_sizes": [m["num_documents"] for m in manifests],
+        }
+        staging = os.path.join(path, f"{SHARDS_MANIFEST}.tmp")
+        with open(staging, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(staging, os.path.join(path, SHARDS_MANIFEST))
+        logger.info(f"Saved sharded snapshot {version} to {path}")
+        return manifest
+
+    def load_snapshot(self, path: str, mmap: bool = True) -> Dict:
+        """Load a sharded snapshot; every shard maps its own part"""
+        with open(os.path.join(path, SHARDS_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest["num_shards"] != len(self.shards):
+            raise ValueError(f"Snapshot has {manifest['num_shards']} shards, retriever has {len(self.shards)}")
+        scatter(
+            self.shards, "load",
+            per_shard=[{"path": os.path.abspath(os.path.join(path, f"shard-{i}"))} for i in range(len(self.shards))],
+            mmap=mmap,
+            model_name=self.model_name
+        )
+        # Shards share one vocabulary and analyzer; queries are analysed here with them
+        first_shard = os.path.join(path, "shard-0")
+        self.vocab = Vocabulary.load(os.path.join(first_shard, "bm25", "vocab.json"))
+        self.analyzer = Analyzer(**read_manifest(first_shard)["analyzer"])
+        self.shard_offsets = np.concatenate([[0], np.cumsum(manifest["shard_sizes"])]).astype(np.int64)
+        self.is_ready = True
+        logger.info(f"Loaded sharded snapshot {manifest['version']} ({manifest['num_documents']} documents)")
+        return manifest
+
+    def get_document(self, doc_id: str) -> Optional[Dict]:
+        """Look the paper id up on every shard"""
+        return next((doc for doc in scatter(self.shards, "get_document", doc_id=doc_id) if doc is not None), None)
+
+    def _ensure_mutable(self):
+        """The shards hold the indexes, built against global statistics: add/update/delete are refused"""
+        raise ValueError(SHARDED_UPDATES_ERROR)
+
+    def compact(self, background: bool = False):
+        """Shards are never updated in place, so they hold no tombstones to purge"""
+        return None
+
+    def close(self):
+        """Stop locally spawned shard processes and close connections"""
+        for client, process in zip(self.shards, self._processes):
+            try:
+                client.call("shutdown")
+            except (EOFError, OSError):
+                pass
+            process.join(timeout=5)
+        for client in self.shards:
+            client.close()
+        self._processes = []
+
+
+def parse_shard_addresses(value: str) -> List[Tuple[str, int]]:
+    """Parse "host:port,host:port" into (host, port) pairs"""
+    addresses = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        host, _, port = item.rpartition(":")
+        addresses.append((host or "127.0.0.1", int(port)))
+    return addresses
@@ -0,0 +1,204 @@
+"""
+Versioned on-disk snapshot of the retrieval indexes with memory-mapped loading
+
+A snapshot path is a symlink to the directory of the current version
+(<path>.v-<id> next to it); saving writes a new version and flips the link.
+
+Layout of a snapshot directory:
+    manifest.json        format version, snapshot version, model, analyzer and BM25 settings
+    dense.faiss          FAISS index (loaded with IO_FLAG_MMAP)
+    dense.binary.faiss   optional binary prefilter codes (FAISS binary index)
+    dense.vectors        float32 embeddings by row, raw, to re-score binary candidates
+    passages/*           optional passage index: FAISS index plus owner row and span of each passage
+    bm25/<field>.npy     inverted index arrays (loaded with np.load(mmap_mode="r"))
+    bm25/vocab.json      terms in term-id order
+    bm25/rows.npy        retriever row of each BM25 document
+    bm25/tokens*.npy     term ids of every row, flat plus offsets (TokenArrays)
+    deleted.npy          tombstone mask over rows
+    metadata/*           metadata filter index (MetadataIndex.save)
+    documents/*          texts, paper ids and metadata (DocumentStore)
+"""
+import glob
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from src.retrieval.analyzer import Analyzer, TokenArrays, Vocabulary
+from src.retrieval.bm25_index import InvertedBM25Index
+from src.retrieval.document_store import DocumentStore
+from src.retrieval.metadata_index import MetadataIndex
+from src.retrieval.passages import PassageIndex
+from src.retrieval.segments import SegmentedBM25
+from src.utils.ann_index import binary_index_type
+from src.utils.vector_db import FloatVectors
+
+SNAPSHOT_FORMAT_VERSION = 4
+
+
+def save_snapshot(retriever, path: str, version: Optional[str] = None) -> Dict:
+    """
+    Write the retriever's indexes, texts and id mapping to a snapshot directory.
+
+    The snapshot is written next to `path` and swapped in by replacing the
+    `path` symlink, so a concurrently loading process sees either the old or
+    the new snapshot, never a half-written or missing one. Pending
+    incremental changes are compacted first so a single BM25 segment is stored.
+    """
+    if retriever.sparse_backend != "inverted":
+        raise ValueError("Snapshots require the 'inverted' sparse backend")
+    if retriever.bm25_index is None or retriever.faiss_index is None:
+        raise ValueError("Index not built. Call build_index() first.")
+
+    if retriever.bm25_index.is_dirty or retriever.num_deleted:
+        retriever.compact()
+
+    path = os.path.abspath(path)
+    staging = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(os.path.join(staging, "bm25"))
+
+    bm25 = retriever.bm25_index.base.index
+    for field, array in bm25.to_arrays().items():
+        np.save(os.path.join(staging, "bm25", f"{field}.npy"), np.asarray(array))
+    np.save(os.path.join(staging, "bm25", "rows.npy"), np.asarray(retriever.bm25_index.base.rows))
+    np.save(os.path.join(staging, "deleted.npy"), np.asarray(retriever._deleted))
+    retriever.tokens.save(os.path.join(staging, "bm25", "tokens"))
+    retriever.metadata.save(os.path.join(staging, "metadata"))
+    bm25.vocab.save(os.path.join(staging, "bm25", "vocab.json"))
+
+    faiss.write_index(retriever.faiss_index, os.path.join(staging, "dense.faiss"))
+    binary_index = getattr(retriever, "binary_index", None)
+    if binary_index is not None:
+        faiss.write_index_binary(binary_index, os.path.join(staging, "dense.binary.faiss"))
+        retriever.vectors.save(os.path.join(staging, "dense.vectors"))
+    passages = getattr(retriever, "passages", None)
+    if passages is not None:
+        passages.save(os.path.join(staging, "passages"))
+    retriever.store.save(os.path.join(staging, "documents"))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_name": retriever.model_name,
+        "num_documents": len(retriever.bm25_index),
+        "dimension": retriever.faiss_index.d,
+        "ann_index": type(retriever.faiss_index).__name__,
+        "binary_index": binary_index_type(binary_index) if binary_index is not None else None,
+        "passages": {"words": passages.words, "overlap": passages.overlap} if passages is not None else None,
+        "analyzer": retriever.analyzer.config(),
+        "bm25": {"k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    _swap_in(staging, path)
+    logger.info(f"Saved retrieval snapshot {manifest['version']} ({manifest['num_documents']} documents) to {path}")
+    return manifest
+
+
+def load_snapshot(retriever, path: str, mmap: bool = True) -> Dict:
+    """
+    Load a snapshot into the retriever without re-embedding or re-tokenising.
+
+    With mmap=True the FAISS index, BM25 arrays and texts are memory-mapped,
+    so startup is near-instant and worker processes share physical pages.
+    The retriever must use the encoder the snapshot was built with.
+    """
+    # Resolve the link once so every file comes from the same version, even if a save flips it meanwhile
+    path = resolve_snapshot(path)
+    manifest = read_manifest(path)
+    if manifest["model_name"] != retriever.model_name:
+        # Query and document vectors from different encoders cannot be compared
+        raise ValueError(
+            f"Snapshot at {path} was built with {manifest['model_name']}, "
+            f"retriever uses {retriever.model_name}; rebuild the snapshot or load it with that model"
+        )
+
+    mode = "r" if mmap else None
+    vocab = Vocabulary.load(os.path.join(path, "bm25", "vocab.json"))
+    arrays = {
+        field: np.load(os.path.join(path, "bm25", f"{field}.npy"), mmap_mode=mode)
+        for field in InvertedBM25Index.ARRAY_FIELDS
+    }
+
+    io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    retriever.sparse_backend = "inverted"
+    # Queries must be analysed exactly like the indexed documents
+    retriever.analyzer = Analyzer(**manifest["analyzer"])
+    retriever.tokens = TokenArrays.load(os.path.join(path, "bm25", "tokens"), mmap=mmap)
+    rows = np.load(os.path.join(path, "bm25", "rows.npy"), mmap_mode=mode)
+    retriever.bm25_index = SegmentedBM25(InvertedBM25Index.from_arrays(vocab, arrays, **manifest["bm25"]), rows)
+    retriever.faiss_index = faiss.read_index(os.path.join(path, "dense.faiss"), io_flags)
+    retriever.binary_index, retriever.vectors = None, None
+    if manifest.get("binary_index"):
+        # Codes are 1/32 of the float vectors and read into memory; the vectors stay on disk
+        retriever.binary_index = faiss.read_index_binary(os.path.join(path, "dense.binary.faiss"))
+        retriever.vectors = FloatVectors(manifest["dimension"], os.path.join(path, "dense.vectors"), writable=False)
+    retriever.passages = None
+    if manifest.get("passages"):
+        retriever.passages = PassageIndex.load(
+            os.path.join(path, "passages"), ann_config=getattr(retriever, "ann_config", None), mmap=mmap,
+            **manifest["passages"]
+        )
+    retriever.store = DocumentStore.open(os.path.join(path, "documents"), mmap=mmap)
+    retriever._deleted = np.load(os.path.join(path, "deleted.npy"), mmap_mode=mode)
+    if os.path.exists(os.path.join(path, "metadata")):
+        retriever.metadata = MetadataIndex.load(os.path.join(path, "metadata"))
+    else:
+        retriever.metadata = MetadataIndex()
+        retriever.metadata.add([None] * len(retriever.store))
+
+    logger.info(f"Loaded retrieval snapshot {manifest['version']} ({manifest['num_documents']} documents) from {path}")
+    return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    """Read and validate a snapshot manifest"""
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot format {manifest.get('format_version')} "
+            f"(expected {SNAPSHOT_FORMAT_VERSION}) at {path}"
+        )
+    return manifest
+
+
+def resolve_snapshot(path: str) -> str:
+    """Directory of the version a snapshot path currently points to"""
+    return os.path.realpath(path)
+
+
+def _swap_in(staging: str, path: str):
+    """
+    Make the staging directory the snapshot at `path`: it is renamed to a
+    version directory and the `path` symlink is replaced in one os.replace.
+    The previous version is kept for loaders that resolved the link before
+    the flip; older ones are removed.
+    """
+    version_dir = f"{path}.v-{uuid.uuid4().hex[:8]}"
+    os.rename(staging, version_dir)
+
+    previous = resolve_snapshot(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Plain directory written before snapshots were linked: moved aside once, the link replaces it
+        previous = f"{path}.v-{uuid.uuid4().hex[:8]}"
+        os.rename(path, previous)
+
+    link = f"{path}.link-{uuid.uuid4().hex[:8]}"
+    # Relative target, so the parent directory can be moved or mounted elsewhere
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, path)
+
+    keep = {resolve_snapshot(version_dir), previous and resolve_snapshot(previous)}
+    for stale in glob.glob(f"{glob.escape(path)}.v-*"):
+        if resolve_snapshot(stale) not in keep:
+            # Processes that already mapped its files keep them alive until they exit
+            shutil.rmtree(stale, ignore_errors=True)
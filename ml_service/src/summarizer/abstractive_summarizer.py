@@ -1,52 +1,239 @@
 """
 Abstractive summarization using transformer models
 """
-from transformers import pipeline
-from typing import Optional
+import asyncio
+import re
+import threading
+from transformers import StoppingCriteria, StoppingCriteriaList, TextStreamer, pipeline
+from typing import AsyncIterator, Dict, List, Optional
 from loguru import logger
 
+from src.utils.config import get_default_config
+from src.utils.executor import run_inference
+from src.utils.inference import inference_config, load_pipeline
+
+# Reduce passes before the remaining summaries are cut to one window
+MAX_REDUCE_LEVELS = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def token_chunks(text: str, tokenizer, max_tokens: int) -> List[str]:
+    """
+    Split text into pieces of at most max_tokens tokens of the model's
+    tokenizer, packing whole sentences; sentences longer than a window are
+    cut between tokens
+    """
+    sentences = [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+    if not sentences:
+        return []
+    token_ids = tokenizer(sentences, add_special_tokens=False)["input_ids"]
+
+    chunks, current, current_tokens = [], [], 0
+    for sentence, ids in zip(sentences, token_ids):
+        if len(ids) > max_tokens:
+            pieces = [tokenizer.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+            lengths = [len(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+        else:
+            pieces, lengths = [sentence], [len(ids)]
+        for piece, length in zip(pieces, lengths):
+            # One token of slack per sentence: tokens at the joins may differ from the sentences alone
+            if current and current_tokens + length > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += length + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class _Cancelled(StoppingCriteria):
+    """Stops generation once the event is set (the streaming client went away)"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+
+class _QueueStreamer(TextStreamer):
+    """Streamer that hands decoded text from the generation thread to an asyncio queue (None ends it)"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
 
 class AbstractiveSummarizer:
-    def __init__(self, model_name: str = "facebook/bart-large-cnn"):
+    def __init__(
+        self,
+        model_name: str = "facebook/bart-large-cnn",
+        backend: Optional[str] = None,
+        batch_size: Optional[int] = None
+    ):
+        backend = backend or inference_config()["summarizer"]
+        self.batch_size = batch_size or get_default_config()["summarization"]["batch_size"]
         try:
-            self.summarizer = pipeline(
-                "summarization",
-                model=model_name,
-                device=-1  # CPU by default, use 0 for GPU
-            )
-            logger.info(f"Initialized AbstractiveSummarizer with model: {model_name}")
+            # CPU: PyTorch, or ONNX Runtime with SUMMARIZER_BACKEND=onnx / onnx_int8
+            self.summarizer = load_pipeline("summarization", model_name, backend=backend)
+            self.model_name = model_name
+            logger.info(f"Initialized AbstractiveSummarizer with model: {model_name} ({backend})")
         except Exception as e:
             logger.error(f"Failed to load summarization model: {str(e)}")
             # Fallback to smaller model
             self.summarizer = pipeline("summarization", device=-1)
+            self.model_name = self.summarizer.model.name_or_path
             logger.info("Using fallback summarization model")
+        
+        # Input window in tokens, less the special tokens the pipeline adds
+        tokenizer = self.summarizer.tokenizer
+        window = min(
+            tokenizer.model_max_length, getattr(self.summarizer.model.config, "max_position_embeddings", 1024)
+        )
+        self.max_input_tokens = window - tokenizer.num_special_tokens_to_add()
     
     async def summarize(
-        self, 
-        text: str, 
-        max_length: int = 150, 
+        self,
+        text: str,
+        max_length: int = 150,
         min_length: int = 30
     ) -> str:
         """Generate abstractive summary"""
+        return (await self.summarize_many([text], max_length=max_length, min_length=min_length))[0]
+    
+    async def summarize_many(
+        self,
+        texts: List[str],
+        max_length: int = 150,
+        min_length: int = 30
+    ) -> List[str]:
+        """
+        Summarize several documents with map-reduce over token windows:
+        every document is split into chunks that fit the model's input, all
+        chunks of all documents are summarized in batched generation calls,
+        and the chunk summaries of each document are summarized again until
+        one summary per document remains
+        """
         try:
-            # Truncate if too long (model limits)
-            max_input_length = 1024
-            if len(text) > max_input_length:
-                text = text[:max_input_length]
-                logger.warning(f"Text truncated to {max_input_length} characters")
-            
-            result = self.summarizer(
-                text,
-                max_length=max_length,
-                min_length=min_length,
-                do_sample=False
-            )
+            summaries = [""] * len(texts)
+            pending = {i: text for i, text in enumerate(texts) if text and text.strip()}
+            for level in range(MAX_REDUCE_LEVELS + 1):
+                if not pending:
+                    break
+                jobs = []
+                for i, text in pending.items():
+                    chunks = token_chunks(text, self.summarizer.tokenizer, self.max_input_tokens)
+                    if level == MAX_REDUCE_LEVELS:
+                        chunks = chunks[:1]  # last pass: keep the first window
+                    jobs.extend((i, chunk) for chunk in chunks)
+                
+                outputs = await run_inference(
+                    "summarizer", self._generate, [chunk for _, chunk in jobs], max_length, min_length
+                )
+                by_document: Dict[int, List[str]] = {}
+                for (i, _), summary in zip(jobs, outputs):
+                    by_document.setdefault(i, []).append(summary)
+                
+                pending = {}
+                for i, chunk_summaries in by_document.items():
+                    if len(chunk_summaries) == 1:
+                        summaries[i] = chunk_summaries[0]
+                    else:
+                        pending[i] = " ".join(chunk_summaries)
+                logger.debug(f"Summarization pass {level}: {len(jobs)} chunks, {len(pending)} documents to reduce")
             
-            summary = result[0]["summary_text"]
-            logger.info(f"Generated abstractive summary (length: {len(summary)})")
-            return summary
+            logger.info(f"Generated {len(texts)} abstractive summaries")
+            return summaries
         
         except Exception as e:
             logger.error(f"Abstractive summarization error: {str(e)}")
             raise
-
+    
+    def _generate(self, chunks: List[str], max_length: int, min_length: int) -> List[str]:
+        """One batched generation call over chunks of any documents"""
+        if not chunks:
+            return []
+        results = self.summarizer(
+            chunks,
+            max_length=max_length,
+            min_length=min_length,
+            do_sample=False,
+            truncation=True,
+            batch_size=self.batch_size
+        )
+        return [result["summary_text"] for result in results]
+    
+    async def stream(
+        self,
+        text: str,
+        max_length: int = 150,
+        min_length: int = 30
+    ) -> AsyncIterator[str]:
+        """
+        Generate an abstractive summary and yield its text piece by piece as
+        tokens are decoded. Texts longer than one window are first reduced
+        with map-reduce, and only the final pass is streamed. Streaming needs
+        greedy decoding, so the summary can differ slightly from summarize().
+        Closing the iterator stops generation.
+        """
+        if not text or not text.strip():
+            return
+        source = await run_inference("summarizer", self._reduce_to_window, text, max_length, min_length)
+        
+        tokenizer = self.summarizer.tokenizer
+        streamer = _QueueStreamer(tokenizer, asyncio.get_running_loop())
+        cancelled = threading.Event()
+        errors = []
+        inputs = tokenizer(source, truncation=True, max_length=self.max_input_tokens, return_tensors="pt")
+        
+        def generate():
+            if cancelled.is_set():  # client left while the request was queued
+                streamer.end()
+                return
+            try:
+                self.summarizer.model.generate(
+                    **inputs,
+                    max_length=max_length,
+                    min_length=min_length,
+                    num_beams=1,
+                    do_sample=False,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_Cancelled(cancelled)])
+                )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+        
+        # Generation holds a summarizer worker; this coroutine only relays the decoded text
+        generation = asyncio.ensure_future(run_inference("summarizer", generate))
+        try:
+            while True:
+                piece = await streamer.queue.get()
+                if piece is None:
+                    break
+                if piece:
+                    yield piece
+            if errors:
+                raise errors[0]
+            await generation
+        finally:
+            # Client disconnected or consumer stopped early: free the CPU
+            cancelled.set()
+    
+    def _reduce_to_window(self, text: str, max_length: int, min_length: int) -> str:
+        """Summarize the chunks of a text until what remains fits one input window"""
+        chunks = token_chunks(text, self.summarizer.tokenizer, self.max_input_tokens)
+        for _ in range(MAX_REDUCE_LEVELS):
+            if len(chunks) <= 1:
+                break
+            text = " ".join(self._generate(chunks, max_length, min_length))
+            chunks = token_chunks(text, self.summarizer.tokenizer, self.max_input_tokens)
+        return chunks[0] if chunks else text
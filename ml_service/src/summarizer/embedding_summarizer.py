@@ -0,0 +1,162 @@
+"""
+Extractive summarization over sentence embeddings: sentences are embedded in
+one batch with the retriever's encoder, the similarity graph is one matrix
+product, and sentences are picked by centrality (power iteration, as in
+LexRank) or by maximal marginal relevance
+"""
+import re
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.utils.config import get_default_config
+from src.utils.executor import run_inference
+
+SELECTIONS = ("centrality", "mmr")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a text, split once at sentence-ending punctuation"""
+    return [sentence for sentence in _SENTENCE_END.split(" ".join(text.split())) if sentence]
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype='float32')
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def centrality_scores(
+    similarity: np.ndarray,
+    damping: float = 0.85,
+    tolerance: float = 1e-6,
+    max_iterations: int = 100
+) -> np.ndarray:
+    """
+    Stationary distribution of a random walk over the sentence similarity
+    graph (continuous LexRank): negative similarities and self-loops dropped,
+    rows normalised, then power iteration with teleportation
+    """
+    n = len(similarity)
+    weights = np.maximum(similarity, 0)
+    np.fill_diagonal(weights, 0)
+    totals = weights.sum(axis=1, keepdims=True)
+    # A sentence similar to nothing links to every sentence
+    transition = np.where(totals > 0, weights / np.maximum(totals, 1e-12), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+def mmr_select(embeddings: np.ndarray, k: int, diversity: float = 0.3) -> List[int]:
+    """
+    Maximal marginal relevance: repeatedly take the sentence most similar to
+    the document centroid, penalised by its similarity to those already taken.
+    embeddings must be L2-normalised.
+    """
+    centroid = embeddings.mean(axis=0)
+    relevance = embeddings @ (centroid / max(np.linalg.norm(centroid), 1e-12))
+    similarity = embeddings @ embeddings.T
+    redundancy = np.full(len(embeddings), -np.inf)
+    available = np.ones(len(embeddings), dtype=bool)
+
+    selected = []
+    for _ in range(min(k, len(embeddings))):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0)
+        scores = np.where(available, (1 - diversity) * relevance - diversity * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+class EmbeddingSummarizer:
+    """
+    Drop-in alternative to ExtractiveSummarizer (same summarize() call) that
+    reuses a SentenceTransformer, normally the retriever's dense_model
+    """
+
+    def __init__(
+        self,
+        method: str = "centrality",
+        sentences_count: int = 5,
+        encoder=None,
+        model_name: Optional[str] = None,
+        batch_size: int = 64,
+        diversity: float = 0.3
+    ):
+        if method not in SELECTIONS:
+            raise ValueError(f"Unknown method: {method}. Use one of {SELECTIONS}")
+        self.method = method
+        self.sentences_count = sentences_count
+        self.model_name = model_name or get_default_config()["models"]["retriever"]
+        if encoder is None:
+            from src.utils.inference import load_sentence_encoder
+            encoder = load_sentence_encoder(self.model_name)
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.diversity = diversity
+        logger.info(f"Initialized EmbeddingSummarizer with method: {method} ({self.model_name})")
+
+    async def summarize(
+        self,
+        text: str,
+        sentences_count: Optional[int] = None,
+        embeddings: Optional[np.ndarray] = None
+    ) -> str:
+        """
+        Generate extractive summary. embeddings, if given, are the vectors of
+        split_sentences(text) in order, so they are not computed again.
+        """
+        if sentences_count is None:
+            sentences_count = self.sentences_count
+
+        try:
+            sentences = split_sentences(text)
+            if len(sentences) <= sentences_count:
+                return " ".join(sentences)
+
+            selected = await run_inference("extractive", self._select, sentences, sentences_count, embeddings)
+            # Sentences keep their order in the text
+            summary = " ".join(sentences[i] for i in sorted(selected))
+            logger.info(f"Generated extractive summary with {len(selected)} of {len(sentences)} sentences")
+            return summary
+
+        except Exception as e:
+            logger.error(f"Extractive summarization error: {str(e)}")
+            raise
+
+    def _select(self, sentences: List[str], sentences_count: int, embeddings: Optional[np.ndarray]) -> List[int]:
+        """Indices of the chosen sentences"""
+        if embeddings is None:
+            embeddings = self.encoder.encode(sentences, batch_size=self.batch_size, show_progress_bar=False)
+        embeddings = normalize_rows(embeddings)
+
+        if self.method == "centrality":
+            scores = centrality_scores(embeddings @ embeddings.T)
+            return [int(i) for i in np.argsort(-scores, kind="stable")[:sentences_count]]
+        return mmr_select(embeddings, sentences_count, self.diversity)
+
+
+def create_extractive_summarizer(method: Optional[str] = None, encoder=None, model_name: Optional[str] = None):
+    """
+    Extractive summarizer for config["summarization"]["extractive_method"]:
+    lexrank / lsa (sumy) or centrality / mmr (sentence embeddings).
+    model_name names the encoder passed in (it keys cached summaries).
+    """
+    config = get_default_config()["summarization"]
+    method = method or config["extractive_method"]
+    if method in SELECTIONS:
+        return EmbeddingSummarizer(
+            method=method, sentences_count=config["sentences_count"], encoder=encoder, model_name=model_name
+        )
+    from src.summarizer.extractive_summarizer import ExtractiveSummarizer
+    return ExtractiveSummarizer(method=method, sentences_count=config["sentences_count"])
@@ -8,6 +8,8 @@ from sumy.summarizers.lsa import LsaSummarizer
 from typing import Optional
 from loguru import logger
 
+from src.utils.executor import run_inference
+
 
 class ExtractiveSummarizer:
     def __init__(self, method: str = "lexrank", sentences_count: int = 5):
@@ -29,11 +31,8 @@ class ExtractiveSummarizer:
             sentences_count = self.sentences_count
         
         try:
-            # Parse text
-            parser = PlaintextParser.from_string(text, Tokenizer("english"))
-            
-            # Generate summary
-            summary_sentences = self.summarizer(parser.document, sentences_count)
+            # sumy's sentence graph is pure Python: keep it off the event loop
+            summary_sentences = await run_inference("extractive", self._rank, text, sentences_count)
             
             # Join sentences
             summary = " ".join(str(sentence) for sentence in summary_sentences)
@@ -44,4 +43,10 @@ class ExtractiveSummarizer:
         except Exception as e:
             logger.error(f"Extractive summarization error: {str(e)}")
             raise
-
+    
+    def _rank(self, text: str, sentences_count: int):
+        # Parse text
+        parser = PlaintextParser.from_string(text, Tokenizer("english"))
+        
+        # Generate summary
+        return self.summarizer(parser.document, sentences_count)
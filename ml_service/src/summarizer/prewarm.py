@@ -0,0 +1,99 @@
+"""
+Pre-warm the summary cache offline: summarize every indexed paper that has
+no cached summary yet, so /api/summarize serves them without running the model
+
+Usage (from ml_service/):
+    python -m src.summarizer.prewarm --snapshot data/snapshots/current
+    python -m src.summarizer.prewarm --papers data/papers.jsonl --method extractive
+
+Papers are read from a retrieval snapshot's document store, or from JSON
+lines with "id" and "content" (or "text" / "abstract"). Run it after each
+re-index; papers already summarized are skipped cheaply.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Iterator, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.retrieval.document_store import DocumentStore
+from src.retrieval.snapshot import resolve_snapshot
+from src.summarizer.summary_cache import SUMMARY_METHODS, create_summary_cache, summarize_cached
+
+
+def papers_from_snapshot(path: str) -> Iterator[Tuple[str, str]]:
+    """(paper id, text) of each live document of a snapshot"""
+    path = resolve_snapshot(path)
+    store = DocumentStore.open(os.path.join(path, "documents"))
+    deleted_path = os.path.join(path, "deleted.npy")
+    deleted = np.load(deleted_path) if os.path.exists(deleted_path) else np.zeros(len(store), dtype=bool)
+    for row in range(len(store)):
+        text = store[row]
+        if text and not (row < len(deleted) and deleted[row]):
+            yield store.doc_id(row), text
+
+
+def papers_from_jsonl(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            paper = json.loads(line)
+            text = paper.get("content") or paper.get("text") or paper.get("abstract")
+            if text:
+                yield str(paper["id"]), text
+
+
+async def prewarm(papers: Iterator[Tuple[str, str]], method: str, batch_size: int, limit: int = 0) -> dict:
+    if method == "abstractive":
+        from src.summarizer.abstractive_summarizer import AbstractiveSummarizer
+        summarizer = AbstractiveSummarizer(model_name=os.getenv("SUMMARIZER_MODEL", "facebook/bart-large-cnn"))
+    else:
+        from src.summarizer.embedding_summarizer import create_extractive_summarizer
+        summarizer = create_extractive_summarizer()
+    cache = create_summary_cache()
+
+    seen = generated = 0
+    start = time.perf_counter()
+    batch = []
+    for paper in papers:
+        batch.append(paper)
+        seen += 1
+        if len(batch) == batch_size or seen == limit:
+            generated += (await summarize_cached(summarizer, cache, batch, method))[1]
+            batch = []
+            logger.info(f"Pre-warmed {seen} papers ({generated} summarized)")
+        if seen == limit:
+            break
+    if batch:
+        generated += (await summarize_cached(summarizer, cache, batch, method))[1]
+    return {"papers": seen, "summarized": generated, "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--snapshot", default=os.getenv("RETRIEVAL_SNAPSHOT_PATH"), help="Retrieval snapshot directory")
+    source.add_argument("--papers", help="JSON lines of papers with id and content")
+    parser.add_argument("--method", default="abstractive", choices=SUMMARY_METHODS)
+    parser.add_argument("--batch-size", type=int, default=32, help="Papers summarized per batched call")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many papers (0 = all)")
+    args = parser.parse_args()
+
+    if args.papers:
+        papers = papers_from_jsonl(args.papers)
+    elif args.snapshot:
+        papers = papers_from_snapshot(args.snapshot)
+    else:
+        parser.error("Give --snapshot or --papers (or set RETRIEVAL_SNAPSHOT_PATH)")
+
+    report = asyncio.run(prewarm(papers, args.method, args.batch_size, args.limit))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Content-addressed cache of paper summaries: an in-process LRU in front of
+an on-disk (SQLite) or Redis store shared by workers and kept across restarts
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from src.utils.cache import LRUCache, TieredCache, create_cache
+from src.utils.config import get_default_config
+
+SUMMARY_METHODS = ("extractive", "abstractive")
+
+
+def create_summary_cache(config: Optional[Dict] = None):
+    """Summary cache from config["summarization"] (SUMMARY_CACHE_URL, SUMMARY_CACHE_SIZE, ...)"""
+    config = config or get_default_config()["summarization"]
+    local = LRUCache(max_size=config["cache_local_size"])
+    if not config["cache_url"]:
+        return local
+    return TieredCache(local, create_cache(config["cache_url"], max_size=config["cache_size"]))
+
+
+def summary_settings(summarizer, method: str, config: Optional[Dict] = None) -> Dict:
+    """Model and length settings a summary depends on (part of its cache key)"""
+    if method not in SUMMARY_METHODS:
+        raise ValueError(f"Unknown summarization method: {method}. Use one of {SUMMARY_METHODS}")
+    if method == "extractive":
+        settings = {"model": summarizer.method, "sentences_count": summarizer.sentences_count}
+        if getattr(summarizer, "model_name", None):
+            settings["encoder"] = summarizer.model_name  # embedding-based selection
+        return settings
+    config = config or get_default_config()["summarization"]
+    return {"model": summarizer.model_name, "max_length": config["max_length"], "min_length": config["min_length"]}
+
+
+def summary_key(paper_id: str, content: str, method: str, settings: Dict) -> str:
+    """Cache key of a summary: paper id, content hash, method and model/length settings"""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    request = [paper_id, content_hash, method, settings]
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"summary:{digest}"
+
+
+def cached_summary(summarizer, cache, paper_id: str, content: str, method: str, config: Optional[Dict] = None):
+    """The cached summary of a paper, or None"""
+    return cache.get(summary_key(paper_id, content, method, summary_settings(summarizer, method, config)))
+
+
+async def summarize_cached(
+    summarizer,
+    cache,
+    papers: Sequence[Tuple[str, str]],
+    method: str = "abstractive",
+    config: Optional[Dict] = None
+) -> Tuple[List[str], int]:
+    """
+    Summaries of (paper id, content) pairs, generating only those not in the
+    cache (abstractive ones in one batched map-reduce call). Returns the
+    summaries and how many were generated.
+    """
+    settings = summary_settings(summarizer, method, config)
+    keys = [summary_key(paper_id, content, method, settings) for paper_id, content in papers]
+    summaries = [cache.get(key) for key in keys]
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if not missing:
+        return summaries, 0
+
+    contents = [papers[i][1] for i in missing]
+    if method == "abstractive":
+        generated = await summarizer.summarize_many(
+            contents, max_length=settings["max_length"], min_length=settings["min_length"]
+        )
+    else:
+        generated = [await summarizer.summarize(content) for content in contents]
+    for i, summary in zip(missing, generated):
+        summaries[i] = summary
+        cache.put(keys[i], summary)
+    logger.debug(f"Generated {len(missing)} of {len(papers)} {method} summaries ({len(papers) - len(missing)} cached)")
+    return summaries, len(missing)
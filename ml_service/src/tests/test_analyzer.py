@@ -0,0 +1,75 @@
+"""
+Unit tests for the BM25 text analyzer and integer token arrays
+"""
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from src.retrieval.analyzer import Analyzer, TokenArrays, Vocabulary
+from src.retrieval.bm25_index import InvertedBM25Index
+
+
+def test_punctuation_and_case_are_stripped():
+    """Terms never keep punctuation or case"""
+    analyzer = Analyzer()
+    assert analyzer.analyze("Cancer, (cancer) and CANCER.") == ["cancer", "cancer", "cancer"]
+    assert analyzer.analyze("Crohn's disease") == ["crohn", "disease"]
+
+
+def test_hyphenated_names_match_joined_forms():
+    """IL-6 and IL6 become the same term; long alphabetic parts are kept too"""
+    analyzer = Analyzer()
+    assert analyzer.analyze("IL-6 levels") == ["il6", "levels"]
+    assert analyzer.analyze("IL6") == ["il6"]
+    assert analyzer.analyze("beta-blocker") == ["betablocker", "beta", "blocker"]
+    assert analyzer.analyze("SARS-CoV-2") == ["sarscov2", "sars", "cov"]
+
+
+def test_stopwords_and_stemming():
+    """Stopwords go, negations stay, and plurals fold only with stem=True"""
+    assert Analyzer().analyze("the effect of no treatment") == ["effect", "no", "treatment"]
+    stemmed = Analyzer(stem=True)
+    assert stemmed.analyze("studies trials diagnoses") == ["study", "trial", "diagnose"]
+    assert stemmed.analyze("sepsis virus mass") == ["sepsis", "virus", "mass"]
+
+
+def test_token_arrays_take_and_clear():
+    """Flat arrays give back each document's term ids"""
+    vocab = Vocabulary()
+    tokens = TokenArrays.from_lists([["a", "b"], [], ["b", "c", "c"]], vocab)
+
+    assert len(tokens) == 3
+    np.testing.assert_array_equal(tokens[2], [vocab.get("b"), vocab.get("c"), vocab.get("c")])
+    taken = tokens.take([2, 0])
+    np.testing.assert_array_equal(taken.lengths(), [3, 2])
+    np.testing.assert_array_equal(taken[1], tokens[0])
+    cleared = tokens.clear([0])
+    np.testing.assert_array_equal(cleared.lengths(), [0, 0, 3])
+    np.testing.assert_array_equal(cleared[2], tokens[2])
+
+
+def test_index_over_token_arrays_matches_rank_bm25(tmp_path):
+    """An index built from analysed term ids scores like BM25Okapi over the same terms"""
+    analyzer = Analyzer(stem=True)
+    documents = [
+        "Statins lower LDL-cholesterol in adults.",
+        "IL-6 inhibitors in COVID-19 trials",
+        "Trial of statins: LDL and cardiovascular risk",
+        "Sepsis, septic shock and IL6",
+    ]
+    vocab = Vocabulary()
+    index = InvertedBM25Index(analyzer.encode(documents, vocab), vocab=vocab)
+    reference = BM25Okapi([analyzer.analyze(doc) for doc in documents])
+
+    vocab.save(str(tmp_path / "vocab.json"))
+    loaded = Vocabulary.load(str(tmp_path / "vocab.json"))
+    for query in ("statin trials", "IL6", "ldl risk", "unknown words"):
+        np.testing.assert_allclose(
+            index.get_scores(analyzer.encode_query(query, loaded)),
+            reference.get_scores(analyzer.analyze(query)),
+            rtol=1e-5, atol=1e-6
+        )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
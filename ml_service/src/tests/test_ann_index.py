@@ -0,0 +1,96 @@
+"""
+Unit tests for the ANN index factory: index types, training and search defaults
+"""
+import faiss
+import numpy as np
+import pytest
+
+from src.utils.ann_index import (
+    build_ann_index, configure_search_defaults, create_ann_index, search_params, train_ann_index
+)
+
+
+def _vectors(n, dimension=32, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dimension)).astype('float32')
+
+
+@pytest.mark.parametrize("index_type, quantizer, expected", [
+    ("flat", "none", faiss.IndexFlatL2),
+    ("flat", "fp16", faiss.IndexScalarQuantizer),
+    ("flat", "pq", faiss.IndexPQ),
+    ("ivf_flat", "none", faiss.IndexIVFFlat),
+    ("ivf_flat", "int8", faiss.IndexIVFScalarQuantizer),
+    ("ivf_flat", "pq", faiss.IndexIVFPQ),
+    ("ivf_pq", "none", faiss.IndexIVFPQ),
+    ("hnsw", "none", faiss.IndexHNSWFlat),
+    ("hnsw", "int8", faiss.IndexHNSWSQ),
+    ("hnsw", "pq", faiss.IndexHNSWPQ),
+])
+def test_create_ann_index_types(index_type, quantizer, expected):
+    """Each index type / quantizer pair maps to its FAISS class; ivf_pq always stores PQ codes"""
+    index = create_ann_index(32, index_type=index_type, quantizer=quantizer, pq_m=8, nlist=16)
+    assert isinstance(index, expected)
+    assert index.d == 32 and index.ntotal == 0
+
+
+def test_create_ann_index_rejects_bad_config():
+    with pytest.raises(ValueError):
+        create_ann_index(32, index_type="lsh")
+    with pytest.raises(ValueError):
+        create_ann_index(32, quantizer="int4")
+    with pytest.raises(ValueError):
+        create_ann_index(30, index_type="ivf_pq", pq_m=8)
+
+
+def test_create_ann_index_caps_nlist():
+    """nlist is cut to ~39 training points per centroid when the corpus size is known"""
+    assert create_ann_index(32, index_type="ivf_flat", nlist=1024, num_vectors=800).nlist == 20
+    assert create_ann_index(32, index_type="ivf_flat", nlist=1024, num_vectors=10).nlist == 1
+    assert create_ann_index(32, index_type="ivf_flat", nlist=8, num_vectors=10000).nlist == 8
+    assert create_ann_index(32, index_type="ivf_flat", nlist=1024).nlist == 1024
+
+
+def test_train_ann_index_samples_and_skips_trained():
+    """IVF indexes train on at most train_sample_size vectors; trained indexes are left as they are"""
+    vectors = _vectors(2000)
+    index = create_ann_index(32, index_type="ivf_flat", num_vectors=len(vectors))
+    assert not index.is_trained
+    train_ann_index(index, vectors, train_sample_size=500)
+    assert index.is_trained
+
+    centroids = index.quantizer.reconstruct_n(0, index.nlist)
+    train_ann_index(index, _vectors(2000, seed=1))
+    np.testing.assert_array_equal(index.quantizer.reconstruct_n(0, index.nlist), centroids)
+
+    flat = create_ann_index(32)
+    train_ann_index(flat, vectors)
+    assert flat.is_trained and flat.ntotal == 0
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw"])
+def test_configure_search_defaults(index_type):
+    """Defaults are set through id maps, and None leaves the current value"""
+    index = build_ann_index(
+        _vectors(500), {"index_type": index_type, "nlist": 8, "nprobe": 3, "ef_search": 24}, ids=np.arange(500)
+    )
+    if index_type == "hnsw":
+        hnsw = faiss.downcast_index(index.index)
+        assert hnsw.hnsw.efSearch == 24
+        configure_search_defaults(index, nprobe=5, ef_search=None)
+        assert hnsw.hnsw.efSearch == 24
+        configure_search_defaults(index, ef_search=80)
+        assert hnsw.hnsw.efSearch == 80
+    else:
+        ivf = faiss.extract_index_ivf(index)
+        assert ivf.nprobe == 3
+        configure_search_defaults(index, nprobe=None, ef_search=80)
+        assert ivf.nprobe == 3
+        configure_search_defaults(index, nprobe=6)
+        assert ivf.nprobe == 6
+        # Per-call parameters fall back to the index default rather than FAISS's nprobe=1
+        params = search_params(index, selector=faiss.IDSelectorRange(0, 10))
+        assert params.nprobe == 6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
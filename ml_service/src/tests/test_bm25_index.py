@@ -0,0 +1,81 @@
+"""
+Unit tests for the inverted-index BM25 engine
+"""
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from src.retrieval.bm25_index import InvertedBM25Index
+
+
+def _random_corpus(num_docs: int = 500, vocab_size: int = 300, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    # Zipf-like term distribution so common and rare terms both occur
+    probs = 1.0 / np.arange(1, vocab_size + 1)
+    probs /= probs.sum()
+    return [
+        list(rng.choice(vocab, size=rng.integers(5, 60), p=probs))
+        for _ in range(num_docs)
+    ]
+
+
+def _reference_top_k(bm25: BM25Okapi, query, k):
+    scores = bm25.get_scores(query)
+    top = np.argsort(-scores, kind="stable")[:k]
+    top = top[scores[top] > 0]
+    return top, scores[top]
+
+
+def test_get_scores_matches_rank_bm25():
+    """Full score vectors match BM25Okapi"""
+    corpus = _random_corpus()
+    index = InvertedBM25Index(corpus)
+    reference = BM25Okapi(corpus)
+
+    for query in (["term0", "term5"], ["term42", "term42", "term199"], ["missing", "term3"]):
+        np.testing.assert_allclose(index.get_scores(query), reference.get_scores(query), rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("k", [1, 5, 10, 50])
+def test_top_k_matches_rank_bm25(k):
+    """Pruned top-k returns the same documents and scores as exhaustive BM25Okapi"""
+    corpus = _random_corpus()
+    index = InvertedBM25Index(corpus)
+    reference = BM25Okapi(corpus)
+    rng = np.random.default_rng(11)
+
+    for _ in range(30):
+        query = [f"term{i}" for i in rng.integers(0, 300, size=rng.integers(1, 6))]
+        docs, scores = index.top_k(query, k)
+        ref_docs, ref_scores = _reference_top_k(reference, query, k)
+
+        np.testing.assert_array_equal(docs, ref_docs)
+        np.testing.assert_allclose(scores, ref_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_top_k_many_matches_top_k():
+    """Batched scoring returns the same results as one query at a time"""
+    corpus = _random_corpus()
+    index = InvertedBM25Index(corpus)
+    queries = [["term1", "term20"], ["missing"], ["term7", "term7", "term250"], []]
+
+    batched = index.top_k_many(queries, 10)
+
+    assert len(batched) == len(queries)
+    for query, (docs, scores) in zip(queries, batched):
+        ref_docs, ref_scores = index.top_k(query, 10)
+        np.testing.assert_array_equal(docs, ref_docs)
+        np.testing.assert_allclose(scores, ref_scores)
+
+
+def test_top_k_unknown_terms():
+    """Queries without known terms return no results"""
+    index = InvertedBM25Index([["heart", "failure"], ["lung", "cancer"]])
+    docs, scores = index.top_k(["diabetes"], 5)
+    assert len(docs) == 0
+    assert len(scores) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
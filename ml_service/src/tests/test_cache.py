@@ -0,0 +1,136 @@
+"""
+Unit tests for the in-process caches
+"""
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils.cache import LRUCache, RedisCache, SQLiteCache, TieredCache, create_cache
+
+
+def test_lru_evicts_least_recently_used():
+    """The least recently read or written entry is evicted first"""
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expires_entries():
+    """Entries older than the TTL are misses"""
+    cache = LRUCache(max_size=10, ttl_seconds=0.05)
+    cache.put("q", "embedding")
+    assert cache.get("q") == "embedding"
+    time.sleep(0.1)
+    assert cache.get("q") is None
+    assert len(cache) == 0
+
+
+def test_stats_count_hits_and_misses():
+    """Hit rate is reported over all lookups"""
+    cache = LRUCache(max_size=10)
+    cache.put("x", 1)
+    cache.get("x")
+    cache.get("x")
+    cache.get("y")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_zero_size_disables_cache():
+    """A cache of size 0 stores nothing"""
+    cache = LRUCache(max_size=0)
+    cache.put("x", 1)
+    assert cache.get("x") is None
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    """Two cache objects on the same file (as in two workers) see each other's entries"""
+    path = str(tmp_path / "results.db")
+    writer = SQLiteCache(path, max_size=10)
+    reader = SQLiteCache(path, max_size=10)
+
+    writer.put("retrieve:abc", '[{"doc_id": "PMID1"}]')
+
+    assert reader.get("retrieve:abc") == '[{"doc_id": "PMID1"}]'
+    assert reader.get("retrieve:missing") is None
+    assert reader.stats()["hits"] == 1
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    """The SQLite backend stays bounded by max_size"""
+    cache = SQLiteCache(str(tmp_path / "results.db"), max_size=10)
+    for i in range(25):
+        cache.put(f"key{i}", str(i))
+
+    assert len(cache) <= 10
+    assert cache.get("key24") == "24"
+    assert cache.get("key0") is None
+
+
+def test_create_cache_backends(tmp_path):
+    """The backend is chosen from the URL scheme"""
+    assert isinstance(create_cache(""), LRUCache)
+    assert isinstance(create_cache(f"sqlite:///{tmp_path}/cache.db"), SQLiteCache)
+    with pytest.raises(ValueError):
+        create_cache("memcached://localhost")
+
+
+def test_tiered_cache_survives_restart(tmp_path):
+    """Entries written through one tiered cache are found by a fresh one on the same store"""
+    path = str(tmp_path / "summaries.db")
+    first = TieredCache(LRUCache(max_size=10), SQLiteCache(path, max_size=100))
+    first.put("summary:abc", "Statins lower LDL.")
+
+    restarted = TieredCache(LRUCache(max_size=10), SQLiteCache(path, max_size=100))
+    assert restarted.get("summary:abc") == "Statins lower LDL."
+    assert restarted.local.get("summary:abc") == "Statins lower LDL."  # copied to the local tier
+    assert restarted.get("summary:missing") is None
+    assert restarted.stats()["shared"]["hits"] == 1
+
+
+def test_redis_ttl_below_a_second_is_kept(monkeypatch):
+    """Fractional TTLs go to Redis in milliseconds instead of truncating to an invalid 0 s"""
+    calls = []
+
+    class Client:
+        def set(self, key, value, ex=None, px=None):
+            if ex is not None and ex <= 0 or px is not None and px <= 0:
+                raise ValueError("invalid expire time")
+            calls.append((key, ex, px))
+
+    redis = SimpleNamespace(Redis=SimpleNamespace(from_url=lambda url: Client()))
+    monkeypatch.setitem(sys.modules, "redis", redis)
+    RedisCache("redis://localhost", ttl_seconds=0.25).put("a", "1")
+    RedisCache("redis://localhost", ttl_seconds=None).put("b", "2")
+    assert calls == [("ml:a", None, 250), ("ml:b", None, None)]
+
+
+def test_index_versions_are_shared_by_workers_with_the_same_documents():
+    """Workers that index the same documents and apply the same updates agree on the version"""
+    from src.pipelines.rag_pipeline import next_index_version
+
+    documents, ids = ["Statins lower LDL.", "Aspirin and bleeding."], ["PMID1", "PMID2"]
+    built = next_index_version(None, "build", ids, documents, [{"year": 2020}, None])
+    assert built == next_index_version(None, "build", ids, documents, [{"year": 2020}, None])
+    assert built != next_index_version(None, "build", ids, ["Statins lower LDL.", "Aspirin."], [{"year": 2020}, None])
+
+    updated = next_index_version(built, "update", ["PMID1"], ["Statins lower LDL a lot."])
+    assert updated == next_index_version(built, "update", ["PMID1"], ["Statins lower LDL a lot."])
+    assert updated not in (built, next_index_version(built, "add", ["PMID1"], ["Statins lower LDL a lot."]))
+    assert next_index_version(updated, "delete", ["PMID2"]) != next_index_version(built, "delete", ["PMID2"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
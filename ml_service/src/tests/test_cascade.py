@@ -0,0 +1,92 @@
+"""
+Unit tests for the reranking cascade
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.reranker.cascade import RerankCascade, boundary_margin
+
+
+class WordOverlapReranker:
+    """Scores documents by occurrences of query words, recording what it was asked to score"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    def rerank(self, query, documents, top_k=10, doc_ids=None):
+        time.sleep(self.delay)
+        self.calls.append(list(doc_ids))
+        words = set(query.split())
+        scores = [sum(word in words for word in document.split()) for document in documents]
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [{"index": i, "document": documents[i], "score": float(scores[i])} for i in order]
+
+
+def _results(scores):
+    return [
+        {"doc_id": f"P{i}", "document": f"doc {i}" + " statin" * i, "score": score}
+        for i, score in enumerate(scores)
+    ]
+
+
+def test_boundary_margin():
+    assert boundary_margin([1.0, 0.9, 0.1, 0.0], 2) == pytest.approx(0.8)
+    assert boundary_margin([1.0, 0.9], 2) == 0.0
+    assert boundary_margin([0.5, 0.5, 0.5], 1) == 0.0
+
+
+def test_cascade_narrows_the_pool_for_the_full_reranker():
+    """The fast tier scores the whole pool, the full reranker only its head"""
+    fast, full = WordOverlapReranker(), WordOverlapReranker()
+    cascade = RerankCascade([("fast_reranker", fast, 2.0), ("reranker", full, 1.0)])
+    results, report = cascade.rerank("statin", _results([0.6] * 9), limit=2, started=time.perf_counter())
+
+    assert len(fast.calls[0]) == 9
+    assert full.calls[0] == ["P8", "P7", "P6", "P5"]
+    assert [r["doc_id"] for r in results] == ["P8", "P7"]
+    assert [t["tier"] for t in report["tiers"]] == ["fast_reranker", "reranker"]
+    assert report["exit"] is None
+
+
+def test_cascade_exits_on_decisive_margin_and_budget():
+    """Decisive hybrid scores skip reranking; a spent budget skips the remaining tiers"""
+    full = WordOverlapReranker()
+    cascade = RerankCascade([("reranker", full, 1.0)], exit_margin=0.5)
+    results, report = cascade.rerank("statin", _results([1.0, 0.95, 0.1, 0.0]), limit=2, started=time.perf_counter())
+    assert report["exit"] == "margin" and not full.calls
+    assert [r["doc_id"] for r in results] == ["P0", "P1"]
+
+    fast, full = WordOverlapReranker(delay=0.05), WordOverlapReranker()
+    cascade = RerankCascade([("fast_reranker", fast, 2.0), ("reranker", full, 1.0)])
+    results, report = cascade.rerank("statin", _results([0.5] * 6), limit=2, started=time.perf_counter(), budget_ms=20)
+    assert report["exit"] == "budget"
+    assert len(fast.calls) == 1 and not full.calls
+    assert len(results) == 2
+
+
+def test_result_cache_keys_separate_cascade_and_batch_reranking():
+    """Single-query (cascade) and batch (full reranker) results never answer for each other"""
+    from src.pipelines.rag_pipeline import RAGPipeline
+
+    pipeline = RAGPipeline.__new__(RAGPipeline)
+    pipeline.retriever = SimpleNamespace(model_name="minilm")
+    pipeline.index_version = "v1"
+    pipeline.reranker = SimpleNamespace(model_name="ms-marco-L-6")
+    fast = SimpleNamespace(model_name="ms-marco-L-2")
+    pipeline.cascade = RerankCascade([("fast_reranker", fast, 1.5), ("reranker", pipeline.reranker, 1.0)])
+
+    def key(use_reranker=True, batched=False):
+        return pipeline._result_cache_key("statins", None, 10, use_reranker, None, None, None, batched=batched)
+
+    assert key(batched=False) != key(batched=True)
+    assert key(use_reranker=False, batched=False) == key(use_reranker=False, batched=True)
+    single = key()
+    pipeline.cascade.exit_margin = 0.2
+    assert key() != single
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,61 @@
+"""
+Unit tests for the memory-mapped document store
+"""
+import pytest
+
+from src.retrieval.document_store import DocumentStore
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_lookup_by_row_and_paper_id(tmp_path, compress):
+    """Texts, ids and metadata come back by row, and rows by paper id"""
+    store = DocumentStore.from_documents(
+        ["statins and ldl", "sepsis ü", ""],
+        ["PMID1", "W2", "PMID3"],
+        [{"journal": "BMJ", "year": 2020}, None, {"journal": "Lancet"}],
+        directory=str(tmp_path),
+        compress=compress,
+    )
+
+    assert len(store) == 3
+    assert store[1] == "sepsis ü"
+    assert store[2] == ""
+    assert list(store.doc_ids) == ["PMID1", "W2", "PMID3"]
+    assert store.metadata(0) == {"journal": "BMJ", "year": 2020}
+    assert store.metadata(1) == {}
+    assert store.row("PMID3") == 2
+    assert store.row("missing") is None
+
+
+def test_many_appends_stay_reachable(tmp_path):
+    """Paper ids stay resolvable as the hash table grows, and re-added ids resolve to the newest row"""
+    store = DocumentStore.create(str(tmp_path))
+    for start in range(0, 3000, 500):
+        store.append([f"text {i}" for i in range(start, start + 500)], [f"P{i}" for i in range(start, start + 500)])
+    store.append(["updated"], ["P42"])
+
+    assert all(store.row(f"P{i}") == i for i in range(0, 3000, 7) if i != 42)
+    assert store.row("P42") == 3000
+    assert store[store.row("P42")] == "updated"
+
+
+def test_save_open_clear_and_copy(tmp_path):
+    """A saved store maps read-only; copies are writable and clear() drops texts only"""
+    store = DocumentStore.from_documents(["a", "b", "c"], ["1", "2", "3"], directory=str(tmp_path / "work"))
+    store.save(str(tmp_path / "saved"))
+
+    opened = DocumentStore.open(str(tmp_path / "saved"))
+    assert list(opened) == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        opened.append(["d"], ["4"])
+
+    copy = opened.copy(str(tmp_path / "work"))
+    copy.append(["d"], ["4"])
+    copy.clear([1])
+    assert list(copy) == ["a", "", "c", "d"]
+    assert copy.row("2") == 1
+    assert len(opened) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
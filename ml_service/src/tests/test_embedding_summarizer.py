@@ -0,0 +1,103 @@
+"""
+Unit tests for the embedding-based extractive summarizer
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.summarizer.embedding_summarizer import (
+    EmbeddingSummarizer,
+    centrality_scores,
+    create_extractive_summarizer,
+    mmr_select,
+    normalize_rows,
+    split_sentences,
+)
+
+
+class TableEncoder:
+    """Stand-in encoder: a fixed vector per sentence, counting encode() calls"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    def encode(self, sentences, **kwargs):
+        self.calls += 1
+        return np.array([self.vectors[sentence] for sentence in sentences], dtype='float32')
+
+
+SENTENCES = [
+    "Statins lower LDL cholesterol.",
+    "Statin therapy reduces cholesterol.",
+    "LDL falls on statins.",
+    "The trial ran in Ohio.",
+    "Statins cut cholesterol levels.",
+]
+VECTORS = {
+    SENTENCES[0]: [1.0, 0.1, 0.0],
+    SENTENCES[1]: [0.9, 0.2, 0.0],
+    SENTENCES[2]: [0.8, 0.0, 0.1],
+    SENTENCES[3]: [0.0, 0.1, 1.0],
+    SENTENCES[4]: [1.0, 0.1, 0.0],
+}
+
+
+def test_split_sentences():
+    """Sentences split at end punctuation, whitespace collapsed"""
+    assert split_sentences("One two.  Three?\nFour!") == ["One two.", "Three?", "Four!"]
+    assert split_sentences("   ") == []
+
+
+def test_centrality_ranks_the_central_sentences_first():
+    """Sentences similar to many others outrank the outlier"""
+    embeddings = normalize_rows(np.array([VECTORS[s] for s in SENTENCES]))
+    scores = centrality_scores(embeddings @ embeddings.T)
+
+    assert scores.sum() == pytest.approx(1.0)
+    assert np.argmin(scores) == 3
+
+
+def test_mmr_skips_duplicates():
+    """MMR does not pick a second copy of an already selected sentence"""
+    embeddings = normalize_rows(np.array([VECTORS[s] for s in SENTENCES]))
+    selected = mmr_select(embeddings, 2, diversity=0.7)
+
+    assert len(set(selected)) == 2
+    assert not {0, 4} <= set(selected)
+
+
+@pytest.mark.parametrize("method", ["centrality", "mmr"])
+def test_summary_keeps_text_order_and_reuses_given_embeddings(method):
+    """Selected sentences come out in text order; given vectors skip the encoder"""
+    encoder = TableEncoder(VECTORS)
+    summarizer = EmbeddingSummarizer(method=method, sentences_count=2, encoder=encoder, model_name="table")
+    text = " ".join(SENTENCES)
+
+    summary = asyncio.run(summarizer.summarize(text))
+    picked = split_sentences(summary)
+    assert len(picked) == 2
+    assert [SENTENCES.index(s) for s in picked] == sorted(SENTENCES.index(s) for s in picked)
+    assert encoder.calls == 1
+
+    given = np.array([VECTORS[s] for s in SENTENCES])
+    assert asyncio.run(summarizer.summarize(text, embeddings=given)) == summary
+    assert encoder.calls == 1
+
+
+def test_short_text_is_returned_whole():
+    summarizer = EmbeddingSummarizer(sentences_count=5, encoder=TableEncoder(VECTORS), model_name="table")
+    assert asyncio.run(summarizer.summarize("One sentence. Two sentences.")) == "One sentence. Two sentences."
+
+
+def test_factory_names_the_shared_encoder():
+    """A shared encoder is keyed by its own model name, not the configured retriever model"""
+    encoder = TableEncoder(VECTORS)
+    summarizer = create_extractive_summarizer(method="mmr", encoder=encoder, model_name="retriever-in-use")
+    assert summarizer.encoder is encoder
+    assert summarizer.model_name == "retriever-in-use"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
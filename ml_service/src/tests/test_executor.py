@@ -0,0 +1,85 @@
+"""
+Unit tests for the inference executor
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.utils.executor import InferenceExecutor
+
+CONFIG = {
+    "retrieval_workers": 2, "reranker_workers": 1, "summarizer_workers": 1, "extractive_workers": 1, "nli_workers": 1,
+    "torch_threads": 0, "wait_window": 100,
+}
+
+
+def test_blocking_calls_leave_the_event_loop_free():
+    """A slow model call does not delay other coroutines on the loop"""
+    executor = InferenceExecutor(CONFIG)
+
+    async def scenario():
+        call = asyncio.ensure_future(executor.run("summarizer", time.sleep, 0.3))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        tick = time.perf_counter() - start
+        await call
+        return tick
+
+    assert asyncio.run(scenario()) < 0.1
+    executor.shutdown()
+
+
+def test_extractive_calls_do_not_queue_behind_generation():
+    """Extractive summaries have their own pool, so a long abstractive call does not hold them up"""
+    executor = InferenceExecutor(CONFIG)
+
+    async def scenario():
+        generation = asyncio.ensure_future(executor.run("summarizer", time.sleep, 0.3))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        await executor.run("extractive", time.sleep, 0)
+        elapsed = time.perf_counter() - start
+        await generation
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.1
+    executor.shutdown()
+
+def test_pool_bounds_concurrency_and_counts_waits():
+    """Calls beyond the family's workers queue up, and the wait is reported"""
+    executor = InferenceExecutor(CONFIG)
+
+    async def scenario():
+        calls = [asyncio.ensure_future(executor.run("summarizer", time.sleep, 0.1)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        during = executor.stats()["summarizer"]
+        await asyncio.gather(*calls)
+        return during
+
+    during = asyncio.run(scenario())
+    assert during["running"] == 1 and during["queued"] == 2
+
+    stats = executor.stats()["summarizer"]
+    assert stats["completed"] == 3 and stats["queued"] == 0
+    assert stats["wait_ms_p99"] >= 150  # the third call waited for two others
+    assert executor.stats()["retrieval"]["completed"] == 0
+    executor.shutdown()
+
+
+def test_errors_propagate_and_unknown_family_is_rejected():
+    executor = InferenceExecutor(CONFIG)
+
+    def fail():
+        raise RuntimeError("model failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(executor.run("nli", fail))
+    assert executor.stats()["nli"]["failed"] == 1
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run("vision", time.sleep, 0))
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,55 @@
+"""
+Parity of the ONNX Runtime inference backends with PyTorch
+"""
+import numpy as np
+import pytest
+
+from src.utils.inference import load_cross_encoder, load_sentence_encoder
+
+QUERIES = ["statin therapy in elderly patients", "early warning scores for sepsis"]
+DOCUMENTS = [
+    "Statins reduce LDL cholesterol and cardiovascular events in adults over 75.",
+    "The National Early Warning Score predicts deterioration in patients with suspected sepsis.",
+    "Metformin remains first-line therapy for type 2 diabetes.",
+    "High-intensity statin therapy was not associated with more adverse events in older adults.",
+]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        load_sentence_encoder("sentence-transformers/all-MiniLM-L6-v2", backend="tensorrt")
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx_int8"])
+def test_sentence_encoder_parity(backend, tmp_path, monkeypatch):
+    """ONNX embeddings point the same way as the PyTorch ones"""
+    pytest.importorskip("optimum.onnxruntime")
+    monkeypatch.setenv("ONNX_CACHE_DIR", str(tmp_path))
+    model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    reference = load_sentence_encoder(model_name, backend="torch").encode(DOCUMENTS + QUERIES)
+    embeddings = load_sentence_encoder(model_name, backend=backend).encode(DOCUMENTS + QUERIES)
+
+    cosine = (reference * embeddings).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(embeddings, axis=1)
+    )
+    assert cosine.min() > (0.9999 if backend == "onnx" else 0.98)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx_int8"])
+def test_cross_encoder_parity(backend, tmp_path, monkeypatch):
+    """ONNX reranker scores stay close to PyTorch and rank the candidates the same way"""
+    pytest.importorskip("optimum.onnxruntime")
+    monkeypatch.setenv("ONNX_CACHE_DIR", str(tmp_path))
+    model_name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    pairs = [[query, document] for query in QUERIES for document in DOCUMENTS]
+    reference = np.asarray(load_cross_encoder(model_name, backend="torch").predict(pairs))
+    scores = np.asarray(load_cross_encoder(model_name, backend=backend).predict(pairs))
+
+    assert np.abs(scores - reference).max() < (1e-3 if backend == "onnx" else 0.05)
+    for i in range(len(QUERIES)):
+        block = slice(i * len(DOCUMENTS), (i + 1) * len(DOCUMENTS))
+        assert np.argmax(scores[block]) == np.argmax(reference[block])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
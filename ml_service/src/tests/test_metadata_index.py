@@ -0,0 +1,61 @@
+"""
+Unit tests for the metadata filter index
+"""
+import numpy as np
+import pytest
+
+from src.retrieval.metadata_index import MetadataIndex
+
+
+PAPERS = [
+    {"publication_date": "2012-03-01", "journal": "Lancet", "is_open_access": True, "concepts": ["Cardiology"]},
+    {"publication_date": "2019-07-15", "journal": "BMJ", "is_open_access": False, "study_type": "RCT"},
+    {"year": 2021, "journal": "bmj", "open_access": True, "concepts": ["Oncology", "Cardiology"]},
+    None,
+]
+
+
+def test_mask_combines_fields_and_values():
+    """Fields are AND-ed, listed values OR-ed, strings matched case-insensitively"""
+    index = MetadataIndex()
+    index.add(PAPERS)
+
+    np.testing.assert_array_equal(index.mask({"journal": "BMJ"}), [False, True, True, False])
+    np.testing.assert_array_equal(index.mask({"journal": ["lancet", "bmj"], "open_access": True}), [True, False, True, False])
+    np.testing.assert_array_equal(index.mask({"year_from": 2015, "year_to": 2020}), [False, True, False, False])
+    np.testing.assert_array_equal(index.mask({"concepts": "cardiology", "study_type": "rct"}), [False, False, False, False])
+    assert index.mask({}) is None
+    assert index.mask({"journal": []}) is None
+
+
+def test_unknown_filter_field():
+    """Filtering on an unindexed field is an error rather than a silent no-op"""
+    index = MetadataIndex()
+    index.add(PAPERS)
+    with pytest.raises(ValueError):
+        index.mask({"author": "Smith"})
+
+
+def test_add_rows_incrementally():
+    """Rows added later are covered by new masks"""
+    index = MetadataIndex()
+    index.add(PAPERS[:2])
+    assert index.mask({"journal": "bmj"}).tolist() == [False, True]
+
+    index.add(PAPERS[2:], rows=np.array([2, 3]))
+    assert index.mask({"journal": "bmj"}).tolist() == [False, True, True, False]
+
+
+def test_save_and_load(tmp_path):
+    """A reloaded index produces the same masks"""
+    index = MetadataIndex()
+    index.add(PAPERS)
+    index.save(str(tmp_path / "metadata"))
+
+    loaded = MetadataIndex.load(str(tmp_path / "metadata"))
+    for filters in ({"journal": "bmj"}, {"open_access": False}, {"concepts": ["oncology"], "year_from": 2020}):
+        np.testing.assert_array_equal(loaded.mask(filters), index.mask(filters))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,163 @@
+"""
+Unit tests for NLI claim verification
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.entailment import nli_verifier
+from src.entailment.nli_verifier import NLIVerifier, aggregate_pairs
+
+
+class KeywordNLI:
+    """
+    Stand-in NLI pipeline: a premise sharing most claim words entails it,
+    or contradicts it when it also says "no"; records each batched call
+    """
+
+    model = SimpleNamespace(config=SimpleNamespace(id2label={0: "CONTRADICTION", 1: "ENTAILMENT", 2: "NEUTRAL"}))
+    tokenizer = SimpleNamespace(model_max_length=512)
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, pairs, top_k=None, **kwargs):
+        self.calls.append(pairs)
+        outputs = []
+        for pair in pairs:
+            premise = set(pair["text"].lower().strip(".").split())
+            claim = set(pair["text_pair"].lower().strip(".").split())
+            support = len(premise & claim) / len(claim)
+            if support < 0.6:
+                probabilities = {"NEUTRAL": 0.8, "ENTAILMENT": 0.1, "CONTRADICTION": 0.1}
+            elif "no" in premise:
+                probabilities = {"CONTRADICTION": 0.9, "ENTAILMENT": 0.05, "NEUTRAL": 0.05}
+            else:
+                probabilities = {"ENTAILMENT": 0.9, "CONTRADICTION": 0.05, "NEUTRAL": 0.05}
+            outputs.append([{"label": label, "score": score} for label, score in probabilities.items()])
+        return outputs
+
+
+class WordEncoder:
+    """Stand-in sentence encoder: bag of words over a small vocabulary"""
+
+    vocabulary = ["statins", "ldl", "cholesterol", "aspirin", "bleeding", "trial", "ohio", "sepsis"]
+
+    def encode(self, sentences, **kwargs):
+        return np.array(
+            [[float(word in sentence.lower()) for word in self.vocabulary] for sentence in sentences]
+        ) + 1e-3
+
+
+@pytest.fixture
+def verifier(monkeypatch):
+    monkeypatch.setattr(nli_verifier, "load_pipeline", lambda *args, **kwargs: KeywordNLI())
+    return NLIVerifier(model_name="stub-mnli", encoder=WordEncoder(), premise_sentences=2)
+
+
+CONTEXT = (
+    "The trial enrolled adults in Ohio. Statins lowered LDL cholesterol. "
+    "Aspirin increased bleeding. Sepsis was rare. Follow-up lasted two years."
+)
+
+
+def test_entailed_claim_cites_the_premise_sentence(verifier):
+    result = asyncio.run(verifier.verify("Statins lowered LDL cholesterol", CONTEXT))
+
+    assert result["entailment"] == "entailment"
+    assert result["confidence"] == pytest.approx(0.9)
+    assert result["evidence"] == "Statins lowered LDL cholesterol."
+    assert set(result["scores"]) == {"entailment", "contradiction", "neutral"}
+
+
+def test_only_selected_premises_are_scored_in_one_batch(verifier):
+    """Long contexts send the top sentences plus their join, not every sentence, in a single call"""
+    asyncio.run(verifier.verify("Aspirin increased bleeding", CONTEXT * 20))
+
+    assert len(verifier.model.calls) == 1
+    assert len(verifier.model.calls[0]) == 3  # two sentences and both together
+    assert all(pair["text_pair"] == "Aspirin increased bleeding" for pair in verifier.model.calls[0])
+
+
+def test_contradiction_and_neutral(verifier):
+    contradicted = asyncio.run(verifier.verify("Statins lowered LDL", "Statins had no effect: LDL was not lowered."))
+    assert contradicted["entailment"] == "contradiction"
+
+    unrelated = asyncio.run(verifier.verify("Metformin prevents dementia", CONTEXT))
+    assert unrelated["entailment"] == "neutral"
+
+
+def test_aggregate_prefers_the_strongest_decisive_pair():
+    probabilities = np.array([
+        [0.3, 0.1, 0.6],
+        [0.7, 0.1, 0.2],
+        [0.1, 0.6, 0.3],
+    ])
+    result = aggregate_pairs(probabilities)
+    assert result["entailment"] == "entailment" and result["pair"] == 1
+
+    weak = aggregate_pairs(np.array([[0.4, 0.2, 0.4], [0.2, 0.3, 0.5]]))
+    assert weak["entailment"] == "neutral" and weak["pair"] == 1
+
+
+def test_non_nli_checkpoint_fails_to_load(monkeypatch):
+    """A classifier without NLI labels raises instead of answering neutral for every claim"""
+    sentiment = KeywordNLI()
+    sentiment.model = SimpleNamespace(config=SimpleNamespace(id2label={0: "NEGATIVE", 1: "POSITIVE"}))
+    monkeypatch.setattr(nli_verifier, "load_pipeline", lambda *args, **kwargs: sentiment)
+    with pytest.raises(ValueError):
+        NLIVerifier(model_name="stub-sentiment")
+
+
+def test_load_errors_propagate(monkeypatch):
+    def load_pipeline(*args, **kwargs):
+        raise OSError("stub-missing is not a model identifier")
+
+    monkeypatch.setattr(nli_verifier, "load_pipeline", load_pipeline)
+    with pytest.raises(OSError):
+        NLIVerifier(model_name="stub-missing")
+
+
+def test_zero_premise_sentences_scores_the_whole_context(monkeypatch):
+    """0 is honoured rather than replaced by the configured default"""
+    monkeypatch.setattr(nli_verifier, "load_pipeline", lambda *args, **kwargs: KeywordNLI())
+    verifier = NLIVerifier(model_name="stub-mnli", encoder=WordEncoder(), premise_sentences=0)
+    assert verifier.premise_sentences == 0
+    assert verifier.select_premises("Statins lowered LDL cholesterol.", CONTEXT) == [CONTEXT]
+
+
+def test_batch_size_below_one_is_rejected(monkeypatch):
+    monkeypatch.setattr(nli_verifier, "load_pipeline", lambda *args, **kwargs: KeywordNLI())
+    with pytest.raises(ValueError):
+        NLIVerifier(model_name="stub-mnli", batch_size=0)
+
+
+def test_encoder_is_loaded_once_under_concurrent_calls(monkeypatch):
+    """Workers of the nli pool that all find the encoder missing share one load"""
+    loads = []
+
+    def load_sentence_encoder(model_name):
+        loads.append(model_name)
+        time.sleep(0.05)
+        return WordEncoder()
+
+    monkeypatch.setattr(nli_verifier, "load_pipeline", lambda *args, **kwargs: KeywordNLI())
+    monkeypatch.setattr("src.utils.inference.load_sentence_encoder", load_sentence_encoder)
+    verifier = NLIVerifier(model_name="stub-mnli", premise_sentences=2)
+    threads = [
+        threading.Thread(target=verifier.select_premises, args=("Statins lowered LDL cholesterol.", CONTEXT))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,46 @@
+"""
+Unit tests for passage splitting and paper-level aggregation of passage hits
+"""
+import numpy as np
+import pytest
+
+from src.retrieval.passages import aggregate_passages, mean_by_owner, split_passages
+
+
+def test_split_passages_overlaps_and_covers_text():
+    """Windows overlap by `overlap` words and the last one reaches the end of the text"""
+    text = " ".join(f"w{i}" for i in range(10))
+    spans = split_passages(text, words=4, overlap=1)
+    passages = [text[start:end] for start, end in spans]
+
+    assert passages == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert split_passages("short text", words=4, overlap=1) == [(0, 10)]
+    assert split_passages("", words=4, overlap=1) == [(0, 0)]
+
+
+def test_aggregate_passages_max_and_sum_top():
+    """Papers score their best passage or the sum of their best two, with the best passages listed"""
+    owners = np.array([0, 0, 0, 1, 2])
+    passage_ids = np.array([3, 0, 1, 2, 4, -1])
+    scores = np.array([0.9, 0.8, 0.7, 0.1, 0.5, 0.0], dtype='float32')
+
+    rows, paper_scores, best = aggregate_passages(passage_ids, scores, owners, k=3, method="max", top=2)
+    np.testing.assert_array_equal(rows, [1, 0, 2])
+    np.testing.assert_allclose(paper_scores, [0.9, 0.8, 0.5])
+    assert [b.tolist() for b in best] == [[3], [0, 1], [4]]
+
+    rows, paper_scores, _ = aggregate_passages(passage_ids, scores, owners, k=2, method="sum_top", top=2)
+    np.testing.assert_array_equal(rows, [0, 1])
+    np.testing.assert_allclose(paper_scores, [1.5, 0.9])
+
+    with pytest.raises(ValueError):
+        aggregate_passages(passage_ids, scores, owners, k=2, method="mean")
+
+
+def test_mean_by_owner():
+    embeddings = np.array([[1, 0], [3, 2], [5, 5]], dtype='float32')
+    np.testing.assert_allclose(mean_by_owner(embeddings, np.array([0, 0, 1]), 2), [[2, 1], [5, 5]])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,101 @@
+"""
+Unit tests for the cross-encoder reranker
+"""
+import re
+
+import numpy as np
+import pytest
+
+from src.reranker.cross_encoder import CrossEncoderReranker
+
+
+class _Encoding(dict):
+    def __init__(self, data, sequences):
+        super().__init__(data)
+        self.sequences = sequences
+
+    def sequence_ids(self, i):
+        return self.sequences[i]
+
+
+class WordTokenizer:
+    """Stand-in fast tokenizer: a token per word, laid out as [CLS] query [SEP] document [SEP]"""
+
+    is_fast = True
+
+    def __call__(self, queries, documents, truncation=None, max_length=512, return_offsets_mapping=False):
+        encoded, sequences = {"input_ids": [], "offset_mapping": []}, []
+        for query, document in zip(queries, documents):
+            spans = [[m.span() for m in re.finditer(r"\S+", text)] for text in (query, document)]
+            while 3 + len(spans[0]) + len(spans[1]) > max_length:
+                spans[int(len(spans[1]) >= len(spans[0]))].pop()  # longest_first
+            sequence_ids = [None] + [0] * len(spans[0]) + [None] + [1] * len(spans[1]) + [None]
+            encoded["input_ids"].append(list(range(len(sequence_ids))))
+            encoded["offset_mapping"].append([(0, 0)] + spans[0] + [(0, 0)] + spans[1] + [(0, 0)])
+            sequences.append(sequence_ids)
+        return _Encoding(encoded, sequences)
+
+
+@pytest.fixture
+def reranker():
+    reranker = CrossEncoderReranker(max_length=128, cache_size=64)
+    reranker.model.tokenizer = WordTokenizer()
+    predict = reranker.model.predict
+    reranker.batches = []
+
+    def recording_predict(pairs, **kwargs):
+        reranker.batches.append([doc for _, doc in pairs])
+        return predict(pairs, **kwargs)
+
+    reranker.model.predict = recording_predict
+    return reranker
+
+
+def test_rerank_orders_by_score_and_keeps_indices(reranker):
+    """Results are best first and "index" points back into the input list"""
+    documents = [
+        "Sepsis early warning scores in the emergency department",
+        "Statins reduce LDL cholesterol",
+        "Statin therapy lowers LDL cholesterol and cardiovascular events in adults",
+    ]
+    results = reranker.rerank("statins and ldl cholesterol", documents, top_k=2, doc_ids=["P1", "P2", "P3"])
+
+    assert len(results) == 2
+    assert all(results[i]["score"] >= results[i + 1]["score"] for i in range(len(results) - 1))
+    assert all(documents[r["index"]] == r["document"] for r in results)
+    assert 0 not in [r["index"] for r in results]
+
+
+def test_pairs_are_scored_shortest_first_and_cached(reranker):
+    """Uncached pairs go to the model sorted by length; repeated pairs are served from the cache"""
+    documents = ["a much longer document about statins and cholesterol", "short", "medium length text"]
+    first = reranker.score_many(["statins"], [documents], doc_ids_per_query=[["P1", "P2", "P3"]])
+
+    assert reranker.batches == [sorted(documents, key=len)]
+
+    second = reranker.score_many(
+        ["  statins ", "sepsis"], [documents, documents[:1]], doc_ids_per_query=[["P1", "P2", "P3"], ["P1"]]
+    )
+    assert reranker.batches[1] == documents[:1]  # only the new (query, doc id) pair
+    np.testing.assert_allclose(second[0], first[0])
+    assert reranker.cache.stats()["hits"] == 3
+
+    reranker.clear_cache()
+    reranker.score_many(["statins"], [documents[:1]])
+    assert len(reranker.batches) == 3
+
+
+def test_pairs_are_bucketed_by_tokens_and_cut_at_max_length(reranker):
+    """Order follows token counts, not characters, and documents lose only the tokens past max_length"""
+    long_word = "pneumonoultramicroscopicsilicovolcanoconiosis"
+    many_words = "a b c d e f"
+    very_long = " ".join(f"w{i}" for i in range(300))
+    reranker.score_many(["statins"], [[many_words, very_long, long_word]])
+
+    batch = reranker.batches[0]
+    assert batch[:2] == [long_word, many_words]
+    assert batch[2] == " ".join(f"w{i}" for i in range(128 - 4))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
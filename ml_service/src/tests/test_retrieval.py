@@ -1,8 +1,11 @@
 """
 Unit tests for retrieval module
 """
+import numpy as np
 import pytest
 from src.retrieval.hybrid_retriever import HybridRetriever
+from src.retrieval.fusion import fuse_candidates
+from src.utils.ann_index import default_ann_config
 
 
 def test_hybrid_retriever_initialization():
@@ -44,6 +47,190 @@ def test_hybrid_retriever_retrieve():
     assert "document" in results[0]
 
 
+def test_hybrid_retriever_rrf_fusion():
+    """Test retrieval with reciprocal rank fusion and a deep candidate pool"""
+    retriever = HybridRetriever()
+    documents = [
+        "Machine learning is a subset of artificial intelligence.",
+        "Natural language processing helps computers understand text.",
+        "Healthcare AI can improve patient outcomes."
+    ]
+    retriever.build_index(documents)
+    
+    results = retriever.retrieve("machine learning", k=3, fusion="rrf", candidate_k=10)
+    
+    assert len(results) == 3
+    assert len({r["id"] for r in results}) == 3
+    assert results[0]["document"] == documents[results[0]["id"]]
+
+
+def test_hybrid_retriever_incremental_updates():
+    """Added documents are found, deleted ones never returned, before and after compaction"""
+    retriever = HybridRetriever()
+    documents = [
+        "Statins reduce LDL cholesterol",
+        "Sepsis early warning scores",
+        "Metformin for type 2 diabetes",
+    ]
+    retriever.build_index(documents, doc_ids=["P1", "P2", "P3"])
+    
+    retriever.add_documents(["Insulin pumps for type 1 diabetes"], ["P4"])
+    retriever.delete_documents(["P3"])
+    
+    for _ in range(2):
+        results = retriever.retrieve("diabetes", k=4)
+        doc_ids = [r["doc_id"] for r in results]
+        assert "P3" not in doc_ids
+        assert "P4" in doc_ids
+        retriever.compact()
+    
+    assert retriever.num_deleted == 0
+
+
+def test_compact_requires_a_built_index(monkeypatch):
+    """An unbuilt retriever raises like the other mutators; background failures are logged"""
+    retriever = HybridRetriever()
+    with pytest.raises(ValueError, match="Index not built"):
+        retriever.compact()
+    
+    retriever.build_index(["Statins reduce LDL cholesterol", "Sepsis early warning scores"], doc_ids=["P1", "P2"])
+    retriever.delete_documents(["P1"])
+    errors = []
+    
+    def read_only():
+        raise ValueError("read-only")
+    
+    monkeypatch.setattr("src.retrieval.hybrid_retriever.logger.error", errors.append)
+    monkeypatch.setattr(retriever, "_ensure_mutable", read_only)
+    retriever.compact(background=True).join()
+    assert errors == ["Background compaction failed: read-only"]
+
+
+def test_binary_prefilter_rescores_exactly(tmp_path):
+    """The two-stage dense search keeps exact scores and skips deleted rows, also from a snapshot"""
+    retriever = HybridRetriever(ann_config=dict(default_ann_config(), binary_index="flat"))
+    documents = [
+        "Statins reduce LDL cholesterol",
+        "Sepsis early warning scores",
+        "Metformin for type 2 diabetes",
+        "Diabetes and cardiovascular risk",
+    ]
+    retriever.build_index(documents, doc_ids=["P1", "P2", "P3", "P4"])
+    
+    exact_rows, exact_scores = retriever.dense_search("type 2 diabetes", k=4)
+    rows, scores = retriever.dense_search("type 2 diabetes", k=4, binary_prefilter=True)
+    assert set(rows) == set(exact_rows)
+    np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+    
+    retriever.add_documents(["Insulin pumps for type 1 diabetes"], ["P5"])
+    retriever.delete_documents(["P3"])
+    rows, _ = retriever.dense_search("diabetes", k=5, binary_prefilter=True)
+    assert 2 not in rows and 4 in rows
+    
+    retriever.save_snapshot(str(tmp_path / "snap"))
+    loaded = HybridRetriever()
+    loaded.load_snapshot(str(tmp_path / "snap"))
+    loaded_rows, _ = loaded.dense_search("diabetes", k=5, binary_prefilter=True)
+    assert set(loaded_rows) == set(rows)
+    
+    loaded.add_documents(["Diabetes screening in adults"], ["P6"])
+    assert 5 in loaded.dense_search("diabetes screening", k=5, binary_prefilter=True)[0]
+
+
+def test_passage_index_returns_best_passages(tmp_path):
+    """Papers are found by a late passage, which comes back as the snippet, also after deletes and reloads"""
+    passage_config = {"enabled": True, "words": 6, "overlap": 2, "aggregation": "max", "top": 1}
+    retriever = HybridRetriever(passage_config=passage_config)
+    documents = [
+        "Background on lipid testing in primary care clinics across several regions "
+        "followed by statins lowering ldl cholesterol in adults",
+        "Sepsis early warning scores",
+        "Metformin for type 2 diabetes",
+    ]
+    retriever.build_index(documents, doc_ids=["P1", "P2", "P3"])
+    assert len(retriever.passages) == 7
+
+    results = retriever.retrieve("statins lowering ldl cholesterol", k=3, alpha=1.0)
+    assert results[0]["doc_id"] == "P1"
+    assert "ldl cholesterol" in results[0]["passages"][0]
+    assert all(len(r["passages"]) == 1 for r in results)
+
+    retriever.add_documents(["Insulin pumps for type 1 diabetes"], ["P4"])
+    retriever.delete_documents(["P3"])
+    rows, _ = retriever.dense_search("diabetes", k=4)
+    assert 2 not in rows and 3 in rows
+
+    retriever.save_snapshot(str(tmp_path / "snap"))
+    loaded = HybridRetriever()
+    loaded.load_snapshot(str(tmp_path / "snap"))
+    assert loaded.passages is not None
+    results = {r["doc_id"]: r for r in loaded.retrieve("insulin pumps", k=3)}
+    assert results["P4"]["passages"] == ["Insulin pumps for type 1 diabetes"]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat"])
+def test_embed_document_returns_the_indexed_vector(tmp_path, index_type):
+    """Stored vectors are returned without running the encoder, also from a memory-mapped snapshot"""
+    retriever = HybridRetriever(ann_config=dict(default_ann_config(), index_type=index_type))
+    documents = ["Statins reduce LDL cholesterol", "Sepsis early warning scores", "Metformin for type 2 diabetes"]
+    retriever.build_index(documents, doc_ids=["P1", "P2", "P3"])
+    expected = np.asarray(retriever.dense_model.encode(documents[1:2]), dtype='float32')[0]
+    retriever.delete_documents(["P3"])
+    retriever.save_snapshot(str(tmp_path / "snap"))
+    loaded = HybridRetriever()
+    loaded.load_snapshot(str(tmp_path / "snap"))
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("the encoder should not run")
+    
+    for source in (retriever, loaded):
+        source.dense_model.encode = fail
+        np.testing.assert_allclose(source.embed_document("P2"), expected, rtol=1e-5)
+        assert source.embed_document("P3") is None
+        assert source.embed_document("missing") is None
+
+
+def test_query_embedding_cache():
+    """Repeated queries are served from the cache, up to whitespace differences"""
+    retriever = HybridRetriever(query_cache_size=16)
+    retriever.build_index(["Statins reduce LDL cholesterol", "Sepsis early warning scores"])
+    
+    first = retriever.retrieve("statin therapy", k=2)
+    second = retriever.retrieve("  statin   therapy ", k=2)
+    
+    assert [r["id"] for r in first] == [r["id"] for r in second]
+    stats = retriever.query_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_weighted_fusion_aligns_by_document_id():
+    """Dense and sparse scores are matched by document id, not list position"""
+    fused = fuse_candidates(
+        sparse_ids=np.array([4, 9]), sparse_scores=np.array([3.0, 1.0]),
+        dense_ids=np.array([9, 2]), dense_scores=np.array([0.9, 0.1]),
+        method="weighted", alpha=0.5
+    )
+    
+    # 4 and 9 tie on fused score and are ordered by id
+    assert fused["ids"].tolist() == [4, 9, 2]
+    np.testing.assert_allclose(fused["scores"], [0.5, 0.5, 0.0])
+    np.testing.assert_allclose(fused["sparse_scores"], [3.0, 1.0, 0.0])
+    np.testing.assert_allclose(fused["dense_scores"], [0.0, 0.9, 0.1])
+
+
+def test_rrf_fusion():
+    """Reciprocal rank fusion rewards documents ranked by both lists"""
+    fused = fuse_candidates(
+        sparse_ids=np.array([1, 2, 3]), sparse_scores=np.array([9.0, 5.0, 1.0]),
+        dense_ids=np.array([3, 2]), dense_scores=np.array([0.8, 0.7]),
+        method="rrf", rrf_k=60
+    )
+    
+    assert fused["ids"].tolist() == [3, 2, 1]
+    assert fused["scores"][0] == pytest.approx(1 / 63 + 1 / 61)
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
 
@@ -0,0 +1,103 @@
+"""
+Unit tests for the segmented BM25 index used for incremental updates
+"""
+import numpy as np
+import pytest
+
+from src.retrieval.bm25_index import CollectionStats, InvertedBM25Index
+from src.retrieval.segments import SegmentedBM25
+
+
+def _random_corpus(num_docs: int = 300, vocab_size: int = 200, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    probs = 1.0 / np.arange(1, vocab_size + 1)
+    probs /= probs.sum()
+    return [
+        [f"term{i}" for i in rng.choice(vocab_size, size=rng.integers(5, 40), p=probs)]
+        for _ in range(num_docs)
+    ]
+
+
+def test_deleted_rows_are_never_returned():
+    """Tombstoned documents disappear from results in every segment"""
+    corpus = _random_corpus()
+    index = SegmentedBM25.build(corpus[:200])
+    index.add(corpus[200:], np.arange(200, 300))
+
+    deleted = np.array([0, 5, 17, 210, 299])
+    index.delete(deleted, [corpus[row] for row in deleted])
+
+    for query in (["term0"], ["term1", "term9"], corpus[5][:3], corpus[210][:3]):
+        rows, _ = index.top_k(query, 300)
+        assert not np.isin(rows, deleted).any()
+    assert len(index) == 295
+    assert sorted(index.live_rows()) == sorted(set(range(300)) - set(deleted.tolist()))
+
+
+def test_added_documents_are_searchable():
+    """Documents added to the delta segment rank alongside the base segment"""
+    corpus = _random_corpus()
+    index = SegmentedBM25.build(corpus)
+    index.add([["rareterm", "term1"]], np.array([300]))
+
+    rows, scores = index.top_k(["rareterm"], 5)
+    np.testing.assert_array_equal(rows, [300])
+    assert scores[0] > 0
+    assert index.is_dirty
+
+
+def test_delta_scores_use_global_statistics():
+    """Delta documents are scored with statistics over all live documents at add time"""
+    corpus = _random_corpus()
+    index = SegmentedBM25.build(corpus[:250])
+    index.delete(np.array([3, 7]), [corpus[3], corpus[7]])
+    index.add(corpus[250:], np.arange(250, 300))
+
+    live_rows = [row for row in range(300) if row not in (3, 7)]
+    live = [corpus[row] for row in live_rows]
+    expected = CollectionStats.from_index(InvertedBM25Index(live))
+    assert index.stats.num_docs == expected.num_docs
+    assert index.stats.total_len == expected.total_len
+
+    # A fresh index over the live documents scores the delta identically
+    fresh = InvertedBM25Index(live)
+    query = ["term2", "term30"]
+    rows, scores = index._segment_top_k(index.delta, query, 10)
+    fresh_scores = fresh.get_scores(query)
+    assert len(rows) > 0
+    np.testing.assert_allclose(scores, fresh_scores[[live_rows.index(row) for row in rows]], rtol=1e-5)
+
+
+def test_top_k_many_matches_top_k():
+    """Batched search over segments matches one query at a time"""
+    corpus = _random_corpus()
+    index = SegmentedBM25.build(corpus[:280])
+    index.add(corpus[280:], np.arange(280, 300))
+    index.delete(np.array([1, 290]), [corpus[1], corpus[290]])
+    queries = [["term0", "term4"], ["missing"], corpus[290][:2]]
+
+    for query, (rows, scores) in zip(queries, index.top_k_many(queries, 10)):
+        ref_rows, ref_scores = index.top_k(query, 10)
+        np.testing.assert_array_equal(rows, ref_rows)
+        np.testing.assert_allclose(scores, ref_scores)
+
+
+def test_allowed_mask_restricts_results():
+    """Only rows allowed by a filter mask are returned, including delta rows"""
+    corpus = _random_corpus()
+    index = SegmentedBM25.build(corpus[:250])
+    index.add(corpus[250:], np.arange(250, 300))
+    allowed = np.zeros(300, dtype=bool)
+    allowed[::4] = True
+
+    rows, _ = index.top_k(["term0", "term1"], 50, allowed=allowed)
+    assert len(rows) > 0
+    assert allowed[rows].all()
+    assert (rows >= 250).any()
+
+    for rows, _ in index.top_k_many([["term0"], ["term2", "term3"]], 50, allowed=allowed):
+        assert allowed[rows].all()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,125 @@
+"""
+Unit tests for retrieval shards
+"""
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from src.retrieval.analyzer import TokenArrays, Vocabulary
+from src.retrieval.bm25_index import CollectionStats, InvertedBM25Index
+from src.retrieval.segments import merge_top_k
+from src.retrieval.shard_server import ShardClient, ShardIndex, scatter, serve
+
+
+def _corpus(num_docs: int = 120, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    return [[f"t{i}" for i in rng.integers(0, 40, size=rng.integers(3, 20))] for _ in range(num_docs)]
+
+
+def _build_shards(corpus, bounds, vocab):
+    rng = np.random.default_rng(0)
+    tokens = TokenArrays.from_lists(corpus, vocab)
+    shards, local_stats = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        shard = ShardIndex(ann_config={"index_type": "flat"})
+        stats = shard.build(
+            documents=[" ".join(doc) for doc in corpus[start:end]],
+            doc_ids=[f"P{i}" for i in range(start, end)],
+            tokens=tokens.take(np.arange(start, end)),
+            embeddings=rng.normal(size=(end - start, 8)).astype('float32'),
+        )
+        shards.append(shard)
+        local_stats.append(stats)
+    return shards, local_stats
+
+
+def test_shards_score_against_global_statistics():
+    """Merged per-shard BM25 top-k equals the top-k of one index over the whole corpus"""
+    corpus = _corpus()
+    bounds = [0, 50, 90, 120]
+    vocab = Vocabulary()
+    shards, local_stats = _build_shards(corpus, bounds, vocab)
+    stats = CollectionStats.merge(local_stats)
+    for shard in shards:
+        shard.finalize(stats, vocab)
+
+    reference = InvertedBM25Index(corpus)
+    queries = [["t1", "t2"], ["t7"], ["t3", "t30", "t39"]]
+    embeddings = np.zeros((len(queries), 8), dtype='float32')
+    query_tokens = [vocab.ids(query) for query in queries]
+    responses = [shard.search(query_tokens, embeddings, k=10) for shard in shards]
+
+    for i, query in enumerate(queries):
+        merged = merge_top_k(
+            [(response[i]["sparse_rows"] + offset, response[i]["sparse_scores"])
+             for offset, response in zip(bounds, responses)],
+            10
+        )
+        ref_rows, ref_scores = reference.top_k(query, 10)
+        np.testing.assert_array_equal(merged[0], ref_rows)
+        np.testing.assert_allclose(merged[1], ref_scores, rtol=1e-5)
+
+
+def test_shard_server_round_trip():
+    """A shard served from another process builds and answers searches"""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    authkey = b"test-key"
+    process = context.Process(
+        target=serve, args=(("127.0.0.1", 0), authkey, {"index_type": "flat"}, sender), daemon=True
+    )
+    process.start()
+    client = ShardClient(receiver.recv(), authkey)
+    try:
+        corpus = _corpus(30)
+        vocab = Vocabulary()
+        stats = client.call(
+            "build",
+            documents=[" ".join(doc) for doc in corpus],
+            doc_ids=[f"P{i}" for i in range(30)],
+            tokens=TokenArrays.from_lists(corpus, vocab),
+            embeddings=np.eye(30, 8, dtype='float32'),
+        )
+        assert stats.num_docs == 30
+        scatter([client], "finalize", stats=stats, vocab=vocab)
+
+        (hits,), = scatter([client], "search", query_tokens=[vocab.ids(["t1"])], embeddings=np.eye(1, 8, dtype='float32'), k=5)
+        assert 0 in hits["dense_rows"]
+        assert hits["documents"][0][0] == "P0"
+
+        with pytest.raises(RuntimeError):
+            client.call("finalize", stats=stats, vocab=vocab)
+    finally:
+        client.call("shutdown")
+        process.join(timeout=10)
+        client.close()
+
+
+def test_sharded_indexes_reject_incremental_updates():
+    """Adding, updating or deleting documents of a sharded index fails with a clear error"""
+    import threading
+
+    from src.pipelines.rag_pipeline import RAGPipeline
+    from src.retrieval.sharded_retriever import ShardedRetriever
+
+    # No shard processes are needed: updates are refused before any shard is contacted
+    retriever = ShardedRetriever.__new__(ShardedRetriever)
+    retriever._write_lock = threading.RLock()
+    with pytest.raises(ValueError, match="not updated incrementally"):
+        retriever.add_documents(["Statins lower LDL."], ["P1"])
+    with pytest.raises(ValueError, match="not updated incrementally"):
+        retriever.update_documents(["Statins lower LDL."], ["P1"])
+
+    pipeline = RAGPipeline.__new__(RAGPipeline)
+    pipeline.retriever = retriever
+    with pytest.raises(ValueError, match="not updated incrementally"):
+        pipeline.add_documents(["Statins lower LDL."], ["P1"])
+    with pytest.raises(ValueError, match="not updated incrementally"):
+        pipeline.update_documents(["Statins lower LDL."], ["P1"])
+    with pytest.raises(ValueError, match="not updated incrementally"):
+        pipeline.delete_documents(["P1"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,113 @@
+"""
+Unit tests for retrieval snapshots
+"""
+import os
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+import pytest
+
+from src.retrieval.analyzer import Analyzer, Vocabulary
+from src.retrieval.document_store import DocumentStore
+from src.retrieval.metadata_index import MetadataIndex
+from src.retrieval.segments import SegmentedBM25
+from src.retrieval.snapshot import save_snapshot, load_snapshot, read_manifest, resolve_snapshot
+
+
+def _retriever(documents, doc_ids, directory):
+    """Minimal stand-in exposing the attributes snapshots read and write"""
+    embeddings = np.random.default_rng(0).normal(size=(len(documents), 8)).astype('float32')
+    faiss_index = faiss.IndexFlatL2(8)
+    faiss_index.add(embeddings)
+    analyzer, vocab = Analyzer(stem=True), Vocabulary()
+    tokens = analyzer.encode(documents, vocab)
+    return SimpleNamespace(
+        model_name="test-model",
+        sparse_backend="inverted",
+        analyzer=analyzer,
+        tokens=tokens,
+        bm25_index=SegmentedBM25.build(tokens, vocab=vocab),
+        faiss_index=faiss_index,
+        store=DocumentStore.from_documents(documents, doc_ids, directory=str(directory)),
+        num_deleted=0,
+        _deleted=np.zeros(len(documents), dtype=bool),
+        metadata=_metadata_index(len(documents)),
+    ), embeddings
+
+
+def _metadata_index(num_docs):
+    metadata = MetadataIndex()
+    metadata.add([{"publication_date": f"{2015 + i}-01-01", "journal": "BMJ"} for i in range(num_docs)])
+    return metadata
+
+
+def test_snapshot_round_trip(tmp_path):
+    """A loaded snapshot answers BM25 and dense queries like the original"""
+    documents = ["statins lower ldl cholesterol", "sepsis early warning score", "ldl and cardiovascular risk ü"]
+    retriever, embeddings = _retriever(documents, ["PMID1", "PMID2", "W3"], tmp_path)
+    manifest = save_snapshot(retriever, str(tmp_path / "snap"))
+
+    loaded = SimpleNamespace(model_name="test-model")
+    loaded_manifest = load_snapshot(loaded, str(tmp_path / "snap"))
+
+    assert loaded_manifest["version"] == manifest["version"]
+    assert list(loaded.store) == documents
+    assert list(loaded.store.doc_ids) == ["PMID1", "PMID2", "W3"]
+    assert loaded.store.row("W3") == 2
+    assert loaded.analyzer.config() == retriever.analyzer.config()
+    np.testing.assert_array_equal(loaded.tokens[2], retriever.tokens[2])
+
+    docs, scores = loaded.bm25_index.top_k(["ldl", "risk"], 2)
+    ref_docs, ref_scores = retriever.bm25_index.top_k(["ldl", "risk"], 2)
+    np.testing.assert_array_equal(docs, ref_docs)
+    np.testing.assert_allclose(scores, ref_scores)
+
+    _, indices = loaded.faiss_index.search(embeddings[:1], 1)
+    assert indices[0][0] == 0
+
+    np.testing.assert_array_equal(loaded.metadata.mask({"year_from": 2016}), [False, True, True])
+
+
+def test_snapshot_replaces_previous_version(tmp_path):
+    """Saving twice to the same path swaps in the new snapshot"""
+    retriever, _ = _retriever(["a b", "c d"], ["1", "2"], tmp_path / "work")
+    save_snapshot(retriever, str(tmp_path / "snap"), version="v1")
+    save_snapshot(retriever, str(tmp_path / "snap"), version="v2")
+
+    assert read_manifest(str(tmp_path / "snap"))["version"] == "v2"
+    first = resolve_snapshot(str(tmp_path / "snap"))
+    save_snapshot(retriever, str(tmp_path / "snap"), version="v3")
+
+    # The link flips to the new version; the previous one is kept for loaders that resolved it, older ones go
+    assert (tmp_path / "snap").is_symlink()
+    versions = sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("snap.v-"))
+    assert len(versions) == 2 and os.path.basename(first) in versions
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["snap", "work"] + versions)
+    assert read_manifest(str(tmp_path / "snap"))["version"] == "v3"
+
+
+def test_snapshot_replaces_plain_directory(tmp_path):
+    """A snapshot directory from before the link layout is moved aside and replaced by the link"""
+    retriever, _ = _retriever(["a b", "c d"], ["1", "2"], tmp_path / "work")
+    save_snapshot(retriever, str(tmp_path / "plain"), version="v1")
+    os.rename(resolve_snapshot(str(tmp_path / "plain")), tmp_path / "snap")
+    os.remove(tmp_path / "plain")
+
+    save_snapshot(retriever, str(tmp_path / "snap"), version="v2")
+    assert (tmp_path / "snap").is_symlink()
+    loaded, _ = _retriever(["x y"], ["9"], tmp_path / "other")
+    assert load_snapshot(loaded, str(tmp_path / "snap"))["version"] == "v2"
+
+
+def test_snapshot_from_another_encoder_is_rejected(tmp_path):
+    """Dense vectors from another model are not silently compared with this retriever's queries"""
+    retriever, _ = _retriever(["a b", "c d"], ["1", "2"], tmp_path / "work")
+    save_snapshot(retriever, str(tmp_path / "snap"))
+    loaded = SimpleNamespace(model_name="other-model")
+    with pytest.raises(ValueError, match="other-model"):
+        load_snapshot(loaded, str(tmp_path / "snap"))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,6 +1,8 @@
 """
 Unit tests for summarization module
 """
+import asyncio
+
 import pytest
 from src.summarizer.extractive_summarizer import ExtractiveSummarizer
 
@@ -22,3 +24,129 @@ async def test_extractive_summarizer():
     assert len(summary) > 0
     assert isinstance(summary, str)
 
+
+
+class WhitespaceTokenizer:
+    """Stand-in tokenizer with one token per word"""
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+def test_token_chunks_pack_sentences_within_the_window():
+    """Chunks keep whole sentences, fit the token budget and cover the text"""
+    from src.summarizer.abstractive_summarizer import token_chunks
+
+    text = "One two three. Four five six seven. Eight nine. " + " ".join(f"w{i}" for i in range(12)) + "."
+    chunks = token_chunks(text, WhitespaceTokenizer(), max_tokens=8)
+
+    assert chunks[0] == "One two three. Four five six seven."
+    assert all(len(chunk.split()) <= 8 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    assert token_chunks("   ", WhitespaceTokenizer(), max_tokens=8) == []
+
+
+class FirstWordsPipeline:
+    """Stand-in summarization pipeline: the first words of each input, recording every call"""
+
+    tokenizer = WhitespaceTokenizer()
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, max_length, **kwargs):
+        self.calls.append(list(texts))
+        return [{"summary_text": " ".join(word.strip(".") for word in text.split()[:3]) + "."} for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_batches_chunks_across_documents():
+    """All chunks go to one generation call, then long documents are reduced from their chunk summaries"""
+    from src.summarizer.abstractive_summarizer import AbstractiveSummarizer
+
+    summarizer = AbstractiveSummarizer.__new__(AbstractiveSummarizer)
+    summarizer.summarizer = FirstWordsPipeline()
+    summarizer.max_input_tokens = 12
+    summarizer.batch_size = 4
+
+    long_text = " ".join(f"Sentence {i} about statins." for i in range(6))
+    summaries = await summarizer.summarize_many([long_text, "Short note on sepsis.", ""])
+
+    calls = summarizer.summarizer.calls
+    assert len(calls[0]) == 4  # three chunks of the long text and the short one
+    assert calls[1] == ["Sentence 0 about. Sentence 2 about. Sentence 4 about."]
+    assert summaries == ["Sentence 0 about.", "Short note on.", ""]
+
+
+class WordStreamer:
+    """Stand-in for the queue streamer: generate() puts text pieces, end() closes the queue"""
+
+    def __init__(self, tokenizer, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, text):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+    def end(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+class EchoModel:
+    """Stand-in seq2seq model that 'generates' its input words one at a time"""
+
+    def __init__(self):
+        self.generated = 0
+
+    def generate(self, input_ids, streamer, stopping_criteria, **kwargs):
+        import time
+        for word in input_ids:
+            if stopping_criteria[0](None, None):
+                break
+            streamer.put(word + " ")
+            self.generated += 1
+            time.sleep(0.01)
+        streamer.end()
+
+
+class StreamTokenizer(WhitespaceTokenizer):
+    """WhitespaceTokenizer that also encodes a single text, as for generate()"""
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return super().__call__(texts)
+
+
+class EchoPipeline(FirstWordsPipeline):
+    tokenizer = StreamTokenizer()
+
+    def __init__(self):
+        super().__init__()
+        self.model = EchoModel()
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_pieces_and_stops_when_closed(monkeypatch):
+    """Pieces arrive as they are generated; closing the stream cancels generation"""
+    from src.summarizer import abstractive_summarizer
+    from src.summarizer.abstractive_summarizer import AbstractiveSummarizer
+
+    monkeypatch.setattr(abstractive_summarizer, "_QueueStreamer", WordStreamer)
+    summarizer = AbstractiveSummarizer.__new__(AbstractiveSummarizer)
+    summarizer.summarizer = EchoPipeline()
+    summarizer.max_input_tokens = 100
+    summarizer.batch_size = 4
+
+    pieces = [piece async for piece in summarizer.stream("Statins lower LDL in older adults.")]
+    assert "".join(pieces).split() == "Statins lower LDL in older adults.".split()
+
+    long_text = " ".join(f"w{i}" for i in range(80)) + "."
+    stream = summarizer.stream(long_text)
+    assert (await stream.__anext__()).strip() == "w0"
+    await stream.aclose()
+    await asyncio.sleep(0.1)
+    assert summarizer.summarizer.model.generated < 30
@@ -0,0 +1,70 @@
+"""
+Unit tests for the content-addressed summary cache
+"""
+import asyncio
+
+import pytest
+
+from src.summarizer.summary_cache import create_summary_cache, summarize_cached, summary_key
+
+CONFIG = {"max_length": 150, "min_length": 30, "cache_url": "", "cache_size": 100, "cache_local_size": 10}
+
+
+class CountingSummarizer:
+    """Abstractive summarizer stub that records the texts it was asked to summarize"""
+
+    def __init__(self, model_name="facebook/bart-large-cnn"):
+        self.model_name = model_name
+        self.calls = []
+
+    async def summarize_many(self, texts, max_length=150, min_length=30):
+        self.calls.append(list(texts))
+        return [text.split(".")[0] + "." for text in texts]
+
+
+def test_summary_key_depends_on_content_and_settings():
+    """A changed abstract, model or length gives a different key"""
+    settings = {"model": "facebook/bart-large-cnn", "max_length": 150, "min_length": 30}
+    key = summary_key("PMID1", "Statins lower LDL.", "abstractive", settings)
+
+    assert key == summary_key("PMID1", "Statins lower LDL.", "abstractive", dict(settings))
+    assert key != summary_key("PMID1", "Statins lower LDL cholesterol.", "abstractive", settings)
+    assert key != summary_key("PMID1", "Statins lower LDL.", "abstractive", {**settings, "max_length": 60})
+    assert key != summary_key("PMID1", "Statins lower LDL.", "abstractive", {**settings, "model": "t5-small"})
+
+
+def test_only_uncached_papers_are_summarized():
+    """Cached summaries are reused and misses go to the model in one batch"""
+    summarizer = CountingSummarizer()
+    cache = create_summary_cache(CONFIG)
+    papers = [("PMID1", "Statins lower LDL. More text."), ("PMID2", "Aspirin prevents clots. More text.")]
+
+    first, generated = asyncio.run(summarize_cached(summarizer, cache, papers[:1], config=CONFIG))
+    assert generated == 1 and first == ["Statins lower LDL."]
+
+    summaries, generated = asyncio.run(summarize_cached(summarizer, cache, papers, config=CONFIG))
+    assert generated == 1
+    assert summaries == ["Statins lower LDL.", "Aspirin prevents clots."]
+    assert summarizer.calls == [[papers[0][1]], [papers[1][1]]]
+
+    # Another model does not reuse the first model's summaries
+    _, generated = asyncio.run(summarize_cached(CountingSummarizer("t5-small"), cache, papers, config=CONFIG))
+    assert generated == 2
+
+
+def test_shared_store_persists_summaries(tmp_path):
+    """A new process on the same SQLite store finds summaries written earlier"""
+    config = {**CONFIG, "cache_url": f"sqlite:///{tmp_path}/summaries.db"}
+    papers = [("PMID1", "Statins lower LDL. More text.")]
+    asyncio.run(summarize_cached(CountingSummarizer(), create_summary_cache(config), papers, config=config))
+
+    summarizer = CountingSummarizer()
+    summaries, generated = asyncio.run(
+        summarize_cached(summarizer, create_summary_cache(config), papers, config=config)
+    )
+    assert generated == 0 and summarizer.calls == []
+    assert summaries == ["Statins lower LDL."]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,112 @@
+"""
+Unit tests for the vector database: batched search, id mapping and quantised storage
+"""
+import faiss
+import numpy as np
+import pytest
+
+from src.utils.ann_index import default_ann_config, rescore
+from src.utils.vector_db import VectorDB
+
+
+def _vectors(n, dimension=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dimension))
+    return (centers[rng.integers(0, 16, n)] + 0.3 * rng.normal(size=(n, dimension))).astype('float32')
+
+
+@pytest.mark.parametrize("quantizer", ["fp16", "int8", "pq"])
+def test_quantized_search_matches_exact_after_rescoring(quantizer):
+    """Re-scored results of a quantised index rank like the float32 index"""
+    config = dict(default_ann_config(), index_type="flat", quantizer=quantizer, pq_m=8, rescore_factor=40)
+    corpus, queries = _vectors(2000), _vectors(5, seed=1)
+    ids = [f"PMID{i}" for i in range(len(corpus))]
+    exact = VectorDB(dimension=32, ann_config=dict(config, quantizer="none"))
+    quantized = VectorDB(dimension=32, ann_config=config)
+    exact.add_documents(corpus, ids)
+    quantized.add_documents(corpus[:1000], ids[:1000])
+    quantized.add_documents(corpus[1000:], ids[1000:])
+
+    assert exact.vectors is None
+    for query in queries:
+        expected = exact.search(query[None], k=5)
+        results = quantized.search(query[None], k=5)
+        assert [r["doc_id"] for r in results] == [r["doc_id"] for r in expected]
+        np.testing.assert_allclose([r["distance"] for r in results], [r["distance"] for r in expected], rtol=1e-4)
+
+
+def test_quantized_save_and_load_keep_float_vectors(tmp_path):
+    """The float32 vectors and doc ids are saved next to the index and mapped on load"""
+    config = dict(default_ann_config(), index_type="flat", quantizer="int8")
+    corpus = _vectors(300)
+    db = VectorDB(dimension=32, ann_config=config)
+    db.add_documents(corpus, [str(i) for i in range(300)])
+    db.remove(["7"])
+    db.save(str(tmp_path / "index.bin"))
+
+    loaded = VectorDB(dimension=32, ann_config=config)
+    loaded.load(str(tmp_path / "index.bin"))
+    np.testing.assert_array_equal(loaded.vectors.array, corpus)
+    assert loaded.search(corpus[8:9], k=1)[0]["doc_id"] == "8"
+    assert loaded.reconstruct("7") is None
+    np.testing.assert_array_equal(loaded.reconstruct("9"), corpus[9])
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_search_batch_remove_and_reconstruct(index_type):
+    """Batched results map to doc ids, pad with None, and skip removed documents"""
+    config = dict(default_ann_config(), index_type=index_type, nlist=4, nprobe=4)
+    corpus = _vectors(400)
+    db = VectorDB(dimension=32, ann_config=config)
+    db.add_documents(corpus, [f"PMID{i}" for i in range(400)])
+
+    results = db.search_batch(corpus[:3], k=2)
+    assert results["doc_ids"].shape == (3, 2)
+    assert list(results["doc_ids"][:, 0]) == ["PMID0", "PMID1", "PMID2"]
+    np.testing.assert_allclose(results["scores"][:, 0], 1.0, rtol=1e-4)
+
+    assert db.remove(["PMID1", "missing"]) == 1
+    assert len(db) == 399
+    assert db.search_batch(corpus[1:2], k=1)["doc_ids"][0, 0] != "PMID1"
+    np.testing.assert_allclose(db.reconstruct("PMID5"), corpus[5], rtol=1e-5)
+
+    padded = VectorDB(dimension=32, ann_config=dict(config, index_type="flat"))
+    padded.add_documents(corpus[:2], ["a", "b"])
+    results = padded.search_batch(corpus[:1], k=3)
+    assert list(results["doc_ids"][0]) == ["a", "b", None]
+    assert results["ids"][0, 2] == -1 and results["scores"][0, 2] == 0
+
+
+def test_rescore_keeps_padding_last():
+    """Missing candidates (-1) never displace real ones"""
+    vectors = np.eye(4, dtype='float32')
+    distances, indices = rescore(vectors[:1], np.array([[-1, 3, 0]]), vectors, 3)
+    np.testing.assert_array_equal(indices, [[0, 3, -1]])
+    assert distances[0][0] == 0
+
+
+@pytest.mark.parametrize("quantizer", ["none", "fp16"])
+def test_search_empty_index_returns_nothing(quantizer):
+    """An empty database, quantised or not, has no results rather than failing"""
+    db = VectorDB(dimension=32, ann_config=dict(default_ann_config(), index_type="flat", quantizer=quantizer))
+    assert db.search(_vectors(1)[:1], k=5) == []
+
+    distances, indices = rescore(_vectors(2), np.full((2, 4), -1), np.empty((0, 32), dtype='float32'), 3)
+    np.testing.assert_array_equal(indices, np.full((2, 3), -1))
+    assert np.isinf(distances).all()
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_ivf_nlist_capped_by_first_batch(index_type):
+    """The default nlist (1024) is cut to what a small first batch can train"""
+    config = dict(default_ann_config(), index_type=index_type, nlist=1024, pq_m=8, nprobe=1024)
+    corpus = _vectors(800)
+    db = VectorDB(dimension=32, ann_config=config)
+    db.add_documents(corpus, [str(i) for i in range(800)])
+
+    assert faiss.extract_index_ivf(db.index).nlist == 800 // 39
+    assert db.search(corpus[3:4], k=1)[0]["doc_id"] == "3"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,375 @@
+"""
+Approximate nearest neighbour (ANN) index factory for dense retrieval
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from loguru import logger
+
+from src.utils.config import get_default_config
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+QUANTIZERS = ("none", "fp16", "int8", "pq")
+BINARY_INDEX_TYPES = ("none", "flat", "hnsw")
+
+# Scalar quantiser codes: 2 and 1 bytes per dimension instead of 4
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+# FAISS recommends at least ~39 training points per IVF centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def default_ann_config() -> Dict[str, Any]:
+    """ANN settings from the service config (env-driven defaults)"""
+    return get_default_config()["ann"]
+
+
+def create_ann_index(
+    dimension: int,
+    index_type: str = "flat",
+    num_vectors: Optional[int] = None,
+    nlist: int = 1024,
+    pq_m: int = 16,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    quantizer: str = "none",
+    **_
+) -> faiss.Index:
+    """
+    Create an empty (untrained) L2 index of the given type.
+
+    quantizer sets how the vectors are stored: "none" (float32), "fp16" or
+    "int8" scalar quantisation, or "pq" product quantisation with pq_m
+    sub-vectors of pq_nbits each. ivf_pq always stores PQ codes.
+
+    num_vectors, when known, caps nlist so IVF training stays well conditioned
+    on small corpora. Extra keyword arguments (search-time settings from the
+    same config block) are ignored.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown ANN index type: {index_type}. Use one of {INDEX_TYPES}")
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer: {quantizer}. Use one of {QUANTIZERS}")
+    if index_type == "ivf_pq":
+        quantizer = "pq"
+    if quantizer == "pq" and dimension % pq_m != 0:
+        raise ValueError(f"Dimension {dimension} is not divisible by pq_m={pq_m}")
+
+    if index_type == "flat":
+        if quantizer == "pq":
+            return faiss.IndexPQ(dimension, pq_m, pq_nbits)
+        if quantizer in _SQ_TYPES:
+            return faiss.IndexScalarQuantizer(dimension, _SQ_TYPES[quantizer])
+        return faiss.IndexFlatL2(dimension)
+
+    if index_type == "hnsw":
+        if quantizer == "pq":
+            index = faiss.IndexHNSWPQ(dimension, pq_m, hnsw_m, pq_nbits)
+        elif quantizer in _SQ_TYPES:
+            index = faiss.IndexHNSWSQ(dimension, _SQ_TYPES[quantizer], hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    if num_vectors is not None:
+        nlist = max(1, min(nlist, num_vectors // _MIN_POINTS_PER_CENTROID))
+    coarse = faiss.IndexFlatL2(dimension)
+
+    if quantizer == "pq":
+        return faiss.IndexIVFPQ(coarse, dimension, nlist, pq_m, pq_nbits)
+    if quantizer in _SQ_TYPES:
+        return faiss.IndexIVFScalarQuantizer(coarse, dimension, nlist, _SQ_TYPES[quantizer])
+    return faiss.IndexIVFFlat(coarse, dimension, nlist)
+
+
+def is_quantized(config: Dict[str, Any]) -> bool:
+    """Whether an index built from this ANN config stores lossy codes rather than float32 vectors"""
+    return config.get("index_type") == "ivf_pq" or config.get("quantizer", "none") != "none"
+
+
+def train_ann_index(
+    index: faiss.Index,
+    embeddings: np.ndarray,
+    train_sample_size: int = 100000,
+    seed: int = 0
+):
+    """Train the index on a random sample of the embeddings (no-op for Flat/HNSW)"""
+    if index.is_trained:
+        return
+
+    sample = embeddings
+    if len(embeddings) > train_sample_size:
+        rng = np.random.default_rng(seed)
+        sample = embeddings[rng.choice(len(embeddings), train_sample_size, replace=False)]
+
+    index.train(np.ascontiguousarray(sample, dtype='float32'))
+    logger.info(f"Trained {type(index).__name__} on {len(sample)} vectors")
+
+
+def build_ann_index(
+    embeddings: np.ndarray,
+    config: Optional[Dict[str, Any]] = None,
+    ids: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """
+    Create, train and fill an index from embeddings according to the ANN config.
+    With ids, vectors keep stable ids that survive removals: IVF indexes store
+    them in their inverted lists, other indexes are wrapped in IndexIDMap2.
+    """
+    config = dict(config or default_ann_config())
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    index_type = config.pop("index_type", "flat")
+
+    if (index_type == "ivf_pq" or config.get("quantizer") == "pq") and len(embeddings) < 2 ** config.get("pq_nbits", 8):
+        logger.warning(f"Too few vectors ({len(embeddings)}) to train PQ codes, using a flat index")
+        index_type = "flat"
+        config["quantizer"] = "none"
+
+    index = create_ann_index(
+        embeddings.shape[1],
+        index_type=index_type,
+        num_vectors=len(embeddings),
+        **config
+    )
+    train_ann_index(index, embeddings, config.get("train_sample_size", 100000))
+    if ids is not None:
+        index = with_id_map(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(embeddings)
+    configure_search_defaults(index, nprobe=config.get("nprobe"), ef_search=config.get("ef_search"))
+    logger.info(f"Built {index_type} index with {index.ntotal} vectors")
+    return index
+
+
+def with_id_map(index: faiss.Index) -> faiss.Index:
+    """Index accepting add_with_ids: IVF indexes keep ids in their lists, others are wrapped in IndexIDMap2"""
+    return index if _ivf(index) is not None else faiss.IndexIDMap2(index)
+
+
+def reconstruct(index: faiss.Index, vector_id: int) -> np.ndarray:
+    """Stored (decoded) vector of an id, for indexes built with ids"""
+    ivf = _ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        # IVF lists are not addressable by id until a direct map is built
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index.reconstruct(int(vector_id))
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """
+    Per-call search parameters for the index, or None to use the index defaults.
+    selector restricts the search to the ids it accepts.
+    """
+    ivf = _ivf(index)
+    hnsw = _hnsw(index)
+    if ivf is not None and (nprobe is not None or selector is not None):
+        # SearchParametersIVF defaults to nprobe=1, so fall back to the index setting
+        params = faiss.SearchParametersIVF(nprobe=nprobe if nprobe is not None else ivf.nprobe)
+    elif hnsw is not None and (ef_search is not None or selector is not None):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search if ef_search is not None else hnsw.hnsw.efSearch)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def live_id_selector(live: np.ndarray) -> Tuple[faiss.IDSelector, np.ndarray]:
+    """
+    Selector accepting the ids whose entry in the boolean mask is True.
+    Returns the packed bitmap too: the caller must keep it alive while the
+    selector is in use, as FAISS only holds a pointer to it.
+    """
+    bitmap = np.packbits(live, bitorder="little")
+    # n is the bitmap size in bytes; ids past the end are rejected
+    return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap
+
+
+def ann_search(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selector: Optional[faiss.IDSelector] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search with optional per-request nprobe / efSearch and id selector.
+
+    Parameters are passed per call rather than set on the shared index, so
+    concurrent requests with different settings do not interfere.
+    """
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+    if params is None:
+        return index.search(queries, k)
+    return index.search(queries, k, params=params)
+
+
+def rescore(
+    queries: np.ndarray,
+    indices: np.ndarray,
+    vectors: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-rank candidate ids from a quantised search by their exact L2 distance
+    and keep the best k per query.
+
+    vectors holds the float32 vectors by id and is typically memory-mapped
+    from disk: only the candidate rows are read, in id order. Like FAISS,
+    missing results are padded with id -1.
+    """
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    valid = indices >= 0
+    if len(vectors) == 0 or not valid.any():
+        return np.full((len(queries), k), np.inf, dtype='float32'), np.full((len(queries), k), -1, dtype=np.int64)
+    unique, inverse = np.unique(np.where(valid, indices, 0), return_inverse=True)
+    candidates = np.asarray(vectors[unique], dtype='float32')[inverse.reshape(indices.shape)]
+    diff = candidates - queries[:, None, :]
+    distances = np.einsum("qcd,qcd->qc", diff, diff)
+    distances[~valid] = np.inf
+
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    distances = np.take_along_axis(distances, order, axis=1)
+    indices = np.where(np.isfinite(distances), np.take_along_axis(indices, order, axis=1), -1)
+    return distances, indices
+
+
+def binarize(embeddings: np.ndarray) -> np.ndarray:
+    """Sign bit of every dimension, packed 8 per byte (the codes of a FAISS binary index)"""
+    return np.packbits(np.asarray(embeddings) > 0, axis=1)
+
+
+def build_binary_index(
+    embeddings: np.ndarray,
+    ids: np.ndarray,
+    index_type: str = "flat",
+    hnsw_m: int = 32
+) -> faiss.IndexBinary:
+    """
+    Hamming-distance index over sign-binarised embeddings, with stable ids.
+    At 384 dimensions a code is 48 bytes, 1/32 of the float32 vector.
+    """
+    dimension = embeddings.shape[1]
+    if dimension % 8 != 0:
+        raise ValueError(f"Binary codes need a dimension divisible by 8, got {dimension}")
+    index = _create_binary_index(dimension, index_type, hnsw_m)
+    if len(embeddings):
+        index.add_with_ids(binarize(embeddings), np.asarray(ids, dtype=np.int64))
+    logger.info(f"Built binary {index_type} index with {index.ntotal} codes")
+    return index
+
+
+def binary_index_type(index: faiss.IndexBinary) -> str:
+    """"flat" or "hnsw" for an index made by build_binary_index"""
+    return "hnsw" if hasattr(faiss.downcast_IndexBinary(index.index), "hnsw") else "flat"
+
+
+def binary_without_ids(index: faiss.IndexBinary, ids: np.ndarray, hnsw_m: int = 32) -> faiss.IndexBinary:
+    """
+    Copy of a binary index minus the given ids, rebuilt from its stored codes
+    (binary id maps can be neither cloned nor, for HNSW, edited in place)
+    """
+    kept_ids = faiss.vector_to_array(index.id_map)
+    codes = index.index.reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(kept_ids, np.asarray(ids, dtype=np.int64))
+    copy = _create_binary_index(index.d, binary_index_type(index), hnsw_m)
+    copy.add_with_ids(codes[keep], kept_ids[keep])
+    return copy
+
+
+def binary_search(
+    binary_index: faiss.IndexBinary,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    candidates: int = 1000,
+    allowed: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Two-stage dense search: the `candidates` nearest codes by Hamming
+    distance, re-scored by exact L2 distance from the float32 vectors.
+
+    allowed is an optional boolean mask over ids; candidates outside it are
+    dropped before re-scoring, so a selective filter can leave fewer than k.
+    """
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    _, pool = binary_index.search(binarize(queries), max(k, candidates))
+    if allowed is not None:
+        in_mask = (pool >= 0) & (pool < len(allowed))
+        keep = np.zeros(pool.shape, dtype=bool)
+        keep[in_mask] = allowed[pool[in_mask]]
+        pool = np.where(keep, pool, -1)
+    return rescore(queries, pool, vectors, k)
+
+
+def dense_hits(distances: np.ndarray, indices: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Per-query (ids, similarities) from a FAISS search, dropping the -1 padding"""
+    hits = []
+    for row_distances, row_indices in zip(distances, indices):
+        # FAISS pads with -1 when fewer than k vectors match
+        valid = row_indices >= 0
+        hits.append((row_indices[valid], 1 / (1 + row_distances[valid])))  # Convert distance to similarity
+    return hits
+
+
+def without_ids(index: faiss.Index, ids: np.ndarray, config: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """
+    Copy of an index built with ids, minus the given ids. The original is left
+    untouched so it can keep serving searches while the copy is made.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if _hnsw(index) is None:
+        index = faiss.clone_index(index)
+        index.remove_ids(ids)
+        return index
+
+    # HNSW graphs do not support removal: rebuild from the stored vectors
+    kept_ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(kept_ids, ids)
+    return build_ann_index(vectors[keep], config, ids=kept_ids[keep])
+
+
+def configure_search_defaults(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Set the index-wide default nprobe / efSearch used when a request gives none"""
+    ivf = _ivf(index)
+    if ivf is not None and nprobe is not None:
+        ivf.nprobe = nprobe
+    hnsw = _hnsw(index)
+    if hnsw is not None and ef_search is not None:
+        hnsw.hnsw.efSearch = ef_search
+
+
+def _create_binary_index(dimension: int, index_type: str, hnsw_m: int) -> faiss.IndexBinary:
+    if index_type not in BINARY_INDEX_TYPES[1:]:
+        raise ValueError(f"Unknown binary index type: {index_type}. Use one of {BINARY_INDEX_TYPES[1:]}")
+    if index_type == "hnsw":
+        return faiss.IndexBinaryIDMap2(faiss.IndexBinaryHNSW(dimension, hnsw_m))
+    return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dimension))
+
+
+def _ivf(index: faiss.Index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _hnsw(index: faiss.Index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index if hasattr(index, "hnsw") else None
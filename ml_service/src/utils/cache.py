@@ -0,0 +1,283 @@
+"""
+Bounded caches: in-process LRU, plus SQLite and Redis backends shared between workers
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from loguru import logger
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with an optional time-to-live.
+
+    Entries older than ttl_seconds are treated as missing and dropped on
+    access; max_size bounds memory by evicting the least recently used entry.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring; hit_rate is over all lookups so far"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - entry[1] > self.ttl_seconds
+
+
+class SQLiteCache:
+    """
+    String cache in a SQLite file, shared by every process on the host.
+
+    Same interface as LRUCache for str keys and values. Eviction is by least
+    recent use, checked every `max_size // 10` writes to keep puts cheap.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_used_at ON cache (used_at)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+            with conn:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return default
+        with conn:
+            conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, value: str):
+        if self.max_size <= 0:
+            return
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, value, now, now))
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % max(1, self.max_size // 10) == 0
+        if evict:
+            self._evict(conn)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process; size is shared"""
+        size = self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "size": size,
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return self.stats()["size"]
+
+    def _evict(self, conn: sqlite3.Connection):
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+        with self._lock:
+            self.evictions += cursor.rowcount
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class RedisCache:
+    """
+    String cache in Redis, shared by every worker and host.
+
+    Expiry uses Redis TTLs; size is bounded by the server's maxmemory policy
+    (allkeys-lru), so max_size is informational only.
+    """
+
+    def __init__(self, url: str, max_size: int = 10000, ttl_seconds: Optional[float] = None, prefix: str = "ml:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The redis package is required for a redis:// cache: pip install redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.client.get(self.prefix + key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return default if value is None else value.decode("utf-8")
+
+    def put(self, key: str, value: str):
+        # Milliseconds, so TTLs under a second do not truncate to an invalid 0
+        ttl = max(1, int(self.ttl_seconds * 1000)) if self.ttl_seconds else None
+        self.client.set(self.prefix + key, value, px=ttl)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "redis",
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class TieredCache:
+    """
+    In-process LRUCache in front of a shared cache (SQLite or Redis): hits
+    in the shared tier are copied to the local one, puts go to both
+    """
+
+    def __init__(self, local: LRUCache, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is None:
+                return default
+            self.local.put(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        self.local.put(key, value)
+        self.shared.put(key, value)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "tiered", "local": self.local.stats(), "shared": self.shared.stats()}
+
+
+def create_cache(url: str = "", max_size: int = 1024, ttl_seconds: Optional[float] = None):
+    """
+    Cache for the given backend URL:
+        ""                       in-process LRUCache (per worker)
+        "sqlite:///path/to.db"   SQLiteCache shared by workers on one host
+        "redis://host:6379/0"    RedisCache shared by all workers
+    """
+    if not url or url == "memory":
+        return LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    if url.startswith("sqlite:///"):
+        cache = SQLiteCache(url[len("sqlite:///"):], max_size=max_size, ttl_seconds=ttl_seconds)
+    elif url.startswith(("redis://", "rediss://")):
+        cache = RedisCache(url, max_size=max_size, ttl_seconds=ttl_seconds)
+    else:
+        raise ValueError(f"Unsupported cache URL: {url}")
+    logger.info(f"Using shared {type(cache).__name__} at {url.split('@')[-1]}")
+    return cache
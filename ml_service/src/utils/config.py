@@ -29,15 +29,93 @@ def get_default_config() -> Dict[str, Any]:
             "retriever": os.getenv("RETRIEVER_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
             "reranker": os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
             "summarizer": os.getenv("SUMMARIZER_MODEL", "facebook/bart-large-cnn"),
-            "nli": os.getenv("NLI_MODEL", "microsoft/deberta-v3-base")
+            "nli": os.getenv("NLI_MODEL", "cross-encoder/nli-deberta-v3-base")  # MNLI-trained
         },
         "retrieval": {
             "hybrid_alpha": float(os.getenv("HYBRID_ALPHA", "0.5")),
+            "sparse_backend": os.getenv("BM25_BACKEND", "inverted"),
+            "fusion_method": os.getenv("FUSION_METHOD", "weighted"),
+            "rrf_k": int(os.getenv("RRF_K", "60")),
+            "snapshot_path": os.getenv("RETRIEVAL_SNAPSHOT_PATH", ""),
+            "query_cache_size": int(os.getenv("QUERY_CACHE_SIZE", "4096")),
+            "query_cache_ttl": float(os.getenv("QUERY_CACHE_TTL", "3600")),  # seconds, 0 = no expiry
+            "result_cache_url": os.getenv("RESULT_CACHE_URL", ""),  # "", sqlite:///path or redis://host:port/db
+            "result_cache_size": int(os.getenv("RESULT_CACHE_SIZE", "2048")),
+            "result_cache_ttl": float(os.getenv("RESULT_CACHE_TTL", "600")),
+            "num_shards": int(os.getenv("RETRIEVAL_SHARDS", "1")),  # > 1 spawns local shard processes
+            "shard_addresses": os.getenv("RETRIEVAL_SHARD_ADDRESSES", ""),  # host:port,... of running shard servers
+            "document_store_dir": os.getenv("DOCUMENT_STORE_DIR", ""),  # working files of the document store ("" = temp dir)
+            "document_store_compress": os.getenv("DOCUMENT_STORE_COMPRESS", "false").lower() == "true",
+            "bm25_stemming": os.getenv("BM25_STEMMING", "false").lower() == "true",  # fold plurals (S-stemmer)
             "default_limit": int(os.getenv("DEFAULT_LIMIT", "10"))
         },
+        "reranker": {
+            "max_length": int(os.getenv("RERANKER_MAX_LENGTH", "512")),  # tokens per (query, document) pair
+            "batch_size": int(os.getenv("RERANKER_BATCH_SIZE", "32")),
+            "cache_size": int(os.getenv("RERANKER_CACHE_SIZE", "8192")),  # cached (query, doc id) scores
+            "cascade_model": os.getenv("RERANKER_CASCADE_MODEL", ""),  # smaller cross-encoder run first ("" = off)
+            "cascade_head": float(os.getenv("RERANKER_CASCADE_HEAD", "1.5")),  # x limit passed to the full reranker
+            "exit_margin": float(os.getenv("RERANKER_EXIT_MARGIN", "0")),  # decisive top-k margin (0 = off)
+            "latency_budget_ms": float(os.getenv("RERANKER_LATENCY_BUDGET_MS", "0"))  # per request (0 = none)
+        },
+        "passages": {
+            "enabled": os.getenv("PASSAGE_INDEX", "false").lower() == "true",  # dense search over passages
+            "words": int(os.getenv("PASSAGE_WORDS", "150")),  # fits MiniLM's 256-token window
+            "overlap": int(os.getenv("PASSAGE_OVERLAP", "30")),
+            "aggregation": os.getenv("PASSAGE_AGGREGATION", "max"),  # max or sum_top
+            "top": int(os.getenv("PASSAGE_TOP", "2"))  # passages summed by sum_top and returned as snippets
+        },
+        "ann": {
+            "index_type": os.getenv("ANN_INDEX_TYPE", "flat"),  # flat, ivf_flat, ivf_pq, hnsw
+            "nlist": int(os.getenv("ANN_NLIST", "1024")),
+            "pq_m": int(os.getenv("ANN_PQ_M", "16")),
+            "pq_nbits": int(os.getenv("ANN_PQ_NBITS", "8")),
+            "hnsw_m": int(os.getenv("ANN_HNSW_M", "32")),
+            "ef_construction": int(os.getenv("ANN_EF_CONSTRUCTION", "200")),
+            "nprobe": int(os.getenv("ANN_NPROBE", "16")),
+            "ef_search": int(os.getenv("ANN_EF_SEARCH", "64")),
+            "quantizer": os.getenv("ANN_QUANTIZER", "none"),  # none, fp16, int8, pq
+            "rescore_factor": int(os.getenv("ANN_RESCORE_FACTOR", "4")),  # candidates re-scored per result
+            "binary_index": os.getenv("ANN_BINARY_INDEX", "none"),  # none, flat, hnsw sign-bit codes
+            "binary_prefilter": os.getenv("ANN_BINARY_PREFILTER", "false").lower() == "true",  # default search mode
+            "binary_candidates": int(os.getenv("ANN_BINARY_CANDIDATES", "1000")),  # Hamming pool re-scored exactly
+            "train_sample_size": int(os.getenv("ANN_TRAIN_SAMPLE_SIZE", "100000"))
+        },
+        "inference": {
+            # Backend per model: torch, onnx or onnx_int8 (ONNX Runtime, dynamic int8 weights)
+            "retriever": os.getenv("RETRIEVER_BACKEND", "torch"),
+            "reranker": os.getenv("RERANKER_BACKEND", "torch"),
+            "summarizer": os.getenv("SUMMARIZER_BACKEND", "torch"),
+            "nli": os.getenv("NLI_BACKEND", "torch"),
+            "onnx_cache_dir": os.getenv("ONNX_CACHE_DIR", "models/onnx"),  # exported models
+            "intra_op_threads": int(os.getenv("ORT_INTRA_OP_THREADS", "0")),  # 0 = one per core
+            "inter_op_threads": int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+        },
+        "nli": {
+            "premise_sentences": int(os.getenv("NLI_PREMISE_SENTENCES", "3")),  # context sentences scored per claim, 0 = whole context
+            "batch_size": int(os.getenv("NLI_BATCH_SIZE", "16")),
+            "max_length": int(os.getenv("NLI_MAX_LENGTH", "512")),  # tokens per (premise, claim) pair
+            "neutral_below": float(os.getenv("NLI_NEUTRAL_BELOW", "0.5"))  # weaker verdicts are neutral
+        },
+        "executor": {
+            # Worker threads per model family: model calls run off the event loop, at most this many at once
+            "retrieval_workers": int(os.getenv("RETRIEVAL_WORKERS", "2")),
+            "reranker_workers": int(os.getenv("RERANKER_WORKERS", "1")),
+            "summarizer_workers": int(os.getenv("SUMMARIZER_WORKERS", "1")),  # abstractive generation
+            "extractive_workers": int(os.getenv("EXTRACTIVE_WORKERS", "2")),  # never queued behind generation
+            "nli_workers": int(os.getenv("NLI_WORKERS", "1")),
+            "torch_threads": int(os.getenv("TORCH_THREADS", "0")),  # intra-op threads per torch call, 0 = default
+            "wait_window": int(os.getenv("EXECUTOR_WAIT_WINDOW", "1000"))  # recent calls in the wait-time percentiles
+        },
         "summarization": {
             "max_length": int(os.getenv("SUMMARY_MAX_LENGTH", "150")),
-            "min_length": int(os.getenv("SUMMARY_MIN_LENGTH", "30"))
+            "min_length": int(os.getenv("SUMMARY_MIN_LENGTH", "30")),
+            "batch_size": int(os.getenv("SUMMARY_BATCH_SIZE", "8")),  # chunks per generation batch
+            "extractive_method": os.getenv("SUMMARY_EXTRACTIVE_METHOD", "lexrank"),  # lexrank, lsa, centrality or mmr
+            "sentences_count": int(os.getenv("SUMMARY_SENTENCES", "5")),  # sentences in extractive summaries
+            "cache_url": os.getenv("SUMMARY_CACHE_URL", "sqlite:///data/cache/summaries.db"),  # "" = in-process only
+            "cache_size": int(os.getenv("SUMMARY_CACHE_SIZE", "100000")),  # summaries kept in the shared store
+            "cache_local_size": int(os.getenv("SUMMARY_CACHE_LOCAL_SIZE", "1024"))  # in-process LRU tier
         },
         "server": {
             "host": os.getenv("HOST", "0.0.0.0"),
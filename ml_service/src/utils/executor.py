@@ -0,0 +1,142 @@
+"""
+Bounded thread pools for blocking model inference, one per model family
+
+Route handlers are async; model calls (embedding, FAISS/BM25 search,
+cross-encoder scoring, generation) are CPU-bound and would block the event
+loop, stalling every other request on the worker. run_inference() runs them
+on the family's pool instead, so the loop stays free and the number of
+concurrent calls per model is explicit (config["executor"]). Threads rather
+than processes: models are loaded once and shared, and PyTorch, ONNX Runtime,
+FAISS and NumPy release the GIL in their kernels.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+from src.utils.config import get_default_config
+
+FAMILIES = ("retrieval", "reranker", "summarizer", "extractive", "nli")
+
+
+def configure_torch_threads(threads: int):
+    """Intra-op threads of each torch call; with several pools, cores are shared between them"""
+    if threads <= 0:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    logger.info(f"torch uses {threads} threads per call")
+
+
+class _Pool:
+    def __init__(self, family: str, workers: int, window: int):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"inference-{family}")
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.waits = deque(maxlen=window)  # seconds from submission to start
+        self.runs = deque(maxlen=window)  # seconds of each call
+
+
+class InferenceExecutor:
+    """Thread pool per model family, with queue depth and wait-time counters"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or get_default_config()["executor"]
+        configure_torch_threads(config["torch_threads"])
+        self.pools = {
+            family: _Pool(family, max(1, config[f"{family}_workers"]), config["wait_window"])
+            for family in FAMILIES
+        }
+        logger.info(
+            "Inference pools: " + ", ".join(f"{family}={pool.workers}" for family, pool in self.pools.items())
+        )
+
+    async def run(self, family: str, fn: Callable, *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs) run on the family's pool"""
+        pool = self.pools.get(family)
+        if pool is None:
+            raise ValueError(f"Unknown model family: {family}. Use one of {FAMILIES}")
+        submitted = time.perf_counter()
+        with pool.lock:
+            pool.queued += 1
+
+        def call():
+            started = time.perf_counter()
+            with pool.lock:
+                pool.queued -= 1
+                pool.running += 1
+                pool.waits.append(started - submitted)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                with pool.lock:
+                    pool.failed += 1
+                raise
+            finally:
+                with pool.lock:
+                    pool.running -= 1
+                    pool.completed += 1
+                    pool.runs.append(time.perf_counter() - started)
+
+        return await asyncio.get_running_loop().run_in_executor(pool.executor, call)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per family: workers, calls waiting and running, and wait/run times (ms) over recent calls"""
+        stats = {}
+        for family, pool in self.pools.items():
+            with pool.lock:
+                waits, runs = 1000 * np.array(pool.waits), 1000 * np.array(pool.runs)
+                stats[family] = {
+                    "workers": pool.workers,
+                    "queued": pool.queued,
+                    "running": pool.running,
+                    "completed": pool.completed,
+                    "failed": pool.failed,
+                    "wait_ms_p50": float(np.percentile(waits, 50)) if len(waits) else 0.0,
+                    "wait_ms_p99": float(np.percentile(waits, 99)) if len(waits) else 0.0,
+                    "run_ms_p50": float(np.percentile(runs, 50)) if len(runs) else 0.0,
+                    "run_ms_p99": float(np.percentile(runs, 99)) if len(runs) else 0.0,
+                }
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        for pool in self.pools.values():
+            pool.executor.shutdown(wait=wait)
+
+
+_executor: Optional[InferenceExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> InferenceExecutor:
+    """The process-wide executor, created from config on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = InferenceExecutor()
+        return _executor
+
+
+async def run_inference(family: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking model call on the family's pool of the process-wide executor"""
+    return await get_executor().run(family, fn, *args, **kwargs)
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,267 @@
+"""
+Inference backends for the transformer models: PyTorch eager, or ONNX Runtime
+with an optional dynamic int8 quantised export (CPU serving)
+
+Backends, selected per model in config["inference"]:
+    torch       sentence-transformers / transformers as usual
+    onnx        model exported to ONNX once (cached under ONNX_CACHE_DIR), run by ONNX Runtime
+    onnx_int8   same export with weights quantised to int8 (dynamic quantisation)
+
+The ONNX backends need `pip install optimum[onnxruntime]`.
+"""
+import json
+import os
+import platform
+import shutil
+from glob import glob
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from src.utils.config import get_default_config
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+
+
+def inference_config() -> Dict[str, Any]:
+    return get_default_config()["inference"]
+
+
+def _check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}. Use one of {BACKENDS}")
+
+
+def _import_optimum():
+    try:
+        from optimum import onnxruntime as ort_models
+    except ImportError as e:
+        raise ImportError(
+            "The onnx inference backends need optimum and onnxruntime: pip install optimum[onnxruntime]"
+        ) from e
+    return ort_models
+
+
+def session_options(config: Optional[Dict] = None):
+    """ONNX Runtime session options with the configured thread pools"""
+    import onnxruntime
+
+    config = config or inference_config()
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # One request at a time per session: parallelism comes from intra-op threads
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    if config.get("intra_op_threads"):
+        options.intra_op_num_threads = config["intra_op_threads"]
+    if config.get("inter_op_threads"):
+        options.inter_op_num_threads = config["inter_op_threads"]
+    return options
+
+
+def _quantization_config():
+    """Dynamic int8 quantisation tuned for the instruction set of this CPU"""
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    if "avx512_vnni" in flags:
+        return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def export_onnx(model_name: str, model_class: str, backend: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Directory of the ONNX export of a model (exported and, for onnx_int8,
+    quantised on first use). model_class is an optimum ORTModel class name.
+    """
+    _check_backend(backend)
+    ort_models = _import_optimum()
+    cache_dir = cache_dir or inference_config()["onnx_cache_dir"]
+    name = model_name.strip("/").replace("/", "--")
+    export_dir = os.path.join(cache_dir, name)
+    if not glob(os.path.join(export_dir, "*.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+        model = getattr(ort_models, model_class).from_pretrained(model_name, export=True)
+        model.save_pretrained(export_dir)
+        _copy_tokenizer(model_name, export_dir)
+    if backend == "onnx":
+        return export_dir
+
+    quantized_dir = f"{export_dir}-int8"
+    if not glob(os.path.join(quantized_dir, "*.onnx")):
+        logger.info(f"Quantising {model_name} to int8 in {quantized_dir}")
+        config = _quantization_config()
+        for onnx_file in sorted(glob(os.path.join(export_dir, "*.onnx"))):
+            quantizer = ort_models.ORTQuantizer.from_pretrained(export_dir, file_name=os.path.basename(onnx_file))
+            # Same file names as the float export, so both directories load alike
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=config, file_suffix="")
+        shutil.copytree(export_dir, quantized_dir, ignore=shutil.ignore_patterns("*.onnx"), dirs_exist_ok=True)
+    return quantized_dir
+
+
+def _copy_tokenizer(model_name: str, directory: str):
+    from transformers import AutoTokenizer
+
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(directory)
+    # sentence-transformers settings (pooling, normalisation, max length) travel with the export
+    for filename in ("modules.json", "sentence_bert_config.json", "1_Pooling/config.json"):
+        path = _hub_file(model_name, filename)
+        if path:
+            os.makedirs(os.path.dirname(os.path.join(directory, filename)), exist_ok=True)
+            shutil.copy(path, os.path.join(directory, filename))
+
+
+def _hub_file(model_name: str, filename: str) -> Optional[str]:
+    """Local path of a file of a local or Hub model, or None when it has no such file"""
+    if os.path.isdir(model_name):
+        path = os.path.join(model_name, filename)
+        return path if os.path.exists(path) else None
+    try:
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, filename)
+    except Exception:
+        return None
+
+
+def load_ort_model(model_name: str, model_class: str, backend: str, config: Optional[Dict] = None):
+    """ORTModel of the given class over the (cached) export, plus its directory"""
+    config = config or inference_config()
+    directory = export_onnx(model_name, model_class, backend, config["onnx_cache_dir"])
+    model = getattr(_import_optimum(), model_class).from_pretrained(
+        directory, session_options=session_options(config), provider="CPUExecutionProvider"
+    )
+    return model, directory
+
+
+class OnnxSentenceEncoder:
+    """
+    SentenceTransformer-compatible encoder on ONNX Runtime: transformer
+    outputs pooled (mean or CLS) and optionally L2-normalised as the
+    sentence-transformers model is configured.
+    """
+
+    def __init__(self, model_name: str, backend: str = "onnx_int8", config: Optional[Dict] = None):
+        from transformers import AutoTokenizer
+
+        self.model, directory = load_ort_model(model_name, "ORTModelForFeatureExtraction", backend, config)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        modules = _read_json(os.path.join(directory, "modules.json")) or []
+        self.normalize = any(module.get("type", "").endswith("Normalize") for module in modules)
+        pooling = _read_json(os.path.join(directory, "1_Pooling", "config.json")) or {}
+        self.pooling = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+        settings = _read_json(os.path.join(directory, "sentence_bert_config.json")) or {}
+        self.max_seq_length = settings.get("max_seq_length", min(self.tokenizer.model_max_length, 512))
+        logger.info(f"Loaded ONNX sentence encoder {model_name} ({backend}, {self.pooling} pooling)")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.config.hidden_size
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(sentences), self.get_sentence_embedding_dimension()), dtype='float32')
+        # Length-sorted batches are padded to similar lengths
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [sentences[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = inputs["attention_mask"][..., None].astype('float32')
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            embeddings[batch] = pooled
+        if self.normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+
+class OnnxCrossEncoder:
+    """CrossEncoder-compatible pair scorer on ONNX Runtime (sigmoid of the logit for one-label models)"""
+
+    def __init__(
+        self, model_name: str, max_length: int = 512, backend: str = "onnx_int8", config: Optional[Dict] = None
+    ):
+        from transformers import AutoTokenizer
+
+        self.model, directory = load_ort_model(model_name, "ORTModelForSequenceClassification", backend, config)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_length = max_length
+        logger.info(f"Loaded ONNX cross-encoder {model_name} ({backend})")
+
+    def predict(self, sentences: List[List[str]], batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        scores = []
+        # Batches keep the caller's order, so pre-sorted pairs are padded per length bucket
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            inputs = self.tokenizer(
+                [pair[0] for pair in batch], [pair[1] for pair in batch], padding=True,
+                truncation="longest_first", max_length=self.max_length, return_tensors="np"
+            )
+            logits = self.model(**inputs).logits
+            scores.append(1 / (1 + np.exp(-logits[:, 0])) if logits.shape[1] == 1 else logits)
+        return np.concatenate(scores) if scores else np.zeros(0, dtype='float32')
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_sentence_encoder(model_name: str, backend: Optional[str] = None):
+    """SentenceTransformer, or its ONNX Runtime counterpart (default: config["inference"]["retriever"])"""
+    backend = backend or inference_config()["retriever"]
+    _check_backend(backend)
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    return OnnxSentenceEncoder(model_name, backend)
+
+
+def load_cross_encoder(model_name: str, max_length: int = 512, backend: Optional[str] = None):
+    """CrossEncoder, or its ONNX Runtime counterpart (default: config["inference"]["reranker"])"""
+    backend = backend or inference_config()["reranker"]
+    _check_backend(backend)
+    if backend == "torch":
+        return CrossEncoder(model_name, max_length=max_length)
+    return OnnxCrossEncoder(model_name, max_length=max_length, backend=backend)
+
+
+# transformers pipeline task -> optimum ORTModel class
+PIPELINE_MODELS = {
+    "summarization": "ORTModelForSeq2SeqLM",
+    "text-classification": "ORTModelForSequenceClassification",
+    "zero-shot-classification": "ORTModelForSequenceClassification",
+}
+
+
+def load_pipeline(task: str, model_name: str, backend: str = "torch", **kwargs):
+    """transformers pipeline on PyTorch (CPU) or on an ONNX Runtime model"""
+    from transformers import AutoTokenizer, pipeline
+
+    _check_backend(backend)
+    if backend == "torch":
+        return pipeline(task, model=model_name, device=-1, **kwargs)
+    if task not in PIPELINE_MODELS:
+        raise ValueError(f"No ONNX backend for {task} pipelines; use one of {sorted(PIPELINE_MODELS)}")
+    model, directory = load_ort_model(model_name, PIPELINE_MODELS[task], backend)
+    return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(directory), **kwargs)
@@ -1,57 +1,215 @@
 """
 Vector database utilities for embeddings
 """
+import json
+import os
+import shutil
+import tempfile
+import weakref
 import faiss
 import numpy as np
-from typing import List, Optional
+from typing import Dict, List, Optional
 from loguru import logger
 
+from src.utils.ann_index import (
+    create_ann_index, train_ann_index, ann_search, configure_search_defaults, default_ann_config,
+    is_quantized, reconstruct, rescore, with_id_map, without_ids
+)
+
+
+class FloatVectors:
+    """
+    Append-only float32 vectors in a raw file on disk, memory-mapped for
+    reading, so exact vectors are available for re-scoring without being
+    held in memory. Without a path they go to a temporary file (under
+    `directory` if given) that is removed with the object.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        path: Optional[str] = None,
+        directory: Optional[str] = None,
+        writable: bool = True
+    ):
+        self.dimension = dimension
+        self.writable = writable
+        if path is None:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix="vectors-", suffix=".f32", dir=directory or None)
+            os.close(fd)
+            weakref.finalize(self, os.remove, path)
+        elif writable:
+            open(path, "ab").close()
+        self.path = path
+        self.array = self._map()
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def append(self, vectors: np.ndarray):
+        if not self.writable:
+            raise ValueError(f"Vectors at {self.path} are read-only; use copy() to modify them")
+        with open(self.path, "ab") as f:
+            np.ascontiguousarray(vectors, dtype='float32').tofile(f)
+        self.array = self._map()
+
+    def save(self, path: str):
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            shutil.copyfile(self.path, path)
+
+    def copy(self, directory: Optional[str] = None) -> "FloatVectors":
+        """Writable copy in a new temporary file (e.g. to update vectors loaded from a snapshot)"""
+        vectors = FloatVectors(self.dimension, directory=directory)
+        self.save(vectors.path)
+        vectors.array = vectors._map()
+        return vectors
+
+    def _map(self) -> np.ndarray:
+        rows = os.path.getsize(self.path) // (4 * self.dimension)
+        if rows == 0:
+            return np.empty((0, self.dimension), dtype='float32')
+        return np.memmap(self.path, dtype='float32', mode="r", shape=(rows, self.dimension))
+
 
 class VectorDB:
-    def __init__(self, dimension: int = 384):
+    """
+    FAISS index plus the document id of every vector.
+
+    Vectors get stable int64 ids (their insertion position) that survive
+    removals: IVF indexes store them in their inverted lists, other index
+    types are wrapped in IndexIDMap2. Document ids are kept in an object
+    array indexed by that id (None once removed), so mapping search results
+    back to documents is one vectorised lookup.
+    """
+
+    def __init__(self, dimension: int = 384, ann_config: Optional[Dict] = None, vectors_path: Optional[str] = None):
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.id_to_doc = {}
-        logger.info(f"Initialized VectorDB with dimension {dimension}")
+        self.ann_config = dict(ann_config or default_ann_config())
+        self.index = with_id_map(create_ann_index(dimension, **self.ann_config))
+        self.doc_ids = np.empty(0, dtype=object)
+        # Quantised indexes keep the float32 vectors on disk to re-score their candidates exactly
+        self.vectors = FloatVectors(dimension, vectors_path) if is_quantized(self.ann_config) else None
+        logger.info(f"Initialized VectorDB with dimension {dimension} ({self.ann_config['index_type']})")
+    
+    def __len__(self) -> int:
+        return int(self.index.ntotal)
     
     def add_documents(self, embeddings: np.ndarray, doc_ids: List[str]):
         """Add documents to vector database"""
         if embeddings.shape[1] != self.dimension:
             raise ValueError(f"Embedding dimension {embeddings.shape[1]} != {self.dimension}")
+        if len(doc_ids) != len(embeddings):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(embeddings)} embeddings")
         
-        self.index.add(embeddings.astype('float32'))
+        # IVF and PQ/int8 indexes are trained on the first batch added, with nlist capped to its size
+        if not self.index.is_trained:
+            self.index = with_id_map(create_ann_index(self.dimension, num_vectors=len(embeddings), **self.ann_config))
+            train_ann_index(self.index, embeddings, self.ann_config.get("train_sample_size", 100000))
+            configure_search_defaults(self.index, self.ann_config.get("nprobe"), self.ann_config.get("ef_search"))
         
-        start_id = len(self.id_to_doc)
-        for i, doc_id in enumerate(doc_ids):
-            self.id_to_doc[start_id + i] = doc_id
+        ids = np.arange(len(self.doc_ids), len(self.doc_ids) + len(doc_ids), dtype=np.int64)
+        self.index.add_with_ids(np.ascontiguousarray(embeddings, dtype='float32'), ids)
+        if self.vectors is not None:
+            self.vectors.append(embeddings)
+        self.doc_ids = np.concatenate([self.doc_ids, np.array(list(doc_ids), dtype=object)])
         
         logger.info(f"Added {len(doc_ids)} documents to vector DB")
     
-    def search(self, query_embedding: np.ndarray, k: int = 10) -> List[dict]:
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[dict]:
         """Search for similar documents"""
-        if query_embedding.shape[1] != self.dimension:
-            raise ValueError(f"Query dimension {query_embedding.shape[1]} != {self.dimension}")
-        
-        distances, indices = self.index.search(query_embedding.astype('float32'), k)
+        results = self.search_batch(query_embedding[:1], k, nprobe=nprobe, ef_search=ef_search)
+        valid = results["ids"][0] >= 0
+        return [
+            {"doc_id": doc_id, "distance": float(distance), "score": float(score)}
+            for doc_id, distance, score in zip(
+                results["doc_ids"][0][valid], results["distances"][0][valid], results["scores"][0][valid]
+            )
+        ]
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Search many queries in one call. Returns (num_queries, k) arrays:
+        "ids" (vector ids, -1 where fewer than k vectors matched), "doc_ids"
+        (None for padding), "distances" and "scores" (similarities, 0 for padding).
+        """
+        if query_embeddings.ndim != 2 or query_embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Query shape {query_embeddings.shape} does not match dimension {self.dimension}")
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx in self.id_to_doc:
-                results.append({
-                    "doc_id": self.id_to_doc[idx],
-                    "distance": float(distances[0][i]),
-                    "score": 1 / (1 + float(distances[0][i]))  # Convert to similarity
-                })
+        if self.vectors is None:
+            distances, ids = ann_search(self.index, query_embeddings, k, nprobe=nprobe, ef_search=ef_search)
+        else:
+            # Over-fetch from the quantised codes, then rank the candidates by exact distance
+            candidate_k = k * self.ann_config.get("rescore_factor", 4)
+            _, candidates = ann_search(self.index, query_embeddings, candidate_k, nprobe=nprobe, ef_search=ef_search)
+            distances, ids = rescore(query_embeddings, candidates, self.vectors.array, k)
         
-        return results
+        # FAISS pads with -1 when fewer than k vectors match
+        valid = ids >= 0
+        doc_ids = np.full(ids.shape, None, dtype=object)
+        doc_ids[valid] = self.doc_ids[ids[valid]]
+        scores = np.where(valid, 1 / (1 + np.where(valid, distances, 0)), 0).astype('float32')  # Convert to similarity
+        return {"ids": ids, "doc_ids": doc_ids, "distances": distances, "scores": scores}
+    
+    def remove(self, doc_ids: List[str]) -> int:
+        """Remove every vector of the given documents; returns the number removed"""
+        wanted = set(doc_ids)
+        ids = np.flatnonzero(np.frompyfunc(wanted.__contains__, 1, 1)(self.doc_ids).astype(bool))
+        if len(ids) == 0:
+            return 0
+        # Swap in a copy so searches running meanwhile see the old index intact
+        self.index = without_ids(self.index, ids, self.ann_config)
+        self.doc_ids[ids] = None
+        logger.info(f"Removed {len(ids)} vectors from vector DB")
+        return len(ids)
+    
+    def reconstruct(self, doc_id: str) -> Optional[np.ndarray]:
+        """Stored vector of a document (exact float32 for quantised indexes), or None"""
+        ids = np.flatnonzero(self.doc_ids == doc_id)
+        if len(ids) == 0:
+            return None
+        if self.vectors is not None:
+            return np.array(self.vectors.array[ids[-1]])
+        return reconstruct(self.index, ids[-1])
     
     def save(self, filepath: str):
-        """Save index to disk"""
+        """
+        Save index to disk, with the document ids in <filepath>.ids.json
+        (and the float32 vectors of a quantised index in <filepath>.vectors)
+        """
         faiss.write_index(self.index, filepath)
+        with open(f"{filepath}.ids.json", "w") as f:
+            json.dump(self.doc_ids.tolist(), f)
+        if self.vectors is not None:
+            self.vectors.save(f"{filepath}.vectors")
         logger.info(f"Saved index to {filepath}")
     
     def load(self, filepath: str):
         """Load index from disk"""
         self.index = faiss.read_index(filepath)
+        if os.path.exists(f"{filepath}.ids.json"):
+            with open(f"{filepath}.ids.json") as f:
+                self.doc_ids = np.array(json.load(f), dtype=object)
+        else:
+            logger.warning(f"No document ids saved with {filepath}; results will have no doc_id")
+            self.doc_ids = np.full(self.index.ntotal, None, dtype=object)
+        if os.path.exists(f"{filepath}.vectors"):
+            self.vectors = FloatVectors(self.dimension, f"{filepath}.vectors")
+            if len(self.vectors) != len(self.doc_ids):
+                raise ValueError(
+                    f"{filepath}.vectors holds {len(self.vectors)} vectors for {len(self.doc_ids)} ids"
+                )
         logger.info(f"Loaded index from {filepath}")
-